@@ -6,76 +6,158 @@ Generated: 2025-07-30 11:44:47
 Updated: 2025-07-31 - Added SQLAlchemy integration and Application Factory (Circular Import Fix)
 """
 import os
+import sys
+
+# Start the import timer before anything heavy is imported
+from utils import startup
+if '--profile-startup' in sys.argv[1:]:
+    startup.enable()
+
 import logging
 import click
 from pathlib import Path
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from flask_migrate import Migrate
-from flask_cors import CORS
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
-from flask_caching import Cache
 from datetime import datetime
 import json
+import threading
 
 # Path configuration
-from paths import BASE_DIR, LOGS_DIR
-
-from flask_wtf.csrf import CSRFProtect
-
-# Logging setup - moved outside create_app for global access
-LOGS_DIR.mkdir(parents=True, exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOGS_DIR / 'app.log'),
-        logging.StreamHandler()
-    ]
-)
+from paths import LOGS_DIR, COMPOUNDS_DB_PATH, RESULTS_DIR, CACHE_DB_PATH, ACCESS_LOG, ensure_directories
+
+# Logging setup - moved outside create_app for global access.
+# Records are queued and written by one background thread (utils/log_pipeline.py).
+from utils.log_pipeline import configure_logging
+configure_logging(LOGS_DIR)
 logger = logging.getLogger(__name__)
 
-def create_app():
+def create_app(test_config=None, serving=True):
     """
     Application factory function to create and configure the Flask app.
     This helps avoid circular imports and ensures extensions are initialized correctly.
+    test_config overrides configuration before any extension is initialized.
+    serving=False builds the app shared by CLI commands: the database and its
+    write hooks only, without the extensions and blueprints that handle web
+    requests (CSRF, CORS, the cache backend, rate limits), whose packages are
+    then never imported.
     """
     app = Flask(__name__)
     app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
-    csrf = CSRFProtect(app)
     # Enable CORS for all route
     # Configuration
     app.config['APPLICATION_NAME'] = 'ModularNucleoid P2P Demo'
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{BASE_DIR / "data" / "compounds.db"}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{COMPOUNDS_DB_PATH}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['CACHE_TYPE'] = 'simple'
+    # Shared by every worker process on this host (see utils/shared_cache.py)
+    app.config['CACHE_TYPE'] = 'utils.shared_cache.SQLiteCache'
+    app.config['CACHE_SQLITE_PATH'] = os.environ.get('CACHE_SQLITE_PATH', str(CACHE_DB_PATH))
+    app.config['CACHE_MAX_BYTES'] = int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    app.config['CACHE_DEFAULT_TIMEOUT'] = 300
+    # Admin-only endpoints (e.g. /api/debug/profile) are disabled unless a token is set
+    app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')
+    app.config['PROFILE_MAX_SECONDS'] = float(os.environ.get('PROFILE_MAX_SECONDS', 60))
+
+    app.config['RESULT_CACHE_DIR'] = os.environ.get('RESULT_CACHE_DIR', str(RESULTS_DIR))
+    app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    app.config['RESULT_CACHE_HOT_BYTES'] = int(os.environ.get('RESULT_CACHE_HOT_BYTES', 16 * 1024 * 1024))
+    app.config['RESULT_CACHE_MAX_ENTRY_BYTES'] = int(os.environ.get('RESULT_CACHE_MAX_ENTRY_BYTES', 1024 * 1024))
 
-    # Ensure data directory exists
-    (BASE_DIR / 'data').mkdir(parents=True, exist_ok=True)
+    if test_config:
+        app.config.update(test_config)
+
+    # Ensure data, log and upload directories exist
+    ensure_directories()
 
     # IMPORTANT: Import db from models *inside* create_app, after the app instance is created.
     # This breaks the circular import dependency.
     #from models import db
-    from extensions import db
- 
-    
-    # Initialize extensions with the app instance
-    db.init_app(app) # Initialize db with the Flask app instance
-    
-    migrate = Migrate(app, db)
-    CORS(app)
-    cache = Cache(app)
-    limiter = Limiter(
-        app=app,
-        key_func=get_remote_address,
-        default_limits=["200 per day", "50 per hour"]
+    with startup.phase('extensions'):
+        from extensions import db
+        from utils import db_routing
+
+        # Initialize extensions with the app instance. compounds.db gets a
+        # serialized writer engine plus a read-only pool (utils/db_routing.py).
+        db_routing.engine_config(app)
+        db.init_app(app) # Initialize db with the Flask app instance
+        db_routing.init_app(app, db)
+
+        # Flask-Migrate pulls in Alembic and is only needed for `flask db ...`,
+        # so gunicorn workers and this module's own CLI skip it.
+        if os.environ.get('FLASK_RUN_FROM_CLI') == 'true' or 'flask_migrate' in sys.modules:
+            from extensions import migrate
+            migrate.init_app(app, db)
+
+        # Compound writes bump the global data version used for ETags and cache keys
+        from utils.data_version import register_model_events
+        register_model_events()
+        # ...and keep the disease -> compound closure table current
+        from utils import disease_closure
+        disease_closure.register_model_events()
+        if os.path.exists(COMPOUNDS_DB_PATH):
+            with app.app_context():
+                disease_closure.ensure(db)
+
+    if serving:
+        with startup.phase('web extensions'):
+            from extensions import csrf, cache, limiter
+            from flask_cors import CORS
+
+            csrf.init_app(app)
+            CORS(app)
+            cache.init_app(app)
+            # The one Limiter, configured in extensions.py
+            limiter.init_app(app)
+
+    # With gunicorn --preload the app is created in the master; forked workers
+    # must not share its pooled database connections.
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: _dispose_engines(app))
+
+    # Content-addressed result cache shared by peers and server-side jobs
+    from utils.result_cache import ResultCache
+    app.extensions['result_cache'] = ResultCache(
+        app.config['RESULT_CACHE_DIR'],
+        max_bytes=app.config['RESULT_CACHE_MAX_BYTES'],
+        hot_bytes=app.config['RESULT_CACHE_HOT_BYTES']
     )
 
     # Import blueprints from the routes package. This must happen AFTER db.init_app(app)
     # to ensure models are properly loaded and db is bound.
-    from routes import register_blueprints
-    register_blueprints(app)
+    if serving:
+        with startup.phase('blueprints'):
+            from routes import register_blueprints
+            register_blueprints(app)
+
+    # Request, query and cache metrics, served at /api/metrics
+    from utils import metrics
+    metrics.init_app(app)
+
+    # Compact per-request access log, replayable with the replay command
+    from utils import access_log
+    access_log.init_app(app)
+
+    # gzip/brotli response compression and precompressed static files. Registered
+    # after the access log so its hook runs first and the log records bytes sent.
+    from utils import compression
+    compression.init_app(app)
+
+    # Concurrency limits, wait queues and per-client budgets for expensive endpoints
+    from utils import admission
+    admission.init_app(app)
+
+    # Optional scheduled snapshots (BACKUP_INTERVAL_HOURS); see also the backup-db command
+    from utils import backup
+    backup.init_app(app)
+
+    if serving:
+        limiter.exempt(app.view_functions['api.metrics'])
+        limiter.exempt(app.view_functions['api.debug_profile'])
+        limiter.exempt(app.view_functions['api.dashboard_stream'])  # EventSource reconnects on its own
+        limiter.exempt(app.view_functions['api.compounds_autocomplete'])  # one request per keystroke, served from memory
+        for poll in ('api.simulation_detail', 'api.simulation_trajectory'):
+            limiter.exempt(app.view_functions[poll])  # the simulation page polls a running simulation
+        for probe in ('api.health_check', 'api.health_live', 'api.health_ready'):
+            limiter.exempt(app.view_functions[probe])  # load balancers probe far more often than the limits allow
 
     # Import utilities (keep the helpers, but we'll use SQLAlchemy for database)
     from utils.helpers import format_datetime
@@ -149,23 +231,58 @@ def create_app():
 
     return app
 
+def _dispose_engines(app):
+    """Drop pooled connections inherited from the parent process without closing them"""
+    state = app.extensions.get('sqlalchemy')
+    if state is not None:
+        with app.app_context():
+            for engine in state.engines.values():
+                engine.dispose(close=False)
+
+_cli_app = None
+
+def start_kernel_selection():
+    """
+    Select the compute-kernel backends in the background, which also keeps the
+    NumPy import off the startup path. Only serving processes call this; the CLI
+    and helper processes select on first use.
+    """
+    def select_kernel_backends():
+        from utils.kernels import selection
+        selection()
+    threading.Thread(target=select_kernel_backends, name='kernel-select', daemon=True).start()
+
+def get_cli_app():
+    """Return the app instance shared by all CLI commands in this process"""
+    global _cli_app
+    if _cli_app is None:
+        with startup.phase('create_app'):
+            _cli_app = create_app(serving=False)
+    return _cli_app
+
 # --- CLI Commands (defined globally, but operate on an app context) ---
-# We need to create a temporary app instance for CLI commands to attach to.
-# This is a common pattern for Flask CLI with app factories.
+# CLI commands share one app instance, created on first use by get_cli_app(),
+# so commands that do not touch the app (and nested ones, e.g. under
+# `profile`) pay for app creation at most once. It is built without the web
+# request layers (create_app(serving=False)).
 # The actual app instance for running the server will be created in __main__.
 
 # Define CLI commands outside create_app, but use app_context to bind db
 # when they are executed.
 @click.group() # Make 'app' a Click group to attach commands
-def cli():
+@click.option('--profile-startup', is_flag=True, help='Print import and startup timings when the command finishes')
+@click.pass_context
+def cli(ctx, profile_startup):
     """A collection of CLI commands for the ModularNucleoid P2P Demo."""
-    pass
+    if profile_startup:
+        startup.enable()
+        ctx.call_on_close(lambda: click.echo(startup.report(), err=True))
 
 @cli.command('init-db')
 def init_db_command():
     """Initialize the database."""
     click.echo('Initializing database...')
-    app_instance = create_app() # Create an app instance for the CLI command
+    app_instance = get_cli_app() # Shared by every command in this process
     with app_instance.app_context():
         from models import db, Compound, BiochemicalGroup, TherapeuticArea, Disease, Study # Import models here
         db.create_all()
@@ -175,9 +292,10 @@ def init_db_command():
 def seed_db_command():
     """Seed the database with initial data."""
     click.echo('Seeding database...')
-    app_instance = create_app()
+    app_instance = get_cli_app()
     with app_instance.app_context():
         from models import db, Compound, BiochemicalGroup, TherapeuticArea, Disease, Study # Import models here
+        from utils.db_routing import write_transaction
         # Create biochemical groups
         groups_data = [
             {'name': 'Proteins', 'category': 'macromolecules', 'color': '#FF6B6B', 'description': 'Large biomolecules consisting of amino acid chains'},
@@ -195,27 +313,28 @@ def seed_db_command():
             {'name': 'Beta-lactams', 'category': 'antibiotics', 'color': '#A9DFBF', 'description': 'Ring-structured antibiotic compounds'}
         ]
         
-        for group_data in groups_data:
-            group = BiochemicalGroup.query.filter_by(name=group_data['name']).first()
-            if not group:
-                group = BiochemicalGroup(**group_data)
-                db.session.add(group)
+        def seed_reference_data():
+            for group_data in groups_data:
+                group = BiochemicalGroup.query.filter_by(name=group_data['name']).first()
+                if not group:
+                    group = BiochemicalGroup(**group_data)
+                    db.session.add(group)
         
-        # Create therapeutic areas
-        therapeutic_areas = [
-            'Oncology', 'Cardiology', 'Neurology', 'Immunology', 
-            'Infectious Diseases', 'Metabolic Disorders', 'Rare Diseases',
-            'Pain Management', 'Endocrinology'
-        ]
-        
-        for area_name in therapeutic_areas:
-            area = TherapeuticArea.query.filter_by(name=area_name).first()
-            if not area:
-                area = TherapeuticArea(name=area_name)
-                db.session.add(area)
+            # Create therapeutic areas
+            therapeutic_areas = [
+                'Oncology', 'Cardiology', 'Neurology', 'Immunology', 
+                'Infectious Diseases', 'Metabolic Disorders', 'Rare Diseases',
+                'Pain Management', 'Endocrinology'
+            ]
         
+            for area_name in therapeutic_areas:
+                area = TherapeuticArea.query.filter_by(name=area_name).first()
+                if not area:
+                    area = TherapeuticArea(name=area_name)
+                    db.session.add(area)
+
         # Commit the reference data first
-        db.session.commit()
+        write_transaction(seed_reference_data)
         
         # Sample compounds with relationships
         sample_compounds_data = [
@@ -281,44 +400,47 @@ def seed_db_command():
             }
         ]
         
-        for compound_data in sample_compounds_data:
-            # Check if compound already exists
-            existing_compound = Compound.query.filter_by(name=compound_data['name']).first()
-            if existing_compound:
-                continue
+        def seed_compounds():
+            for compound_data in sample_compounds_data:
+                # Check if compound already exists
+                existing_compound = Compound.query.filter_by(name=compound_data['name']).first()
+                if existing_compound:
+                    continue
                 
-            # Create compound
-            compound = Compound(
-                name=compound_data['name'],
-                molecular_formula=compound_data['molecular_formula'],
-                molecular_weight=compound_data['molecular_weight'],
-                cas_number=compound_data['cas_number'],
-                smiles=compound_data['smiles'],
-                description=compound_data['description'],
-                clinical_phase=compound_data['clinical_phase'],
-                mechanism_of_action=compound_data['mechanism_of_action'],
-                created_by='seed'
-            )
+                # Create compound
+                compound = Compound(
+                    name=compound_data['name'],
+                    molecular_formula=compound_data['molecular_formula'],
+                    molecular_weight=compound_data['molecular_weight'],
+                    cas_number=compound_data['cas_number'],
+                    smiles=compound_data['smiles'],
+                    description=compound_data['description'],
+                    clinical_phase=compound_data['clinical_phase'],
+                    mechanism_of_action=compound_data['mechanism_of_action'],
+                    created_by='seed'
+                )
             
-            # Add biochemical group relationship
-            biochemical_group = BiochemicalGroup.query.filter_by(name=compound_data['biochemical_group']).first()
-            if biochemical_group:
-                compound.biochemical_group = biochemical_group
+                # Add biochemical group relationship
+                biochemical_group = BiochemicalGroup.query.filter_by(name=compound_data['biochemical_group']).first()
+                if biochemical_group:
+                    compound.biochemical_group = biochemical_group
             
-            # Add therapeutic area relationships
-            for area_name in compound_data['therapeutic_areas']:
-                therapeutic_area = TherapeuticArea.query.filter_by(name=area_name).first()
-                if therapeutic_area:
-                    compound.therapeutic_areas.append(therapeutic_area)
+                # Add therapeutic area relationships
+                for area_name in compound_data['therapeutic_areas']:
+                    therapeutic_area = TherapeuticArea.query.filter_by(name=area_name).first()
+                    if therapeutic_area:
+                        compound.therapeutic_areas.append(therapeutic_area)
             
-            # Calculate sync hash
-            compound.update_sync_hash()
+                # Calculate sync hash
+                compound.update_sync_hash()
             
-            db.session.add(compound)
-        
-        db.session.commit()
+                db.session.add(compound)
+
+        write_transaction(seed_compounds)
     click.echo('Database seeded successfully!')
 
+IMPORT_BATCH_SIZE = 500
+
 @cli.command('import-compounds')
 @click.option('--file', help='JSON file containing compounds to import')
 def import_compounds_command(file):
@@ -332,46 +454,59 @@ def import_compounds_command(file):
             compounds_data = json.load(f)
         
         imported_count = 0
-        app_instance = create_app()
+        app_instance = get_cli_app()
         with app_instance.app_context():
             from models import db, Compound, BiochemicalGroup, TherapeuticArea, Disease, Study # Import models here
-            for compound_data in compounds_data:
-                # Check if compound already exists
-                existing_compound = Compound.query.filter_by(name=compound_data['name']).first()
-                if existing_compound:
-                    continue
+            from utils.db_routing import write_transaction
+
+            def import_batch(batch):
+                imported = 0
+                for compound_data in batch:
+                    # Check if compound already exists
+                    existing_compound = Compound.query.filter_by(name=compound_data['name']).first()
+                    if existing_compound:
+                        continue
                     
-                # Create compound
-                compound = Compound(
-                    name=compound_data.get('name'),
-                    molecular_formula=compound_data.get('molecular_formula'),
-                    molecular_weight=compound_data.get('molecular_weight'),
-                    cas_number=compound_data.get('cas_number'),
-                    smiles=compound_data.get('smiles'),
-                    description=compound_data.get('description'),
-                    clinical_phase=compound_data.get('clinical_phase'),
-                    mechanism_of_action=compound_data.get('mechanism_of_action'),
-                    created_by='import'
-                )
+                    # Create compound
+                    compound = Compound(
+                        name=compound_data.get('name'),
+                        molecular_formula=compound_data.get('molecular_formula'),
+                        molecular_weight=compound_data.get('molecular_weight'),
+                        cas_number=compound_data.get('cas_number'),
+                        smiles=compound_data.get('smiles'),
+                        description=compound_data.get('description'),
+                        clinical_phase=compound_data.get('clinical_phase'),
+                        mechanism_of_action=compound_data.get('mechanism_of_action'),
+                        created_by='import'
+                    )
                 
-                # Add biochemical group relationship
-                if 'biochemical_group' in compound_data:
-                    biochemical_group = BiochemicalGroup.query.filter_by(name=compound_data['biochemical_group']).first()
-                    if biochemical_group:
-                        compound.biochemical_group = biochemical_group
+                    # Add biochemical group relationship
+                    if 'biochemical_group' in compound_data:
+                        biochemical_group = BiochemicalGroup.query.filter_by(name=compound_data['biochemical_group']).first()
+                        if biochemical_group:
+                            compound.biochemical_group = biochemical_group
                 
-                # Add therapeutic area relationships
-                if 'therapeutic_areas' in compound_data:
-                    for area_name in compound_data['therapeutic_areas']:
-                        therapeutic_area = TherapeuticArea.query.filter_by(name=area_name).first()
-                        if therapeutic_area:
-                            compound.therapeutic_areas.append(therapeutic_area)
+                    # Add therapeutic area relationships
+                    if 'therapeutic_areas' in compound_data:
+                        for area_name in compound_data['therapeutic_areas']:
+                            therapeutic_area = TherapeuticArea.query.filter_by(name=area_name).first()
+                            if therapeutic_area:
+                                compound.therapeutic_areas.append(therapeutic_area)
                 
-                compound.update_sync_hash()
-                db.session.add(compound)
-                imported_count += 1
-            
-            db.session.commit()
+                    compound.update_sync_hash()
+                    db.session.add(compound)
+                    imported += 1
+                return imported
+
+            from utils import jobs
+
+            # One retried write transaction per batch keeps the write lock short;
+            # progress shows up live on the dashboard
+            with jobs.start(f'Import {os.path.basename(file)}', total=len(compounds_data)) as job:
+                for i in range(0, len(compounds_data), IMPORT_BATCH_SIZE):
+                    batch = compounds_data[i:i + IMPORT_BATCH_SIZE]
+                    imported_count += write_transaction(lambda: import_batch(batch))
+                    job.advance(len(batch), message=f'{imported_count} imported')
         click.echo(f'Successfully imported {imported_count} compounds from {file}!')
         
     except FileNotFoundError:
@@ -381,65 +516,323 @@ def import_compounds_command(file):
     except Exception as e:
         click.echo(f'Error importing compounds: {str(e)}')
 
+@cli.command('rehash-compounds')
+@click.option('--batch-size', default=500, show_default=True, help='Compounds per commit')
+def rehash_compounds_command(batch_size):
+    """Recompute the sync hash of every compound."""
+    app_instance = get_cli_app()
+    with app_instance.app_context():
+        from models import db, Compound
+        from utils.db_routing import write_transaction
+
+        def rehash_batch(after_id):
+            batch = Compound.query.filter(Compound.id > after_id).order_by(Compound.id).limit(batch_size).all()
+            batch_changed = 0
+            for compound in batch:
+                previous = compound.sync_hash
+                compound.update_sync_hash()
+                if compound.sync_hash != previous:
+                    batch_changed += 1
+            return len(batch), batch[-1].id if batch else after_id, batch_changed
+
+        changed = 0
+        total = 0
+        last_id = 0
+        while True:
+            count, last_id, batch_changed = write_transaction(lambda: rehash_batch(last_id))
+            if not count:
+                break
+            total += count
+            changed += batch_changed
+    click.echo(f'Rehashed {total} compounds ({changed} changed).')
+
+@cli.command('profile', context_settings={'ignore_unknown_options': True, 'allow_interspersed_args': False})
+@click.option('--rate', default=100, show_default=True, help='Samples per second')
+@click.option('--output', type=click.Path(dir_okay=False), help='Collapsed-stack output file (default: under LOGS_DIR)')
+@click.argument('command', nargs=-1, type=click.UNPROCESSED, required=True)
+def profile_command(rate, output, command):
+    """Run another CLI command under the sampling profiler.
+
+    Example: profile --rate 200 import-compounds --file compounds.json
+    """
+    from utils.profiler import StackSampler, save_profile
+
+    sampler = StackSampler(rate=rate)
+    with sampler:
+        try:
+            cli.main(args=list(command), prog_name='app', standalone_mode=False)
+        except click.ClickException as e:
+            e.show()
+
+    collapsed = sampler.collapsed()
+    if output:
+        Path(output).write_text(collapsed)
+        path = output
+    else:
+        path = save_profile(collapsed, label=f'profile-{command[0]}')
+    click.echo(f'Collected {sampler.samples} samples; collapsed stacks written to {path}')
+
+@cli.command('replay')
+@click.option('--file', 'log_file', type=click.Path(exists=True, dir_okay=False), default=str(ACCESS_LOG),
+              show_default=True, help='Access log to replay')
+@click.option('--target', help='Base URL of a running server (default: replay in-process against the WSGI app)')
+@click.option('--concurrency', type=int, default=8, show_default=True, help='Number of concurrent clients')
+@click.option('--speed', type=float, default=1.0, show_default=True,
+              help='Speed-up over the recorded timing; 0 sends as fast as possible')
+@click.option('--limit', type=int, help='Stop after this many requests')
+def replay_command(log_file, target, concurrency, speed, limit):
+    """Replay an access log and report latency percentiles per route."""
+    from utils.access_log import read_log
+    from utils.replay import InProcessTarget, HTTPTarget, replay, route_resolver, format_report
+
+    # Replayed requests must not be rate limited or appended to the log being read
+    app_instance = create_app({'RATELIMIT_ENABLED': False, 'ACCESS_LOG_ENABLED': False})
+    sender = HTTPTarget(target) if target else InProcessTarget(app_instance)
+    click.echo(f"Replaying {log_file} against {target or 'the in-process app'} "
+               f"(concurrency {concurrency}, speed {'max' if speed <= 0 else f'{speed:g}x'})")
+    result = replay(read_log(log_file), sender, route_resolver(app_instance),
+                    concurrency=concurrency, speed=speed, limit=limit)
+    click.echo(format_report(result))
+
+@cli.command('generate-compounds')
+@click.option('--count', type=int, required=True, help='Number of compounds to generate (e.g. 10000, 100000, 1000000)')
+@click.option('--output', type=click.File('w'), default='-', show_default=True, help='JSON file for import-compounds')
+@click.option('--insert', is_flag=True, help='Bulk-insert into the database instead of writing JSON')
+@click.option('--seed', type=int, default=42, show_default=True, help='Random seed; the same seed yields the same data')
+@click.option('--start', type=int, default=0, show_default=True, help='Index offset, to generate disjoint batches')
+def generate_compounds_command(count, output, insert, seed, start):
+    """Generate realistic synthetic compounds for load testing."""
+    from utils.synthetic import generate_compounds, insert_compounds
+
+    records = generate_compounds(count, seed=seed, start=start)
+    if insert:
+        app_instance = get_cli_app()
+        with app_instance.app_context():
+            from models import db
+            db.create_all()
+            inserted = insert_compounds(db, records)
+        click.echo(f'Inserted {inserted} synthetic compounds.')
+        return
+
+    output.write('[\n')
+    for i, record in enumerate(records):
+        if i:
+            output.write(',\n')
+        output.write(json.dumps(record))
+    output.write('\n]\n')
+    if output.name != '<stdout>':
+        click.echo(f'Wrote {count} synthetic compounds to {output.name}.')
+
 @cli.command('db-stats')
 def db_stats_command():
     """Show database statistics."""
-    app_instance = create_app()
+    app_instance = get_cli_app()
     with app_instance.app_context():
         from models import db, Compound, BiochemicalGroup, TherapeuticArea, Disease, Study # Import models here
+        from utils.db_routing import reading
         try:
-            # Get counts
-            compounds_count = Compound.query.count()
-            groups_count = BiochemicalGroup.query.count()
-            therapeutic_areas_count = TherapeuticArea.query.count()
+            # Read-only report: use the read pool, never the write lock
+            with reading():
+                # Get counts
+                compounds_count = Compound.query.count()
+                groups_count = BiochemicalGroup.query.count()
+                therapeutic_areas_count = TherapeuticArea.query.count()
             
-            # Get compounds by clinical phase
-            from sqlalchemy import func
-            phase_stats = db.session.query(
-                Compound.clinical_phase, 
-                func.count(Compound.id)
-            ).group_by(Compound.clinical_phase).all()
+                # Get compounds by clinical phase
+                from sqlalchemy import func
+                phase_stats = db.session.query(
+                    Compound.clinical_phase, 
+                    func.count(Compound.id)
+                ).group_by(Compound.clinical_phase).all()
             
-            # Get compounds by biochemical group
-            group_stats = db.session.query(
-                BiochemicalGroup.name, 
-                func.count(Compound.id)
-            ).join(Compound, BiochemicalGroup.id == Compound.biochemical_group_id, isouter=True).group_by(BiochemicalGroup.name).all()
+                # Get compounds by biochemical group
+                group_stats = db.session.query(
+                    BiochemicalGroup.name, 
+                    func.count(Compound.id)
+                ).join(Compound, BiochemicalGroup.id == Compound.biochemical_group_id, isouter=True).group_by(BiochemicalGroup.name).all()
             
-            click.echo('\n=== Database Statistics ===')
-            click.echo(f'Total Compounds: {compounds_count}')
-            click.echo(f'Biochemical Groups: {groups_count}')
-            click.echo(f'Therapeutic Areas: {therapeutic_areas_count}')
+                click.echo('\n=== Database Statistics ===')
+                click.echo(f'Total Compounds: {compounds_count}')
+                click.echo(f'Biochemical Groups: {groups_count}')
+                click.echo(f'Therapeutic Areas: {therapeutic_areas_count}')
             
-            click.echo('\nCompounds by Clinical Phase:')
-            for phase, count in phase_stats:
-                click.echo(f'  {phase or "Unknown"}: {count}')
+                click.echo('\nCompounds by Clinical Phase:')
+                for phase, count in phase_stats:
+                    click.echo(f'  {phase or "Unknown"}: {count}')
             
-            click.echo('\nCompounds by Biochemical Group:')
-            for group, count in group_stats:
-                click.echo(f'  {group}: {count}')
+                click.echo('\nCompounds by Biochemical Group:')
+                for group, count in group_stats:
+                    click.echo(f'  {group}: {count}')
             
         except Exception as e:
             click.echo(f'Error getting database stats: {str(e)}')
 
+@cli.command('backup-db')
+@click.option('--database', 'names', type=click.Choice(['compounds', 'settings']), multiple=True,
+              help='Database to back up (repeatable; default: all)')
+@click.option('--pages', type=int, default=256, show_default=True, help='Pages copied per step')
+@click.option('--sleep', type=float, default=0.01, show_default=True, help='Seconds to pause between steps')
+@click.option('--keep', type=int, help='Snapshots to keep per database (default: BACKUP_KEEP or 7)')
+@click.option('--max-age-days', type=float, help='Also delete snapshots older than this')
+@click.option('--no-compress', is_flag=True, help='Store plain .db files instead of gzip')
+@click.option('--output-dir', type=click.Path(file_okay=False), help='Backup directory (default: BACKUP_DIR)')
+def backup_db_command(names, pages, sleep, keep, max_age_days, no_compress, output_dir):
+    """Take verified online snapshots of the databases without blocking writers."""
+    from paths import BACKUP_DIR
+    from utils.backup import BackupError, run_backups
+
+    config = get_cli_app().config
+    keep = keep if keep is not None else config['BACKUP_KEEP']
+    max_age_days = max_age_days if max_age_days is not None else config['BACKUP_MAX_AGE_DAYS']
+    try:
+        summaries = run_backups(names or None, keep=keep, max_age_days=max_age_days,
+                                backup_dir=output_dir or str(BACKUP_DIR),
+                                pages=pages, sleep=sleep, compress=not no_compress)
+    except BackupError as e:
+        raise click.ClickException(str(e))
+    for summary in summaries:
+        click.echo(f"{summary['database']}: {summary['path']} ({summary['bytes']} bytes, "
+                   f"{summary['stored_bytes']} stored, {summary['seconds']:.2f}s, "
+                   f"{summary['restarts']} restarts, integrity ok)")
+        for path in summary['pruned']:
+            click.echo(f'  pruned {path}')
+
+@cli.command('import-sequence')
+@click.argument('fasta', type=click.Path(exists=True, dir_okay=False))
+@click.option('--name', help='Display name (default: the FASTA header)')
+def import_sequence_command(fasta, name):
+    """Store a FASTA sequence and build its track pyramid."""
+    from utils import jobs
+    from utils.sequences import SequenceError, store_file
+
+    with jobs.start(f'Index {os.path.basename(fasta)}', total=os.path.getsize(fasta)) as job:
+        try:
+            meta = store_file(fasta, name, progress=job.advance)
+        except SequenceError as e:
+            raise click.ClickException(str(e))
+    click.echo(f"Stored {meta['name']} as {meta['id']} ({meta['length']} bp)")
+
+@cli.command('check-kernels')
+@click.option('--build', is_flag=True, help='Compile the Fortran backend with f2py first (needs gfortran)')
+@click.option('--sample-size', type=int, default=1_000_000, show_default=True, help='Bases in the benchmark sequence')
+def check_kernels_command(build, sample_size):
+    """Check every compute-kernel backend against the reference, benchmark them and store the choice for this host."""
+    if build:
+        from utils.kernels import fortran_backend
+        try:
+            click.echo(f'Built {fortran_backend.build()}')
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        # The backend modules were imported before the extension existed
+        click.echo('Run the command again without --build to check the new backend.')
+        return
+
+    from utils.kernels import Selection, available_backends
+    from utils.kernels.conformance import check
+
+    for backend, reason in available_backends().items():
+        click.echo(f"{backend}: {'available' if reason is None else reason}")
+    report = check()
+    click.echo(f"{report['cases']} cases against the reference for {', '.join(report['backends']) or 'no backends'}")
+    for failure in report['failures']:
+        click.echo(f"  FAIL {failure['backend']} {failure['case']}: {failure['error']}")
+
+    selection = Selection().benchmark(sample_size=sample_size).save()
+    for name, status in selection.status().items():
+        timings = ', '.join(f'{backend} {seconds * 1000:.2f}ms' for backend, seconds in sorted(status['timings'].items()))
+        click.echo(f"{name}: {status['backend']} ({timings})")
+    if report['failures']:
+        raise click.ClickException(f"{len(report['failures'])} conformance failures")
+
+@cli.command('rebuild-disease-closure')
+def rebuild_disease_closure_command():
+    """Recompute the disease -> compound closure table from scratch."""
+    app_instance = get_cli_app()
+    with app_instance.app_context():
+        from extensions import db
+        from utils.disease_closure import ensure, rebuild
+        from utils.db_routing import write_transaction
+        from utils.data_version import bump
+
+        ensure(db)
+        rows = write_transaction(lambda: rebuild(db.session.connection()))
+        bump('disease closure rebuilt')
+    click.echo(f'Disease closure rebuilt: {rows} rows')
+
+@cli.command('compress-static')
+def compress_static_command():
+    """Write .gz (and .br with brotli installed) copies of the static CSS and JS."""
+    from utils.compression import brotli, precompress_static
+
+    app_instance = get_cli_app()
+    written = precompress_static(app_instance.static_folder)
+    for path in written:
+        click.echo(f'  {os.path.relpath(path, app_instance.static_folder)}')
+    click.echo(f"{len(written)} files written ({'gzip and brotli' if brotli else 'gzip only; install brotli for .br'})")
+
+@cli.command('simulate-nucleoid')
+@click.option('--beads', default=2000, show_default=True, help='Chromosome beads')
+@click.option('--crowders', default=0, show_default=True, help='Crowder particles')
+@click.option('--steps', default=10_000, show_default=True, help='Brownian dynamics steps')
+@click.option('--seed', default=0, show_default=True, help='Random seed')
+@click.option('--frame-every', default=100, show_default=True, help='Steps between trajectory frames')
+@click.option('--checkpoint-every', default=1000, show_default=True, help='Steps between checkpoints')
+@click.option('--resume', 'resume_id', help='Continue this run from its last checkpoint instead')
+def simulate_nucleoid_command(beads, crowders, steps, seed, frame_every, checkpoint_every, resume_id):
+    """Run a nucleoid polymer simulation in the foreground; view it on /simulate."""
+    import time
+    from utils import jobs
+    from utils.nucleoid import runs
+
+    if resume_id:
+        try:
+            run = runs.load_run(resume_id)
+        except KeyError:
+            raise click.ClickException(f'No simulation {resume_id}')
+        if not runs.resumable(run):
+            raise click.ClickException(f"Simulation {resume_id} is {run['status']}")
+    else:
+        try:
+            run = runs.create({'beads': beads, 'crowders': crowders, 'steps': steps, 'seed': seed,
+                               'frame_every': frame_every, 'checkpoint_every': checkpoint_every})
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Created simulation {run['id']}")
+
+    started = time.perf_counter()
+    with jobs.start(f"Nucleoid simulation {run['id']}", total=run['steps']) as job:
+        job.advance(run['step'])
+        try:
+            run = runs.execute(run['id'], progress=job.advance)
+        except KeyboardInterrupt:
+            raise click.ClickException(f"Interrupted; resume with --resume {run['id']}")
+    click.echo(f"Simulation {run['id']} {run['status']} at step {run['step']} "
+               f"({time.perf_counter() - started:.1f}s)")
+
 @cli.command('reset-db')
 def reset_db_command():
     """Reset the database (drop all tables and recreate)."""
     if click.confirm('Are you sure you want to reset the database? This will delete all data!'):
         click.echo('Resetting database...')
-        app_instance = create_app()
+        app_instance = get_cli_app()
         with app_instance.app_context():
             from models import db, Compound, BiochemicalGroup, TherapeuticArea, Disease, Study # Import models here
+            from utils.data_version import bump
             db.drop_all()
             db.create_all()
+            bump('reset-db')
         click.echo('Database reset complete!')
     else:
         click.echo('Database reset cancelled.')
 
 # Entry point for running the Flask app
-if __name__ == '__main__':
+if __name__ == '__main__' and len(sys.argv) > 1:
+    # `python app.py <command> ...` runs a CLI command instead of the server
+    cli(prog_name='app.py')
+elif __name__ == '__main__':
     # Create the app instance for the server
     app = create_app()
+    start_kernel_selection()
     
     debug = os.environ.get('FLASK_ENV') == 'development'
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,9 @@
+"""
+Benchmark suite for the hot paths of the application.
+
+Run with ``python -m benchmarks --scale 10000``. Each run builds (or reuses) a
+synthetic dataset of the requested size in a scratch directory, times every
+benchmark, and compares the medians against ``benchmarks/baselines.json``.
+A benchmark slower than its baseline by more than ``--threshold`` fails the
+run with exit status 1; ``--save-baseline`` records the current numbers.
+"""
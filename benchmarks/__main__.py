@@ -0,0 +1,108 @@
+"""
+Command-line entry point: ``python -m benchmarks [--scale N] [--save-baseline]``.
+"""
+
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.suite import dataset_dir
+
+BASELINES_PATH = Path(__file__).with_name('baselines.json')
+
+
+def revision():
+    """Short commit id of the tree being measured, or None outside a git checkout"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run the benchmark suite.')
+    parser.add_argument('--scale', type=int, default=10000, help='number of synthetic compounds (default: 10000)')
+    parser.add_argument('--seed', type=int, default=42, help='dataset seed (default: 42)')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per benchmark unless it sets its own')
+    parser.add_argument('--only', action='append', help='glob of benchmark names to run (repeatable)')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown over the baseline, relative to the calibration loop, '
+                             'before failing (default: 0.2 = 20%%)')
+    parser.add_argument('--baselines', type=Path, default=BASELINES_PATH, help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='record this run as the new baseline')
+    parser.add_argument('--output', type=Path, help='also write the results as JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    # Paths are resolved when the app modules are imported, so point them at
+    # the scratch dataset first.
+    # Logs go there too: the repository's logs/ is no place for benchmark traffic.
+    workdir = dataset_dir(args.scale, args.seed)
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.environ['DATABASE_DIR'] = str(workdir)
+    os.environ['LOGS_DIR'] = str(workdir / 'logs')
+    logging.disable(logging.WARNING)
+
+    import app as application
+    from benchmarks.suite import build_benchmarks, compare, prepare_dataset
+
+    app = application.create_app({'RATELIMIT_ENABLED': False, 'ACCESS_LOG_ENABLED': False,
+                                  'ADMISSION_ENABLED': False})
+    prepare_dataset(app, args.scale, args.seed)
+
+    results = {}
+    print(f'{"benchmark":<28} {"median":>10} {"p95":>10} {"throughput":>18} {"ratio":>10}')
+    for benchmark in build_benchmarks(app, application.cli, args.scale, args.seed, workdir):
+        if args.only and not any(fnmatch.fnmatch(benchmark.name, pattern) for pattern in args.only):
+            continue
+        result = results[benchmark.name] = benchmark.measure(args.repeat)
+        print(f'{benchmark.name:<28} {result["median"] * 1000:>8.2f}ms {result["p95"] * 1000:>8.2f}ms '
+              f'{result["throughput"]:>12.1f} {result["unit"]}/s {result["ratio"]:>9.3f}')
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    scale_key = f'scale:{args.scale}'
+    stored = json.loads(args.baselines.read_text()) if args.baselines.exists() else {}
+    if args.save_baseline:
+        entry = stored.setdefault(scale_key, {})
+        tree = revision()
+        entry.update({name: {'ratio': r['ratio'], 'calibration': r['calibration'], 'min': r['min'],
+                             'median': r['median'], 'unit': r['unit'], 'tree': tree}
+                      for name, r in results.items()})
+        stored['machine'] = {'python': platform.python_version(), 'platform': platform.platform()}
+        args.baselines.write_text(json.dumps(stored, indent=2, sort_keys=True) + '\n')
+        print(f'Baselines for {scale_key} saved to {args.baselines}')
+        return 0
+
+    baselines = stored.get(scale_key)
+    if not baselines:
+        print(f'No baselines for {scale_key}; run with --save-baseline to record them')
+        return 0
+
+    missing = sorted(name for name in results if 'ratio' not in baselines.get(name, {}))
+    if missing:
+        print(f'No baseline for {", ".join(missing)}; run with --save-baseline to record them')
+    regressions = compare(results, baselines, args.threshold)
+    for name, before, after in regressions:
+        print(f'REGRESSION {name}: {before:.3f} -> {after:.3f} calibration units '
+              f'(+{(after / before - 1) * 100:.0f}%, threshold {args.threshold * 100:.0f}%)')
+    if regressions:
+        return 1
+    print(f'No regressions beyond {args.threshold * 100:.0f}% against {scale_key} baselines')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Benchmark definitions and the timing harness.
+
+The application must be imported only after ``DATABASE_DIR`` points at the
+scratch dataset (see ``benchmarks.__main__``), because paths are resolved at
+import time.
+
+Absolute timings differ between machines and from one minute to the next on
+shared ones, so the regression gate does not compare them. Every run also
+times ``calibrate()``, a fixed mix of interpreter, JSON and SQLite work,
+right before and after each benchmark, and records the benchmark's fastest
+run (min-of-N, the least noisy statistic) divided by the faster of those
+two calibrations. Those ratios are what the baselines hold and what
+``compare`` checks.
+
+The checked-in baselines come from the tree before the optimizations they
+guard (each entry names its ``tree``): 893df8d, where the suite was added,
+or for benchmarks added later, the commit that added them. Each is the
+median-ratio run of three. They are recorded at 10k, 100k and 1M
+compounds; 1M takes a few minutes to generate the first time and about
+half a gigabyte under BENCHMARK_DIR.
+"""
+
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+IMPORT_BATCH = 500
+SYNC_HASH_BATCH = 1000
+METRICS_BATCH = 1000
+# Nucleoid simulation sizes (beads) and the steps timed per run at each
+NUCLEOID_STEPS = {1000: 50, 10_000: 10, 100_000: 2}
+
+
+CALIBRATION_ROUNDS = 5
+
+
+def _calibration_work():
+    rng = random.Random(0)
+    rows = [(i, f'compound-{rng.randrange(10 ** 6)}', rng.random() * 500) for i in range(3000)]
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE compound (id INTEGER PRIMARY KEY, name TEXT, weight REAL)')
+    connection.execute('CREATE INDEX ix_compound_name ON compound (name)')
+    connection.executemany('INSERT INTO compound VALUES (?, ?, ?)', rows)
+    for offset in range(0, 3000, 100):
+        page = connection.execute('SELECT id, name, weight FROM compound ORDER BY name LIMIT 50 OFFSET ?',
+                                  (offset,)).fetchall()
+        json.loads(json.dumps([{'id': i, 'name': name, 'weight': weight} for i, name, weight in page]))
+    connection.close()
+    counts = {}
+    for _, name, _ in rows:
+        counts[name[-2:]] = counts.get(name[-2:], 0) + 1
+    return sorted(counts.items())
+
+
+def calibrate(rounds: int = CALIBRATION_ROUNDS) -> float:
+    """Fastest of ``rounds`` timings of a fixed workload: this machine's speed right now"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        _calibration_work()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+class Benchmark:
+    """One timed operation; ``units`` is how many items a single call handles"""
+
+    def __init__(self, name, run, setup=None, teardown=None, units=1, unit='op', repeat=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+        self.units = units
+        self.unit = unit
+        self.repeat = repeat
+
+    def measure(self, repeat: int, warmup: int = 1) -> dict:
+        repeat = self.repeat or repeat
+        calibration = calibrate()
+        timings = []
+        for i in range(warmup + repeat):
+            if self.setup:
+                self.setup()
+            start = time.perf_counter()
+            self.run()
+            elapsed = time.perf_counter() - start
+            if self.teardown:
+                self.teardown()
+            if i >= warmup:
+                timings.append(elapsed)
+
+        timings.sort()
+        median = statistics.median(timings)
+        # Shared machines change speed from one second to the next; bracketing
+        # the benchmark keeps the reference as close to it in time as possible
+        calibration = min(calibration, calibrate())
+        return {
+            'median': median,
+            'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            'min': timings[0],
+            'runs': len(timings),
+            'calibration': calibration,
+            'ratio': timings[0] / calibration,
+            'throughput': self.units / median if median else None,
+            'unit': self.unit,
+        }
+
+
+def dataset_dir(scale: int, seed: int) -> Path:
+    """Scratch directory holding the dataset for a scale/seed pair"""
+    root = Path(os.environ.get('BENCHMARK_DIR', Path(tempfile.gettempdir()) / 'mn-benchmarks'))
+    return root / f'{scale}-{seed}'
+
+
+def prepare_dataset(app, scale: int, seed: int):
+    """Create the schema and insert ``scale`` synthetic compounds unless already present"""
+    from models import db, Compound
+    from utils.database import init_db
+    from utils.synthetic import generate_compounds, insert_compounds
+
+    init_db()
+    with app.app_context():
+        db.create_all()
+        existing = Compound.query.filter(Compound.created_by == 'synthetic').count()
+        if existing < scale:
+            print(f'Generating {scale - existing} synthetic compounds...')
+            start = time.perf_counter()
+            insert_compounds(db, generate_compounds(scale - existing, seed=seed, start=existing))
+            print(f'Dataset ready in {time.perf_counter() - start:.1f}s')
+
+
+def build_benchmarks(app, cli, scale: int, seed: int, workdir: Path) -> list:
+    """Return the benchmark list for an application instance"""
+    from click.testing import CliRunner
+    from models import db, Compound
+    from routes.main import load_compounds_data, load_dashboard_data
+    from utils.compound_snapshot import build as build_snapshot
+    from utils.data_version import bump
+    from utils.database import get_setting, set_setting, log_activity
+    from utils.metrics import flush, record_query, record_request
+    from utils.synthetic import generate_compounds
+
+    client = app.test_client()
+    pages = max(1, scale // 24)
+    state = {'page': 0}
+
+    def get(path):
+        def run():
+            response = client.get(path() if callable(path) else path)
+            assert response.status_code == 200, f'{response.status_code} from {path}'
+        return run
+
+    def next_page():
+        # Cycle through the first few pages so not every request hits offset 0
+        state['page'] = state['page'] % min(pages, 5) + 1
+        return f'/compounds?page={state["page"]}'
+
+    def in_context(f):
+        def run():
+            with app.app_context():
+                f()
+        return run
+
+    # import-compounds reads a JSON file; the imported rows are removed again
+    # after each run so every run imports the same number of new compounds.
+    import_file = workdir / 'import.json'
+    import_file.write_text(json.dumps(list(generate_compounds(IMPORT_BATCH, seed=seed + 1, start=10 ** 8))))
+    runner = CliRunner()
+
+    def run_import():
+        result = runner.invoke(cli, ['import-compounds', '--file', str(import_file)])
+        assert result.exit_code == 0, result.output
+
+    def remove_imported():
+        with app.app_context():
+            imported = Compound.query.filter(Compound.created_by == 'import').all()
+            for compound in imported:
+                compound.therapeutic_areas = []
+                db.session.delete(compound)
+            db.session.commit()
+
+    def rehash_batch():
+        compounds = Compound.query.order_by(Compound.id).limit(SYNC_HASH_BATCH).all()
+        for compound in compounds:
+            compound.update_sync_hash()
+
+    simulations = {}
+
+    def nucleoid_steps(beads, steps):
+        # The system is built (and equilibrated a little) outside the timing,
+        # once, so later runs continue the same trajectory
+        def setup():
+            if beads not in simulations:
+                from utils.nucleoid.engine import Params, Simulation
+                simulations[beads] = Simulation(Params(beads=beads, crowders=beads // 10, seed=seed))
+                simulations[beads].run(steps)
+
+        return Benchmark(f'nucleoid_steps_{beads}', lambda: simulations[beads].run(steps), setup=setup,
+                         units=steps, unit='step', repeat=3)
+
+    def record_metrics():
+        # What instrumentation adds to a request issuing two queries, to set against api_status
+        for _ in range(METRICS_BATCH):
+            record_query('compounds.db', 'SELECT 1', 0.0002)
+            record_query('compounds.db', 'SELECT 1', 0.0002)
+            record_request('benchmark', 'GET', 200, 0.001, 2, 0.0004)
+            flush()
+
+    def read_setting():
+        # 'version' is seeded by init_db and read by /api/status: the hit path
+        assert get_setting('version') is not None
+
+    counter = {'n': 0}
+
+    def write_setting():
+        counter['n'] += 1
+        set_setting('benchmark_counter', str(counter['n']))
+
+    return [
+        Benchmark('compounds_page', get(next_page), unit='request', repeat=50),
+        Benchmark('compounds_page_uncached', get(next_page), setup=lambda: bump('benchmark'), unit='request'),
+        Benchmark('compounds_snapshot_page', in_context(lambda: load_compounds_data(1)), unit='call'),
+        Benchmark('compound_snapshot_build', in_context(lambda: build_snapshot('benchmark')),
+                  units=scale, unit='compound', repeat=3),
+        Benchmark('dashboard', get('/'), unit='request', repeat=50),
+        Benchmark('dashboard_uncached', get('/'), setup=lambda: bump('benchmark'), unit='request'),
+        Benchmark('dashboard_data_uncached', in_context(load_dashboard_data.uncached), unit='call'),
+        Benchmark('import_compounds', run_import, teardown=remove_imported,
+                  units=IMPORT_BATCH, unit='compound', repeat=5),
+        Benchmark('update_sync_hash', in_context(rehash_batch), units=SYNC_HASH_BATCH, unit='compound'),
+        Benchmark('api_status', get('/api/status'), unit='request', repeat=100),
+        Benchmark('api_health', get('/api/health'), unit='request', repeat=100),
+        Benchmark('metrics_record_request', record_metrics, units=METRICS_BATCH, unit='request'),
+        Benchmark('get_setting', read_setting, unit='call', repeat=200),
+        Benchmark('set_setting', write_setting, unit='call', repeat=50),
+        Benchmark('log_activity', lambda: log_activity('benchmark', '127.0.0.1', 'benchmark run'),
+                  unit='call', repeat=100),
+        *(nucleoid_steps(beads, steps) for beads, steps in NUCLEOID_STEPS.items()),
+    ]
+
+
+def compare(results: dict, baselines: dict, threshold: float) -> list:
+    """Return (name, baseline ratio, current ratio) for every benchmark slower than its baseline allows"""
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not baseline or 'ratio' not in baseline:
+            continue
+        if result['ratio'] > baseline['ratio'] * (1 + threshold):
+            regressions.append((name, baseline['ratio'], result['ratio']))
+    return regressions
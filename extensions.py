@@ -1,16 +1,47 @@
 # extensions.py
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_caching import Cache
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
-
-db = SQLAlchemy()
-migrate = Migrate()
-cache = Cache()
-
-# ✅ key_func and default_limits must go here
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
-)
+
+from utils.db_routing import RoutingSession
+
+# GET requests read through a read-only pool; see utils/db_routing.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+# Everything except the database serves web requests only (CLI commands never
+# touch it), and Flask-Migrate (Alembic) is only needed for `flask db ...`, so
+# these instances are built, and their packages imported, on first access.
+def _make_migrate():
+    from flask_migrate import Migrate
+    return Migrate()
+
+
+def _make_cache():
+    from flask_caching import Cache
+    return Cache()
+
+
+def _make_csrf():
+    from flask_wtf.csrf import CSRFProtect
+    return CSRFProtect()
+
+
+def _make_limiter():
+    from flask_limiter import Limiter
+    from flask_limiter.util import get_remote_address
+
+    # The application's only Limiter; create_app calls limiter.init_app(app)
+    return Limiter(
+        key_func=get_remote_address,
+        default_limits=["200 per day", "50 per hour"]
+    )
+
+
+_LAZY = {'migrate': _make_migrate, 'cache': _make_cache, 'csrf': _make_csrf, 'limiter': _make_limiter}
+
+
+def __getattr__(name):
+    factory = _LAZY.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = factory()
+    return value
@@ -0,0 +1,54 @@
+"""
+Gunicorn configuration for ModularNucleoid P2P Demo
+
+Usage: gunicorn -c gunicorn.conf.py "app:create_app()"
+
+GUNICORN_PRELOAD=1 creates the app once in the master and forks workers from
+it (faster worker boot, shared read-only memory). The app is preload-safe:
+pooled database connections are dropped in each child after the fork, and
+per-process state (metrics, cache connections, log descriptors) is re-created
+lazily per worker PID. PROFILE_STARTUP=1 logs import and startup timings once
+each worker has booted.
+"""
+
+import os
+
+from utils import startup  # standard library only; starts the import timer if PROFILE_STARTUP=1
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+# The app sizes its per-process admission limits and alignment pool by the worker count
+os.environ['GUNICORN_WORKERS'] = str(workers)
+# Threads per worker (gthread). Each open dashboard event stream holds a
+# thread, so sync workers with one thread would be exhausted by a few viewers.
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+# ...and caps live dashboard streams at half the threads (utils/live.py)
+os.environ['GUNICORN_THREADS'] = str(threads)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+
+def on_starting(server):
+    """Runs once in the master before any worker is forked"""
+    # Per-worker metric snapshots from a previous run would otherwise be merged
+    # into this run's totals.
+    from utils.metrics import clear_snapshots
+    clear_snapshots()
+
+    # Static assets are served from .gz/.br siblings, which only deploy-time
+    # steps like this one write; a read-only checkout just serves them plain.
+    from utils.compression import precompress_static
+    try:
+        written = precompress_static(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+        server.log.info(f"Precompressed {len(written)} static files")
+    except OSError as e:
+        server.log.warning(f"Could not precompress static files: {e}")
+
+
+def post_worker_init(worker):
+    """Runs in each worker once the app is loaded"""
+    # Serving processes pick compute-kernel backends at boot (utils/kernels)
+    from app import start_kernel_selection
+    start_kernel_selection()
+
+    if startup.is_enabled():
+        worker.log.info(f"Worker {worker.pid} startup profile:\n{startup.report()}")
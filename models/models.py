@@ -10,7 +10,21 @@ from extensions import db
 compound_therapeutic_area = db.Table(
     'compound_therapeutic_area',
     db.Column('compound_id', db.Integer, db.ForeignKey('compound.id'), primary_key=True),
-    db.Column('therapeutic_area_id', db.Integer, db.ForeignKey('therapeutic_area.id'), primary_key=True)
+    db.Column('therapeutic_area_id', db.Integer, db.ForeignKey('therapeutic_area.id'), primary_key=True),
+    # The primary key only serves lookups by compound; this one serves lookups by area
+    db.Index('ix_compound_therapeutic_area_area', 'therapeutic_area_id', 'compound_id')
+)
+
+# Closure of Disease -> TherapeuticArea -> Compound, maintained by utils/disease_closure.py.
+# Rows go away with their compound, disease or area (SQLite enforces the cascades).
+disease_compound = db.Table(
+    'disease_compound',
+    db.Column('disease_id', db.Integer, db.ForeignKey('disease.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('compound_id', db.Integer, db.ForeignKey('compound.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('therapeutic_area_id', db.Integer, db.ForeignKey('therapeutic_area.id', ondelete='CASCADE'),
+              nullable=False),
+    db.Index('ix_disease_compound_compound', 'compound_id'),
+    db.Index('ix_disease_compound_area', 'therapeutic_area_id')
 )
 
 class Compound(db.Model):
@@ -39,9 +53,30 @@ class Compound(db.Model):
         backref=db.backref('compounds', lazy=True)
     )
 
+    # Columns that contribute to the sync hash, besides the therapeutic area names
+    SYNC_HASH_FIELDS = (
+        'name', 'molecular_formula', 'molecular_weight', 'cas_number', 'smiles', 'description',
+        'clinical_phase', 'mechanism_of_action', 'biochemical_group_id'
+    )
+
+    @classmethod
+    def compute_sync_hash(cls, fields, therapeutic_area_names):
+        """SHA256 over the sync fields of a mapping; shared by ORM objects and bulk loaders."""
+        data_to_hash = {field: fields.get(field) for field in cls.SYNC_HASH_FIELDS}
+        # Note: For many-to-many relationships like therapeutic_areas,
+        # you'd typically include their IDs or names sorted to ensure consistent hash.
+        data_to_hash['therapeutic_areas'] = sorted(therapeutic_area_names)
+        return hashlib.sha256(json.dumps(data_to_hash, sort_keys=True).encode('utf-8')).hexdigest()
+
     def update_sync_hash(self):
         """Generates a SHA256 hash of the compound's key data for synchronization."""
-        data_to_hash = {
+        fields = {field: getattr(self, field) for field in self.SYNC_HASH_FIELDS}
+        self.sync_hash = self.compute_sync_hash(fields, [ta.name for ta in self.therapeutic_areas or []])
+
+    def to_dict(self):
+        """Plain-data representation, safe to cache and share across processes."""
+        return {
+            'id': self.id,
             'name': self.name,
             'molecular_formula': self.molecular_formula,
             'molecular_weight': self.molecular_weight,
@@ -50,13 +85,14 @@ class Compound(db.Model):
             'description': self.description,
             'clinical_phase': self.clinical_phase,
             'mechanism_of_action': self.mechanism_of_action,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'created_by': self.created_by,
+            'sync_hash': self.sync_hash,
             'biochemical_group_id': self.biochemical_group_id,
-            # Note: For many-to-many relationships like therapeutic_areas,
-            # you'd typically include their IDs or names sorted to ensure consistent hash.
-            # For simplicity, we'll omit them from the hash for now, but for true sync, they'd be needed.
-            'therapeutic_areas': sorted([ta.name for ta in self.therapeutic_areas]) if self.therapeutic_areas else []
+            'biochemical_group': self.biochemical_group.to_dict() if self.biochemical_group else None,
+            'therapeutic_areas': [area.to_dict() for area in self.therapeutic_areas]
         }
-        self.sync_hash = hashlib.sha256(json.dumps(data_to_hash, sort_keys=True).encode('utf-8')).hexdigest()
 
     def __repr__(self):
         return f'<Compound {self.name}>'
@@ -70,6 +106,15 @@ class BiochemicalGroup(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'category': self.category,
+            'color': self.color,
+            'description': self.description
+        }
+
     def __repr__(self):
         return f'<BiochemicalGroup {self.name}>'
 
@@ -80,6 +125,13 @@ class TherapeuticArea(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description
+        }
+
     def __repr__(self):
         return f'<TherapeuticArea {self.name}>'
 
@@ -92,10 +144,25 @@ class Disease(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'therapeutic_area_id': self.therapeutic_area_id
+        }
+
     def __repr__(self):
         return f'<Disease {self.name}>'
 
 class Study(db.Model):
+    # Date-interval lookups ("active on a date": start_date <= d and end_date >= d or open-ended)
+    # range-scan start_date and check end_date from the index, overall or per compound
+    __table_args__ = (
+        db.Index('ix_study_interval', 'start_date', 'end_date'),
+        db.Index('ix_study_compound_interval', 'compound_id', 'start_date', 'end_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
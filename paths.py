@@ -3,6 +3,7 @@ Path Configuration for ModularNucleoid P2P Demo
 Centralized path management using pathlib
 """
 
+import os
 from pathlib import Path
 
 # Base application directory
@@ -11,7 +12,7 @@ BASE_DIR = Path(__file__).parent.resolve()
 # Core directories
 TEMPLATES_DIR = BASE_DIR / "templates"
 STATIC_DIR = BASE_DIR / "static"
-LOGS_DIR = BASE_DIR / "logs"
+LOGS_DIR = Path(os.environ.get("LOGS_DIR", BASE_DIR / "logs"))  # overridable like DATABASE_DIR
 ROUTES_DIR = BASE_DIR / "routes"
 UTILS_DIR = BASE_DIR / "utils"
 
@@ -21,10 +22,19 @@ JS_DIR = STATIC_DIR / "js"
 UPLOADS_DIR = STATIC_DIR / "uploads"
 IMAGES_DIR = STATIC_DIR / "images"
 
-# Database paths
-DATABASE_DIR = BASE_DIR / "data"
+# Database paths (DATABASE_DIR can be overridden, e.g. to benchmark against scratch data)
+DATABASE_DIR = Path(os.environ.get("DATABASE_DIR", BASE_DIR / "data"))
 DATABASE_PATH = DATABASE_DIR / "database.db"
+COMPOUNDS_DB_PATH = DATABASE_DIR / "compounds.db"
 BACKUP_DIR = DATABASE_DIR / "backups"
+RESULTS_DIR = DATABASE_DIR / "results"
+CACHE_DB_PATH = DATABASE_DIR / "cache.db"
+DATA_VERSION_PATH = DATABASE_DIR / "data_version"
+METRICS_DIR = Path(os.environ.get("METRICS_DIR", DATABASE_DIR / "metrics"))
+JOBS_DIR = DATABASE_DIR / "jobs"
+SEQUENCES_DIR = DATABASE_DIR / "sequences"
+SIMULATIONS_DIR = DATABASE_DIR / "simulations"
+KERNEL_SELECTION_PATH = DATABASE_DIR / "kernel_selection.json"
 
 # Configuration paths
 ENV_FILE = BASE_DIR / ".env"
@@ -36,7 +46,7 @@ ERROR_LOG = LOGS_DIR / "error.log"
 ACCESS_LOG = LOGS_DIR / "access.log"
 
 def ensure_directories():
-    """Ensure all necessary directories exist"""
+    """Ensure all necessary directories exist (called by create_app, not on import)"""
     directories = [
         LOGS_DIR,
         UPLOADS_DIR,
@@ -63,6 +73,3 @@ def get_log_path(log_type: str) -> Path:
         'access': ACCESS_LOG
     }
     return log_paths.get(log_type, APP_LOG)
-
-# Initialize directories on import
-ensure_directories()
@@ -2,14 +2,22 @@
 API routes for REST endpoints
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from datetime import datetime
+import json
+from extensions import csrf
 from utils.database import get_db_connection, get_setting # get_setting for potential API key validation
-from utils.helpers import validate_api_key # Assuming you'd add this utility
+from utils.helpers import validate_api_key, admin_required # Assuming you'd add this utility
+from utils.result_cache import is_valid_key, result_key, verify
+from utils.data_version import conditional, current as data_version
+from utils.compound_snapshot import served_version as snapshot_version
+from utils.facets import served_version as facets_version
+from utils.admission import admit
 import logging
 
 logger = logging.getLogger(__name__)
 api_bp = Blueprint('api', __name__)
+_LIVE_BODY = json.dumps({"status": "alive"}).encode('utf-8')
 
 @api_bp.route('/status')
 def api_status():
@@ -21,29 +29,95 @@ def api_status():
         "service": "ModularNucleoid P2P Demo"
     })
 
+def _health_response(body: bytes, healthy: bool, failure: int = 503):
+    response = current_app.response_class(body, status=200 if healthy else failure, mimetype='application/json')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @api_bp.route('/health')
 def health_check():
-    """Health check endpoint"""
-    try:
-        # Test database connection
-        conn = get_db_connection()
-        conn.execute('SELECT 1')
-        conn.close()
+    """Health check endpoint: healthy, or unhealthy with a 500, as of the last background refresh"""
+    from utils.health import get_monitor
+    monitor = get_monitor(current_app._get_current_object())
+    return _health_response(monitor.body('public'), monitor.is_ready(), failure=500)
 
-        return jsonify({
-            "status": "healthy",
-            "database": "connected",
-            "timestamp": datetime.now().isoformat()
-        })
-    except Exception as e:
-        logger.error(f"API Health check failed: {e}")
-        return jsonify({
-            "status": "unhealthy",
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }), 500
+@api_bp.route('/health/report')
+@admin_required
+def health_report():
+    """Full health report (pids, paths, pool usage): every component check from the last refresh"""
+    from utils.health import get_monitor
+    monitor = get_monitor(current_app._get_current_object())
+    return _health_response(monitor.body(), monitor.is_ready())
+
+@api_bp.route('/health/live')
+def health_live():
+    """Liveness probe: the process is up and serving requests"""
+    return _health_response(_LIVE_BODY, True)
+
+@api_bp.route('/health/ready')
+def health_ready():
+    """Readiness probe: critical checks passed at the last background refresh"""
+    from utils.health import get_monitor
+    monitor = get_monitor(current_app._get_current_object())
+    return _health_response(monitor.body('ready'), monitor.is_ready())
+
+@api_bp.route('/metrics')
+@admin_required
+def metrics():
+    """Prometheus metrics aggregated across all worker processes on this host (scrape with the admin token)"""
+    from utils.metrics import collect, render_prometheus
+    return current_app.response_class(
+        render_prometheus(collect()),
+        mimetype='text/plain; version=0.0.4'
+    )
+
+@api_bp.route('/stream/dashboard')
+def dashboard_stream():
+    """Server-Sent Events feed of dashboard changes: compounds, workers and job progress"""
+    from utils.live import get_detector
+
+    detector = get_detector(current_app._get_current_object())
+    subscription = detector.subscribe()
+    if subscription is None:
+        response = jsonify({"success": False, "error": "Too many live viewers; try again later"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    def stream():
+        try:
+            yield b'retry: 5000\n\n'
+            yield from subscription.frames()
+        finally:
+            # Runs when the client disconnects and the server closes the response
+            detector.unsubscribe(subscription)
+
+    response = current_app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # no proxy buffering (nginx)
+    return response
+
+@api_bp.route('/debug/profile')
+@admin_required
+@admit('profile')
+def debug_profile():
+    """Sample this worker's thread stacks and return collapsed stacks for flamegraph tools"""
+    from utils.profiler import profile_for, save_profile, DEFAULT_RATE
+
+    seconds = min(max(request.args.get('seconds', 10, type=float), 0.1), current_app.config['PROFILE_MAX_SECONDS'])
+    rate = request.args.get('rate', DEFAULT_RATE, type=int)
+
+    sampler = profile_for(seconds, rate=rate)
+    collapsed = sampler.collapsed()
+
+    response = current_app.response_class(collapsed, mimetype='text/plain')
+    response.headers['X-Profile-Samples'] = str(sampler.samples)
+    if request.args.get('save', '').lower() in ('1', 'true', 'yes'):
+        response.headers['X-Profile-Path'] = save_profile(collapsed, label='profile-http')
+    return response
 
 @api_bp.route('/data')
+@conditional()
 def get_data():
     """Get application data (example protected endpoint)"""
     # Example API endpoint - customize as needed
@@ -68,3 +142,543 @@ def get_data():
             "success": False,
             "error": "Data fetch failed"
         }), 500
+
+
+@api_bp.route('/results/<key>', methods=['GET'])
+def get_result(key):
+    """Look up a cached computation result by its content address"""
+    if not is_valid_key(key):
+        return jsonify({"success": False, "error": "Invalid result key"}), 400
+
+    payload = current_app.extensions['result_cache'].get(key)
+    if payload is None:
+        return jsonify({"success": False, "error": "Result not found"}), 404
+
+    response = current_app.response_class(payload, mimetype='application/json')
+    # A key always maps to the same result, so clients may keep it forever
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@api_bp.route('/results/<key>', methods=['PUT'])
+@csrf.exempt
+def put_result(key):
+    """
+    Store a computation result under its content address. Body:
+    {"input": "...", "kernel_version": "...", "result": ...}. The key must be the
+    address of that input and version, and the result is recomputed with the
+    server's copy of the kernel before it is stored.
+    """
+    if not is_valid_key(key):
+        return jsonify({"success": False, "error": "Invalid result key"}), 400
+
+    # The input travels with the result, so allow for both
+    if (request.content_length or 0) > 2 * current_app.config['RESULT_CACHE_MAX_ENTRY_BYTES']:
+        return jsonify({"success": False, "error": "Result too large"}), 413
+
+    body = request.get_json(silent=True)
+    if (not isinstance(body, dict) or 'result' not in body or not isinstance(body.get('input'), str)
+            or not isinstance(body.get('kernel_version'), str)):
+        return jsonify({"success": False,
+                        "error": "Body must be a JSON object with 'input', 'kernel_version' and 'result'"}), 400
+    if result_key(body['input'], body['kernel_version']) != key:
+        return jsonify({"success": False, "error": "Key does not match the input and kernel version"}), 400
+    if not verify(body['input'], body['kernel_version'], body['result']):
+        logger.warning(f"Rejected unverifiable result {key} ({body['kernel_version']}) from {request.remote_addr}")
+        return jsonify({"success": False, "error": "Result could not be verified"}), 422
+
+    payload = json.dumps({'result': body['result']}, separators=(',', ':')).encode('utf-8')
+    if len(payload) > current_app.config['RESULT_CACHE_MAX_ENTRY_BYTES']:
+        return jsonify({"success": False, "error": "Result too large"}), 413
+
+    try:
+        created = current_app.extensions['result_cache'].put(key, payload)
+    except OSError as e:
+        logger.error(f"Failed to store result {key}: {e}")
+        return jsonify({"success": False, "error": "Result store failed"}), 500
+
+    return jsonify({"success": True, "key": key, "created": created}), 201 if created else 200
+
+MAX_BATCH_IDENTIFIERS = 5000
+
+def _batch_cost():
+    """Admission cost of a batch lookup: a unit per thousand identifiers"""
+    body = request.get_json(silent=True)
+    identifiers = body.get('identifiers') if isinstance(body, dict) else None
+    return max(1, len(identifiers) / 1000) if isinstance(identifiers, list) else 1
+
+@api_bp.route('/compounds/batch', methods=['POST'])
+@csrf.exempt
+@admit('compute', _batch_cost)
+def compounds_batch():
+    """
+    Resolve many compounds in one request. Body:
+    {"identifiers": [...], "kind": "auto|id|name|cas_number|sync_hash", "fields": [...]}
+    Results come back in input order; unknown identifiers have "found": false.
+    """
+    from utils.compound_lookup import KINDS, resolve
+    from utils.db_routing import reading
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('identifiers'), list):
+        return jsonify({"success": False, "error": "Body must be a JSON object with an 'identifiers' list"}), 400
+
+    identifiers = body['identifiers']
+    limit = current_app.config.get('MAX_BATCH_IDENTIFIERS', MAX_BATCH_IDENTIFIERS)
+    if len(identifiers) > limit:
+        return jsonify({"success": False, "error": f"Too many identifiers (at most {limit} per request)"}), 400
+    if any(not isinstance(identifier, (str, int)) for identifier in identifiers):
+        return jsonify({"success": False, "error": "Identifiers must be strings or integers"}), 400
+
+    kind = body.get('kind', 'auto')
+    if kind != 'auto' and kind not in KINDS:
+        return jsonify({"success": False, "error": f"Unknown kind {kind!r}"}), 400
+    fields = body.get('fields')
+    if fields is not None and not (isinstance(fields, list) and all(isinstance(field, str) for field in fields)):
+        return jsonify({"success": False, "error": "'fields' must be a list of field names"}), 400
+
+    try:
+        # A lookup only reads, so use the read pool even though this is a POST
+        with reading():
+            resolved = resolve(identifiers, kind)
+            results = []
+            for identifier, matched_kind, compound in resolved:
+                entry = {"query": identifier, "kind": matched_kind, "found": compound is not None}
+                if compound is not None:
+                    data = compound.to_dict()
+                    entry["compound"] = {field: data[field] for field in fields if field in data} if fields else data
+                results.append(entry)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    found = sum(1 for entry in results if entry["found"])
+    return jsonify({
+        "success": True,
+        "count": len(results),
+        "found": found,
+        "missing": [entry["query"] for entry in results if not entry["found"]],
+        "results": results
+    })
+
+@api_bp.route('/compounds')
+@conditional(version=snapshot_version)
+def compounds_list():
+    """
+    Compound listing from the worker's in-memory snapshot: facet filters as for /compounds/facets,
+    ?search= (name or CAS substring), ?sort=name|molecular_weight|created_at|updated_at|id,
+    ?order=asc|desc, ?page=, ?per_page= (up to 500) and ?fields= (comma-separated).
+    """
+    from utils.compound_snapshot import SORT_KEYS, get_snapshot
+    from utils.facets import parse_filters
+
+    sort = request.args.get('sort', 'name')
+    if sort not in SORT_KEYS:
+        return jsonify({"success": False, "error": f"sort must be one of {', '.join(SORT_KEYS)}"}), 400
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+    fields = [field for field in request.args.get('fields', '').split(',') if field]
+
+    snapshot = get_snapshot(current_app._get_current_object()).current()
+    rows = snapshot.select(parse_filters(request.args), request.args.get('search', '').strip(),
+                           sort, request.args.get('order') == 'desc')
+    compounds = snapshot.to_dicts(rows[(page - 1) * per_page:page * per_page])
+    if fields:
+        compounds = [{field: data[field] for field in fields if field in data} for data in compounds]
+    return jsonify({
+        "success": True,
+        "total": len(rows),
+        "page": page,
+        "per_page": per_page,
+        "pages": max(1, -(-len(rows) // per_page)),
+        "compounds": compounds
+    })
+
+@api_bp.route('/compounds/autocomplete')
+def compounds_autocomplete():
+    """Typeahead suggestions for compound names and CAS numbers, from the in-memory prefix index"""
+    from utils.prefix_index import get_index
+
+    prefix = request.args.get('prefix', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    if not prefix:
+        return jsonify({"success": True, "prefix": prefix, "suggestions": []})
+
+    suggestions = get_index(current_app._get_current_object()).search(prefix, limit)
+    return jsonify({"success": True, "prefix": prefix, "suggestions": suggestions})
+
+@api_bp.route('/compounds/facets')
+@conditional(version=facets_version)
+def compounds_facets():
+    """Facet counts for the compound filters, e.g. ?group=1&phase=Approved&disease=3"""
+    from utils.facets import get_index, parse_filters
+
+    filters = parse_filters(request.args)
+    counts = get_index(current_app._get_current_object()).facet_counts(filters)
+    return jsonify({
+        "success": True,
+        "filters": filters,
+        "total": counts['total'],
+        # JSON object keys must be strings
+        "facets": {facet: {str(value): count for value, count in values.items()}
+                   for facet, values in counts['facets'].items()}
+    })
+
+MAX_ALIGN_LENGTH = 50000          # residues per sequence
+MAX_TRACEBACK_CELLS = 25_000_000  # one byte each
+MAX_ALIGN_PAIRS = 1000
+
+def _align_cost():
+    """Admission cost of an alignment request: a unit per million dynamic-programming cells"""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return 1
+    queries = body.get('queries', [body.get('a')])
+    targets = body.get('targets', [body.get('b')])
+    if not isinstance(queries, list) or not isinstance(targets, list):
+        return 1
+    query_length = sum(len(q) for q in queries if isinstance(q, str))
+    target_length = sum(len(t) for t in targets if isinstance(t, str))
+    return max(1, query_length * target_length / 1e6)
+
+def _align_slots():
+    """Compute slots of an alignment request: one per process a pooled batch keeps busy"""
+    from utils.alignment import processes_for
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('queries'), list) \
+            or not isinstance(body.get('targets'), list):
+        return 1
+    queries = [q for q in body['queries'] if isinstance(q, str)]
+    targets = [t for t in body['targets'] if isinstance(t, str)]
+    return processes_for(queries, targets)
+
+@api_bp.route('/sequence/align', methods=['POST'])
+@csrf.exempt
+@admit('compute', _align_cost, _align_slots)
+def sequence_align():
+    """
+    Pairwise alignment. Body: {"a": "...", "b": "..."} for one pair, or
+    {"queries": [...], "targets": [...]} for every query against every target, plus
+    optional "mode" (global|local), "band", "score_only" and "scoring"
+    ({"match", "mismatch", "gap_open", "gap_extend"}).
+    """
+    from utils.alignment import MODES, Scoring, align, align_many
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"success": False, "error": "Body must be a JSON object"}), 400
+    batch = 'queries' in body or 'targets' in body
+    queries = body.get('queries') if batch else [body['a']] if 'a' in body else None
+    targets = body.get('targets') if batch else [body['b']] if 'b' in body else None
+    if not isinstance(queries, list) or not isinstance(targets, list) or not queries or not targets:
+        return jsonify({"success": False, "error": "Provide 'a' and 'b', or non-empty 'queries' and 'targets' lists"}), 400
+
+    sequences = queries + targets
+    if any(not isinstance(sequence, str) or not sequence.isalpha() or not sequence.isascii() for sequence in sequences):
+        return jsonify({"success": False, "error": "Sequences must be non-empty strings of letters"}), 400
+    if max(len(sequence) for sequence in sequences) > MAX_ALIGN_LENGTH:
+        return jsonify({"success": False, "error": f"Sequences are limited to {MAX_ALIGN_LENGTH} residues"}), 400
+    if len(queries) * len(targets) > MAX_ALIGN_PAIRS:
+        return jsonify({"success": False, "error": f"At most {MAX_ALIGN_PAIRS} pairs per request"}), 400
+
+    mode = body.get('mode', 'global')
+    if mode not in MODES:
+        return jsonify({"success": False, "error": f"Unknown mode {mode!r}"}), 400
+    score_only = bool(body.get('score_only', batch))
+    if not score_only:
+        cells = sum((len(q) + 1) * (len(t) + 1) for q in queries for t in targets)
+        if cells > MAX_TRACEBACK_CELLS:
+            return jsonify({"success": False,
+                            "error": "Too large for a traceback; use \"score_only\": true or a smaller input"}), 400
+    scoring = body.get('scoring') or {}
+    if not isinstance(scoring, dict) or any(key not in Scoring._fields or not isinstance(value, int)
+                                            for key, value in scoring.items()):
+        return jsonify({"success": False, "error": f"'scoring' takes integer {', '.join(Scoring._fields)}"}), 400
+
+    options = {'mode': mode, 'band': body.get('band'), 'score_only': score_only, 'scoring': Scoring(**scoring)}
+    try:
+        if not batch:
+            return jsonify({"success": True, **align(queries[0], targets[0], **options)})
+        results = align_many(queries, targets, **options)
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    return jsonify({
+        "success": True,
+        "count": len(results),
+        "results": [{"query": qi, "target": ti, **result} for qi, ti, result in results]
+    })
+
+@api_bp.route('/sequence', methods=['GET'])
+def sequence_list():
+    """Stored sequences"""
+    from utils.sequences import list_sequences
+
+    return jsonify({"success": True, "sequences": list_sequences()})
+
+@api_bp.route('/sequence', methods=['POST'])
+@csrf.exempt
+@admit('upload', lambda: max(1, (request.content_length or 0) / 1e6))  # a unit per megabyte
+def sequence_upload():
+    """
+    Store a sequence and build its track pyramid. The body is FASTA (one record)
+    or bare bases, sent raw or as a multipart "file"; ?name= overrides the header.
+    Uploads are bounded by MAX_CONTENT_LENGTH; use `app.py import-sequence` for larger genomes.
+    """
+    from utils import jobs
+    from utils.sequences import SequenceError, store
+
+    upload = request.files.get('file')
+    stream = upload.stream if upload is not None else request.stream
+    with jobs.start('Index uploaded sequence', total=request.content_length) as job:
+        try:
+            meta = store(iter(lambda: stream.read(1024 * 1024), b''), request.args.get('name'),
+                         progress=job.advance)
+        except SequenceError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "sequence": meta}), 201
+
+@api_bp.route('/sequence/<sequence_id>')
+def sequence_detail(sequence_id):
+    from utils.sequences import load_meta
+
+    try:
+        return jsonify({"success": True, "sequence": load_meta(sequence_id)})
+    except KeyError:
+        return jsonify({"success": False, "error": "Sequence not found"}), 404
+
+@api_bp.route('/sequence/<sequence_id>/track')
+def sequence_track(sequence_id):
+    """GC content and skews of a region binned to the screen, e.g. ?start=0&end=5000000&px=1200"""
+    from utils.sequences import track
+
+    start = request.args.get('start', 0, type=int)
+    end = request.args.get('end', type=int)
+    px = request.args.get('px', 1000, type=int)
+    try:
+        data = track(sequence_id, start, end if end is not None else 2 ** 62, px)
+    except KeyError:
+        return jsonify({"success": False, "error": "Sequence not found"}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    response = jsonify({"success": True, **data})
+    # Ids are content hashes, so a region of a sequence never changes
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+MAX_COMPOSITION_BASES = 20_000_000
+# Bump whenever the composition result changes so cached results are not reused
+COMPOSITION_KERNEL_VERSION = 'composition/1'
+
+def _composition_cost():
+    """Admission cost of a composition request: a unit per million bases"""
+    start = max(0, request.args.get('start', 0, type=int))
+    end = request.args.get('end', type=int)
+    bases = MAX_COMPOSITION_BASES if end is None else min(max(end - start, 0), MAX_COMPOSITION_BASES)
+    return max(1, bases / 1e6)
+
+@api_bp.route('/sequence/<sequence_id>/composition')
+@admit('compute', _composition_cost)
+def sequence_composition(sequence_id):
+    """GC content and k-mer counts of a region, e.g. ?k=3&start=0&end=100000"""
+    from utils import kernels
+    from utils.sequences import bases, load_meta
+
+    k = request.args.get('k', 2, type=int)
+    start = max(0, request.args.get('start', 0, type=int))
+    end = request.args.get('end', type=int)
+    if not 1 <= k <= 8:
+        return jsonify({"success": False, "error": "k must be between 1 and 8"}), 400
+    if end is not None and end - start > MAX_COMPOSITION_BASES:
+        return jsonify({"success": False, "error": f"Regions are limited to {MAX_COMPOSITION_BASES} bases"}), 400
+    end = end if end is not None else start + MAX_COMPOSITION_BASES
+    try:
+        load_meta(sequence_id)
+    except KeyError:
+        return jsonify({"success": False, "error": "Sequence not found"}), 404
+
+    def compute():
+        seq = bases(sequence_id, start, end)
+        counts = kernels.kmer_counts(seq, k)
+        return {
+            "end": start + len(seq),
+            "gc_content": round(kernels.gc_content(seq), 6),
+            "kmers": {kernels.kmer_label(int(index), k): int(counts[index]) for index in counts.nonzero()[0]},
+        }
+
+    # Sequence ids are content hashes, so a region's composition never changes
+    result = current_app.extensions['result_cache'].get_or_compute(
+        f'{sequence_id}:{start}:{end}:{k}', COMPOSITION_KERNEL_VERSION, compute)
+    return jsonify({
+        "success": True,
+        "id": sequence_id,
+        "start": start,
+        "end": result["end"],
+        "gc_content": result["gc_content"],
+        "k": k,
+        "kmers": result["kmers"],
+        "backends": {name: kernels.selection().choice[name] for name in ('gc_content', 'kmer_counts')}
+    })
+
+def _disease_compounds_version():
+    # Read from the database, so the data version applies; without ?active_on= the answer also changes daily
+    from datetime import date
+    return f'{data_version()}:{date.today()}'
+
+@api_bp.route('/diseases/<int:disease_id>/compounds')
+@conditional(version=_disease_compounds_version)
+def disease_compounds(disease_id):
+    """
+    Compounds relevant to a disease through its therapeutic area, from the closure table,
+    each with its studies active on ?active_on=YYYY-MM-DD (default today).
+    ?active_only=1 keeps only compounds with an active study; ?page= and ?per_page= paginate.
+    """
+    from datetime import date
+    from extensions import db
+    from models.models import Compound, Disease, Study, disease_compound
+
+    disease = (db.session.query(Disease.id, Disease.name, Disease.therapeutic_area_id)
+               .filter(Disease.id == disease_id).first())
+    if disease is None:
+        return jsonify({"success": False, "error": "Disease not found"}), 404
+    try:
+        active_on = date.fromisoformat(request.args['active_on']) if request.args.get('active_on') else date.today()
+    except ValueError:
+        return jsonify({"success": False, "error": "active_on must be a date (YYYY-MM-DD)"}), 400
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+
+    # Served by ix_study_compound_interval: compound, then a range on start_date, then end_date
+    active = db.and_(Study.start_date <= active_on, db.or_(Study.end_date.is_(None), Study.end_date >= active_on))
+    query = (db.session.query(Compound.id, Compound.name, Compound.cas_number, Compound.clinical_phase)
+             .join(disease_compound, disease_compound.c.compound_id == Compound.id)
+             .filter(disease_compound.c.disease_id == disease_id))
+    if request.args.get('active_only') in ('1', 'true'):
+        query = query.filter(db.exists().where(Study.compound_id == Compound.id, active))
+    total = query.count()
+    # Closure primary-key order, so paging needs no sort
+    rows = query.order_by(disease_compound.c.compound_id).offset((page - 1) * per_page).limit(per_page).all()
+
+    studies = {}
+    if rows:
+        for study in (db.session.query(Study.id, Study.compound_id, Study.title, Study.status,
+                                       Study.start_date, Study.end_date)
+                      .filter(Study.compound_id.in_([row.id for row in rows]), active)
+                      .order_by(Study.start_date)):
+            studies.setdefault(study.compound_id, []).append({
+                "id": study.id,
+                "title": study.title,
+                "status": study.status,
+                "start_date": study.start_date.isoformat() if study.start_date else None,
+                "end_date": study.end_date.isoformat() if study.end_date else None
+            })
+
+    return jsonify({
+        "success": True,
+        "disease": {"id": disease.id, "name": disease.name, "therapeutic_area_id": disease.therapeutic_area_id},
+        "active_on": active_on.isoformat(),
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "compounds": [{"id": row.id, "name": row.name, "cas_number": row.cas_number,
+                       "clinical_phase": row.clinical_phase, "active_studies": studies.get(row.id, [])}
+                      for row in rows]
+    })
+
+@api_bp.route('/simulations', methods=['GET'])
+def simulation_list():
+    """Nucleoid simulation runs, newest first"""
+    from utils.nucleoid import runs
+
+    return jsonify({"success": True, "simulations": runs.list_runs()})
+
+def _simulation_cost():
+    """Admission cost of starting a simulation: a unit per million bead-steps"""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return 1
+    try:
+        particles = int(body.get('beads', 2000)) + int(body.get('crowders', 0))
+        return max(1, particles * int(body.get('steps', 10_000)) / 1e6)
+    except (TypeError, ValueError):
+        return 1
+
+@api_bp.route('/simulations', methods=['POST'])
+@csrf.exempt
+@admit('simulation', _simulation_cost)
+def simulation_create():
+    """
+    Start a nucleoid simulation. The JSON body holds model parameters (beads, crowders, seed, ...)
+    and output settings (steps, frame_every, checkpoint_every, frame_beads, frame_crowders).
+    Returns 202 with the run; poll it and fetch /trajectory as frames arrive.
+    """
+    from utils.nucleoid import runs
+
+    options = request.get_json(silent=True)
+    if not isinstance(options, dict):
+        return jsonify({"success": False, "error": "Expected a JSON object"}), 400
+    if runs.at_capacity():
+        return jsonify({"success": False, "error": "Too many simulations running; try again later"}), 429
+    try:
+        run = runs.create(options)
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if not runs.start(run['id']):
+        # Another request took the last slot in the meantime
+        runs.delete(run['id'])
+        return jsonify({"success": False, "error": "Too many simulations running; try again later"}), 429
+    return jsonify({"success": True, "simulation": runs.load_run(run['id'])}), 202
+
+@api_bp.route('/simulations/<run_id>')
+def simulation_detail(run_id):
+    from utils.nucleoid import runs
+
+    try:
+        run = runs.load_run(run_id)
+    except KeyError:
+        return jsonify({"success": False, "error": "Simulation not found"}), 404
+    return jsonify({"success": True, "simulation": run, "resumable": runs.resumable(run)})
+
+@api_bp.route('/simulations/<run_id>/trajectory')
+def simulation_trajectory(run_id):
+    """Downsampled frames of a run for playback, e.g. ?start=0&limit=50&stride=2"""
+    from utils.nucleoid import runs
+
+    start = request.args.get('start', 0, type=int)
+    limit = min(max(request.args.get('limit', 50, type=int), 0), 200)
+    stride = max(request.args.get('stride', 1, type=int), 1)
+    try:
+        return jsonify({"success": True, **runs.frames(run_id, start, limit, stride)})
+    except KeyError:
+        return jsonify({"success": False, "error": "Simulation not found"}), 404
+
+@api_bp.route('/simulations/<run_id>/resume', methods=['POST'])
+@csrf.exempt
+@admit('simulation')
+def simulation_resume(run_id):
+    """Continue a stopped, failed or orphaned run from its last checkpoint"""
+    from utils.nucleoid import runs
+
+    try:
+        run = runs.load_run(run_id)
+    except KeyError:
+        return jsonify({"success": False, "error": "Simulation not found"}), 404
+    if not runs.resumable(run):
+        return jsonify({"success": False, "error": f"Simulation is {run['status']}"}), 409
+    if not runs.start(run_id):
+        return jsonify({"success": False, "error": "Too many simulations running; try again later"}), 429
+    return jsonify({"success": True, "simulation": runs.load_run(run_id)}), 202
+
+@api_bp.route('/simulations/<run_id>/stop', methods=['POST'])
+@csrf.exempt
+def simulation_stop(run_id):
+    """Checkpoint and stop a run, whichever worker executes it"""
+    from utils.nucleoid import runs
+
+    try:
+        stopping = runs.stop(run_id)
+    except KeyError:
+        return jsonify({"success": False, "error": "Simulation not found"}), 404
+    if not stopping:
+        return jsonify({"success": False, "error": "Simulation is not running"}), 409
+    return jsonify({"success": True}), 202
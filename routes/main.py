@@ -1,32 +1,106 @@
-from flask import Blueprint, render_template, current_app, request, jsonify
+import logging
+from flask import Blueprint, render_template, current_app, request, jsonify, flash, redirect, url_for, abort
 from sqlalchemy import func
 from datetime import datetime, timedelta # Ensure datetime and timedelta are imported
 
 # Import models directly. They already get 'db' from 'app' via 'from app import db' in models.py
-from models.models import Compound, BiochemicalGroup, TherapeuticArea, Disease, Study
+from models.models import Compound, Study
+from utils.shared_cache import cached
+from utils.data_version import conditional, bump
+from utils.compound_snapshot import served_version as snapshot_version
+from utils.facets import served_version as facets_version
 
 
 main_bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
+
+# In-memory worker registry (until workers are persisted in the database)
+workers_data = []
+next_worker_id = 1
+
+@cached(timeout=30)
+def load_dashboard_data():
+    """Query the dashboard statistics. Shared across workers via the cache."""
+    db = current_app.extensions['sqlalchemy']
+    total_compounds = db.session.query(Compound).count()
+    recent_compounds = db.session.query(Compound).order_by(Compound.created_at.desc()).limit(5).all()
+    return {
+        'total_compounds': total_compounds,
+        'recent_compounds': [compound.to_dict() for compound in recent_compounds]
+    }
+
+COMPOUNDS_PER_PAGE = 24
+
+class PageInfo:
+    """Picklable subset of Flask-SQLAlchemy's Pagination, safe to keep in the shared cache."""
+
+    def __init__(self, page, per_page, total):
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.pages = max(1, -(-total // per_page))
+        self.has_prev = page > 1
+        self.prev_num = page - 1 if self.has_prev else None
+        self.has_next = page < self.pages
+        self.next_num = page + 1 if self.has_next else None
+
+    def iter_pages(self, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        """Page numbers to link, with None marking elided ranges"""
+        last = 0
+        for num in range(1, self.pages + 1):
+            if (num <= left_edge
+                    or self.page - left_current - 1 < num < self.page + right_current
+                    or num > self.pages - right_edge):
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
+
+SORT_COLUMNS = ('name', 'molecular_weight', 'created_at')
+
+def load_compounds_data(page=1, filters=None, search=None, sort='name', descending=False):
+    """One page of the compounds listing and its statistics, from the worker's in-memory snapshot."""
+    from utils.compound_snapshot import get_snapshot
+    snapshot = get_snapshot(current_app._get_current_object()).current()
+
+    rows = snapshot.select(filters, search, sort if sort in SORT_COLUMNS else 'name', descending)
+    pagination = PageInfo(page, COMPOUNDS_PER_PAGE, len(rows))
+    offset = (pagination.page - 1) * COMPOUNDS_PER_PAGE
+
+    # Calculate recent additions (e.g., compounds added in the last 30 days)
+    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    stats = {
+        'total_compounds': len(snapshot),
+        'biochemical_groups': len(snapshot.groups),
+        'therapeutic_areas': len(snapshot.areas),
+        'recent_additions': snapshot.created_since(thirty_days_ago),
+    }
+
+    return {
+        'compounds': snapshot.to_dicts(rows[offset:offset + COMPOUNDS_PER_PAGE]),
+        'pagination': pagination,
+        'stats': stats,
+        'biochemical_groups': list(snapshot.groups.values()),
+        'diseases': [{'id': disease_id, 'name': name} for disease_id, name, _ in snapshot.diseases]
+    }
 
 @main_bp.route('/')
+@conditional(per_session=True)
 def dashboard():
     """
     Renders the main dashboard page.
     Fetches comprehensive data for display, including P2P/DNA context and stats.
     """
-    # Access the db instance from the current application context
-    db = current_app.extensions['sqlalchemy']
     try:
         # Data for Quick Stats and Recent Compounds sections
-        total_compounds = db.session.query(Compound).count()
-        recent_compounds = db.session.query(Compound).order_by(Compound.created_at.desc()).limit(5).all()
+        data = load_dashboard_data()
 
         # Pass datetime.utcnow() for server time display
         server_datetime = datetime.utcnow()
 
         return render_template('dashboard.html', title='Dashboard',
-                               total_compounds=total_compounds,
-                               recent_compounds=recent_compounds,
+                               total_compounds=data['total_compounds'],
+                               recent_compounds=data['recent_compounds'],
                                datetime=server_datetime) # Pass datetime for server time display
     except Exception as e:
         current_app.logger.error(f"Error loading dashboard data: {e}")
@@ -34,48 +108,48 @@ def dashboard():
         return render_template('dashboard.html', title='Dashboard',
                                error_message="Could not load dashboard data. Database might be empty or inaccessible.")
 
+def _compounds_version():
+    # The page comes from the snapshot and the facet index, which may lag the data version
+    return f'{snapshot_version()}:{facets_version()}'
+
 @main_bp.route('/compounds')
+@conditional(per_session=True, version=_compounds_version)
 def compounds():
     """
     Renders the compounds listing page.
-    Fetches all compounds and relevant statistics to display.
+    Fetches one page of compounds, filtered by ?search=, ?group=, ?disease= etc., and relevant statistics.
     """
-    # Access the db instance from the current application context
-    db = current_app.extensions['sqlalchemy']
     try:
-        all_compounds = db.session.query(Compound).all()
-        
-        # Calculate statistics needed by the template
-        total_compounds = db.session.query(Compound).count()
-        biochemical_groups_count = db.session.query(BiochemicalGroup).count()
-        therapeutic_areas_count = db.session.query(TherapeuticArea).count()
-
-        # Calculate recent additions (e.g., compounds added in the last 30 days)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_additions_count = db.session.query(Compound).filter(Compound.created_at >= thirty_days_ago).count()
-
-        # Create a stats dictionary to pass to the template
-        stats = {
-            'total_compounds': total_compounds,
-            'biochemical_groups': biochemical_groups_count,
-            'therapeutic_areas': therapeutic_areas_count,
-            'recent_additions': recent_additions_count,
-        }
-
-        # Fetch data for filters and periodic table navigation (if needed on compounds page)
-        biochemical_groups_data = db.session.query(BiochemicalGroup).all()
-        diseases_data = db.session.query(Disease).all()
+        # Filtering, sorting and the page itself come from the in-memory snapshot, and
+        # per-filter counts from the bitmap index; neither queries the database
+        from utils.facets import get_index, parse_filters
+        page = max(1, request.args.get('page', 1, type=int))
+        filters = parse_filters(request.args)
+        data = load_compounds_data(page, filters, request.args.get('search', '').strip(),
+                                   request.args.get('sort', 'name'), request.args.get('order') == 'desc')
+        facets = get_index(current_app._get_current_object()).facet_counts(filters)
 
         return render_template('compounds.html', title='Compounds',
-                               compounds=all_compounds,
-                               stats=stats, # Pass the 'stats' dictionary
-                               biochemical_groups=biochemical_groups_data, # Pass groups for filters
-                               diseases=diseases_data) # Pass diseases for filters
+                               compounds=data['compounds'],
+                               pagination=data['pagination'],
+                               stats=data['stats'], # Pass the 'stats' dictionary
+                               biochemical_groups=data['biochemical_groups'], # Pass groups for filters
+                               diseases=data['diseases'], # Pass diseases for filters
+                               facets=facets['facets'])
     except Exception as e:
         current_app.logger.error(f"Error loading compounds data: {e}")
         return render_template('compounds.html', title='Compounds',
                                error_message="Could not load compounds data. Database might be empty or inaccessible.")
 
+@main_bp.route('/compounds/<int:id>')
+def compound_detail(id):
+    """Renders a single compound."""
+    db = current_app.extensions['sqlalchemy']
+    compound = db.session.get(Compound, id)
+    if compound is None:
+        abort(404)
+    return render_template('compound_detail.html', title=compound.name, compound=compound)
+
 @main_bp.route('/fortran')
 def fortran():
     """
@@ -113,7 +187,7 @@ def simulate():
 def workers():
     """Renders the workers page with the list of workers and the add form."""
     # Temporarily remove 'workers=workers_data' to isolate the problem
-    print("Attempting to render workers.html without 'workers_data'") # Debug print
+    logger.debug("Rendering workers.html without 'workers_data'")
     return render_template('workers.html')
 
 @main_bp.route('/add_worker', methods=['POST']) # <-- Using main_bp.route here
@@ -150,6 +224,7 @@ def add_worker():
         }
         workers_data.append(new_worker)
         next_worker_id += 1
+        bump('worker added')
 
         flash(f'Worker "{worker_name}" added successfully!', 'success')
         return redirect(url_for('main.workers'))
@@ -175,16 +250,8 @@ def remove_worker(worker_id):
     original_len = len(workers_data)
     workers_data = [w for w in workers_data if w['id'] != worker_id]
     if len(workers_data) < original_len:
+        bump('worker removed')
         flash(f'Worker removed successfully.', 'success')
     else:
         flash(f'Worker not found.', 'danger')
     return redirect(url_for('main.workers'))
-
-
-
-# You can add more routes here for specific compound details, etc.
-# @main_bp.route('/compound/<int:compound_id>')
-# def compound_detail(compound_id):
-#     db = current_app.extensions['sqlalchemy']
-#     compound = db.session.query(Compound).get_or_404(compound_id)
-#     return render_template('compound_detail.html', title=compound.name, compound=compound)
\ No newline at end of file
@@ -9,7 +9,7 @@ peer.on('open', id => {
 peer.on('connection', c => {
   conn = c;
   conn.on('data', async data => {
-    const result = await runWasm(data);
+    const result = await cachedCompute(GC_KERNEL_VERSION, data, gcContent);
     conn.send(result);
   });
 });
@@ -28,16 +28,3 @@ function send() {
     conn.send(sequence);
   }
 }
-
-// Dummy Wasm loader + GC content calculator
-async function runWasm(dnaSeq) {
-  const wasm = await WebAssembly.instantiateStreaming(fetch('calc.wasm'));
-  const { gc_content } = wasm.instance.exports;
-
-  const encoded = new TextEncoder().encode(dnaSeq);
-  const mem = new Uint8Array(wasm.instance.exports.memory.buffer, 0, encoded.length);
-  mem.set(encoded);
-
-  const gc = gc_content(0, encoded.length); // Assume it reads memory directly
-  return `GC content: ${gc}%`;
-}
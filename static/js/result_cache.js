@@ -0,0 +1,52 @@
+// Content-addressed result cache client
+// Keys are sha256(input + "\0" + kernelVersion), matching utils/result_cache.py
+
+// Kernels whose results are shared. The server only stores a result its own
+// copy of the kernel (VERIFIERS in utils/result_cache.py) reproduces exactly,
+// so every page uses these and the version is bumped whenever the output changes.
+const GC_KERNEL_VERSION = 'gc_content/1';
+
+function gcContent(dnaSeq) {
+  const gcCount = (dnaSeq.match(/[GC]/g) || []).length;
+  const gcPercent = ((gcCount / dnaSeq.length) * 100).toFixed(2);
+  return `GC content: ${gcPercent}% (${gcCount}/${dnaSeq.length} nucleotides)`;
+}
+
+async function resultKey(input, kernelVersion) {
+  const bytes = new TextEncoder().encode(input + '\u0000' + kernelVersion);
+  const digest = await crypto.subtle.digest('SHA-256', bytes);
+  return Array.from(new Uint8Array(digest))
+              .map(b => b.toString(16).padStart(2, '0'))
+              .join('');
+}
+
+// Return a cached result for this input, computing and publishing it on a miss
+async function cachedCompute(kernelVersion, input, compute) {
+  // crypto.subtle is only available in secure contexts; compute directly otherwise
+  if (!(window.crypto && crypto.subtle)) {
+    return compute(input);
+  }
+
+  const key = await resultKey(input, kernelVersion);
+  try {
+    const response = await fetch(`/api/results/${key}`);
+    if (response.ok) {
+      const cached = await response.json();
+      return cached.result;
+    }
+  } catch (error) {
+    console.warn('Result cache lookup failed:', error);
+  }
+
+  const result = await compute(input);
+
+  // Publishing is best effort; the local result is returned either way. The
+  // server recomputes the result from the input before storing it.
+  fetch(`/api/results/${key}`, {
+    method: 'PUT',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ input: input, kernel_version: kernelVersion, result: result })
+  }).catch(error => console.warn('Result cache store failed:', error));
+
+  return result;
+}
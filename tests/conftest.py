@@ -0,0 +1,130 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Tests import the application's modules from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# paths.py resolves the data and log directories at import time: keep tests off the repository's
+_scratch = Path(tempfile.mkdtemp(prefix='mn-tests-'))
+os.environ['DATABASE_DIR'] = str(_scratch / 'data')
+os.environ['LOGS_DIR'] = str(_scratch / 'logs')
+os.environ['ACCESS_LOG_ENABLED'] = '0'
+(_scratch / 'data').mkdir()
+
+COMPOUNDS = 300
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as application
+
+    return application.create_app({'TESTING': True, 'RATELIMIT_ENABLED': False, 'ACCESS_LOG_ENABLED': False,
+                                   'ADMISSION_ENABLED': False})
+
+
+@pytest.fixture
+def db(app):
+    """A fresh compounds database of synthetic rows and two diseases per area, inside an app context"""
+    from extensions import db
+    from models.models import Disease, TherapeuticArea
+    from utils.db_routing import write_transaction
+    from utils.synthetic import generate_compounds, insert_compounds
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        insert_compounds(db, generate_compounds(COMPOUNDS, seed=7))
+
+        def add_diseases():
+            for area in TherapeuticArea.query.order_by(TherapeuticArea.id).all():
+                for number in (1, 2):
+                    db.session.add(Disease(name=f'{area.name} disorder {number}', therapeutic_area=area))
+        write_transaction(add_diseases)
+        yield db
+        db.session.remove()
+
+
+def _compound(offset: int):
+    from models.models import Compound
+
+    return Compound.query.order_by(Compound.id).offset(offset).first()
+
+
+def _other_area(compound):
+    from models.models import TherapeuticArea
+
+    return next(area for area in TherapeuticArea.query.order_by(TherapeuticArea.id)
+                if area not in compound.therapeutic_areas)
+
+
+def rename(db):
+    compound = _compound(10)
+    compound.name = f'Aaa {compound.name}'  # moves it in name order too
+    compound.cas_number = '99999-10-0'
+    compound.update_sync_hash()
+
+
+def insert(db):
+    from models.models import BiochemicalGroup, Compound, TherapeuticArea
+
+    group = BiochemicalGroup.query.order_by(BiochemicalGroup.id).first()
+    area = TherapeuticArea.query.order_by(TherapeuticArea.id).first()
+    compound = Compound(name='Zz inserted compound', cas_number='99999-20-0', clinical_phase='Approved',
+                        molecular_weight=123.4, created_by='test', biochemical_group=group)
+    compound.therapeutic_areas.append(area)
+    compound.update_sync_hash()
+    db.session.add(compound)
+
+
+def change_areas(db):
+    compound = _compound(20)
+    compound.therapeutic_areas.append(_other_area(compound))
+    compound.clinical_phase = 'Phase 3'
+    compound.update_sync_hash()
+
+
+def swap_areas(db):
+    # Same number of links before and after
+    compound = _compound(30)
+    replacement = _other_area(compound)
+    compound.therapeutic_areas.remove(compound.therapeutic_areas[0])
+    compound.therapeutic_areas.append(replacement)
+    compound.update_sync_hash()
+
+
+def swap_links_only(db):
+    # Links rewritten without the compound row itself being updated
+    compound = _compound(35)
+    replacement = _other_area(compound)
+    compound.therapeutic_areas.remove(compound.therapeutic_areas[0])
+    compound.therapeutic_areas.append(replacement)
+
+
+def delete(db):
+    db.session.delete(_compound(40))
+
+
+def insert_and_delete(db):
+    # The row count comes out unchanged
+    insert(db)
+    delete(db)
+
+
+CHANGES = {'rename': rename, 'insert': insert, 'change_areas': change_areas, 'swap_areas': swap_areas,
+           'swap_links_only': swap_links_only, 'delete': delete, 'insert_and_delete': insert_and_delete}
+# Changes the incremental patches cannot see row by row: they must ask for a rebuild instead
+REBUILDS = {'swap_links_only', 'delete', 'insert_and_delete'}
+
+
+@pytest.fixture(params=sorted(CHANGES))
+def change(request, db):
+    """(rebuild, write): a write the incremental indexes must follow, run in its own write
+    transaction, and whether patching must give up and rebuild after it"""
+    from utils.db_routing import write_transaction
+
+    write = CHANGES[request.param]
+    return request.param in REBUILDS, lambda: write_transaction(lambda: write(db))
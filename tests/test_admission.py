@@ -0,0 +1,91 @@
+"""utils/admission.py: budgets, wait queues and their rejections."""
+
+import threading
+import time
+
+import pytest
+
+from utils.admission import AdmissionControl, Busy, Gate, TokenBuckets
+
+
+def test_gate_rejects_when_the_queue_is_full():
+    gate = Gate(concurrency=1, queue=0, wait=1.0)
+    assert gate.acquire() == 0.0
+    with pytest.raises(Busy) as rejected:
+        gate.acquire()
+    assert rejected.value.reason == 'queue_full'
+
+
+def test_gate_rejects_when_the_wait_runs_out():
+    gate = Gate(concurrency=1, queue=1, wait=0.05)
+    gate.acquire()
+    with pytest.raises(Busy) as rejected:
+        gate.acquire()
+    assert rejected.value.reason == 'wait_timeout'
+    assert gate.waiting == 0
+
+
+def test_gate_admits_a_waiter_on_release():
+    gate = Gate(concurrency=1, queue=1, wait=5.0)
+    gate.acquire()
+    threading.Timer(0.05, gate.release, (0.05,)).start()
+    assert gate.acquire() > 0
+    assert gate.active == 1
+
+
+def test_token_buckets_refill_and_refund():
+    buckets = TokenBuckets(rate=10.0, burst=5.0)
+    assert buckets.take('a', 5.0) == 0.0
+    assert buckets.take('a', 1.0) == pytest.approx(0.1, abs=0.01)
+    assert buckets.take('b', 1.0) == 0.0  # budgets are per client
+    buckets.refund('a', 3.0)
+    assert buckets.take('a', 3.0) == 0.0
+
+
+@pytest.fixture
+def control(app):
+    pools = {'heavy': {'concurrency': 1, 'queue': 0, 'wait': 0.0, 'rate': 0.01, 'burst': 10.0}}
+    control = AdmissionControl(pools)
+    with app.test_request_context('/heavy'):
+        yield control
+
+
+def call(control, cost):
+    return control.call('heavy', cost, 1, lambda: 'done', (), {})
+
+
+def test_over_budget_is_429_with_retry_after(control):
+    assert call(control, 10.0) == 'done'
+    response = call(control, 2.0)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) == pytest.approx(200, abs=1)
+
+
+def test_larger_than_the_burst_is_413(control):
+    response = call(control, 11.0)
+    assert response.status_code == 413
+    assert 'Retry-After' not in response.headers
+    assert call(control, 10.0) == 'done'  # nothing was taken
+
+
+def test_busy_is_503_and_refunds_the_budget(control):
+    control.pools['heavy'].gate.acquire()
+    response = call(control, 10.0)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()['retry_after'] == 1
+
+    control.pools['heavy'].gate.release(0.1)
+    assert call(control, 10.0) == 'done'
+
+
+def test_cheap_endpoints_are_served_while_heavy_work_is_shed(app, monkeypatch):
+    client = app.test_client()
+    control = AdmissionControl({'compute': {'concurrency': 1, 'queue': 0, 'wait': 0.0}})
+    monkeypatch.setitem(app.extensions, 'admission', control)
+    control.pools['compute'].gate.acquire()  # a heavy request that never finishes
+
+    started = time.monotonic()
+    assert client.get('/api/sequence/0/composition').status_code == 503
+    assert client.get('/api/health/live').status_code == 200
+    assert time.monotonic() - started < 1.0
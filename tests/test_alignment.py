@@ -0,0 +1,91 @@
+"""utils/alignment.py against a plain full-matrix Gotoh implementation."""
+
+import random
+
+import pytest
+
+from utils.alignment import Scoring, align
+
+INF = float('inf')
+
+
+def reference(a, b, mode, band, scoring=Scoring()):
+    """Best score by filling the whole H/E/F matrices cell by cell"""
+    n, m = len(a), len(b)
+    local = mode == 'local'
+    H = [[-INF] * (m + 1) for _ in range(n + 1)]
+    E = [[-INF] * (m + 1) for _ in range(n + 1)]
+    F = [[-INF] * (m + 1) for _ in range(n + 1)]
+    best = 0
+    for i in range(n + 1):
+        for j in range(m + 1):
+            if band is not None and abs(i - j) > band:
+                continue
+            if i == 0 or j == 0:
+                k = i + j
+                H[i][j] = 0 if local or k == 0 else -(scoring.gap_open + (k - 1) * scoring.gap_extend)
+                if not local and k:
+                    (E if i == 0 else F)[i][j] = H[i][j]
+                continue
+            E[i][j] = max(H[i][j - 1] - scoring.gap_open, E[i][j - 1] - scoring.gap_extend)
+            F[i][j] = max(H[i - 1][j] - scoring.gap_open, F[i - 1][j] - scoring.gap_extend)
+            diagonal = H[i - 1][j - 1] + (scoring.match if a[i - 1] == b[j - 1] else scoring.mismatch)
+            H[i][j] = max(diagonal, E[i][j], F[i][j])
+            if local:
+                H[i][j] = max(H[i][j], 0)
+                best = max(best, H[i][j])
+    return best if local else H[n][m]
+
+
+def rescore(aligned_a, aligned_b, scoring=Scoring()):
+    score, previous = 0, None
+    for x, y in zip(aligned_a, aligned_b):
+        gap = 'a' if x == '-' else 'b' if y == '-' else None
+        if gap is None:
+            score += scoring.match if x == y else scoring.mismatch
+        else:
+            score -= scoring.gap_extend if gap == previous else scoring.gap_open
+        previous = gap
+    return score
+
+
+def random_pair(rng, n, m):
+    return ''.join(rng.choice('ACGT') for _ in range(n)), ''.join(rng.choice('ACGT') for _ in range(m))
+
+
+CASES = [(seed, mode, band) for seed in range(12) for mode in ('global', 'local') for band in (None, 0, 1, 3, 8)]
+
+
+@pytest.mark.parametrize('seed,mode,band', CASES)
+def test_matches_reference(seed, mode, band):
+    rng = random.Random(seed)
+    n = rng.randrange(0, 40)
+    m = n + rng.randrange(-min(n, band if band is not None else 10), (band if band is not None else 10) + 1)
+    a, b = random_pair(rng, n, m)
+
+    result = align(a, b, mode=mode, band=band)
+    assert result['score'] == reference(a, b, mode, band)
+    assert align(a, b, mode=mode, band=band, score_only=True)['score'] == result['score']
+
+    # The traceback must be a real alignment of the reported ranges, worth the reported score
+    assert rescore(result['aligned_a'], result['aligned_b']) == result['score']
+    assert result['aligned_a'].replace('-', '') == a[result['a_start']:result['a_end']]
+    assert result['aligned_b'].replace('-', '') == b[result['b_start']:result['b_end']]
+    if band is not None:
+        i, j = result['a_start'], result['b_start']
+        for x, y in zip(result['aligned_a'], result['aligned_b']):
+            i, j = i + (x != '-'), j + (y != '-')
+            assert abs(i - j) <= band
+
+
+def test_banded_global_needs_wide_enough_band():
+    with pytest.raises(ValueError):
+        align('ACGTACGT', 'ACG', band=2)
+
+
+def test_banded_traceback_is_not_quadratic():
+    rng = random.Random(0)
+    a, b = random_pair(rng, 20_000, 20_000)
+    result = align(a, a[:10_000] + b[10_000:], band=16)
+    assert result['a_end'] == result['b_end'] == 20_000
+    assert result['aligned_a'][:10_000] == a[:10_000]
@@ -0,0 +1,30 @@
+"""utils/compound_snapshot.py: a patched snapshot must equal a fresh build."""
+
+from utils import compound_snapshot
+
+
+def contents(snapshot):
+    """Everything readers see, keyed by compound id rather than row"""
+    ids = snapshot.ids.tolist()
+    return {
+        'rows': snapshot.to_dicts(range(len(ids))),
+        'name_order': [ids[row] for row in snapshot.name_order],
+        'areas': {area: sorted(snapshot.ids[bitmap].tolist()) for area, bitmap in snapshot.area_bitmaps.items()
+                  if bitmap.any()},
+        'search': [snapshot.search[row] for row in range(len(ids))],
+        'counts': snapshot.counts,
+        'max_id': snapshot.max_id,
+    }
+
+
+def test_apply_changes_matches_build(db, change):
+    rebuild, write = change
+    before = compound_snapshot.build('before')
+    write()
+
+    patched = compound_snapshot.apply_changes(before, 'after')
+    if rebuild:
+        assert patched is None
+        return
+    assert patched is not None
+    assert contents(patched) == contents(compound_snapshot.build('after'))
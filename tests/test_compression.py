@@ -0,0 +1,93 @@
+"""utils/compression.py: pooled gzip compressors and streamed responses."""
+
+import gzip
+import zlib
+
+import pytest
+from flask import Flask, Response
+
+from utils import compression
+
+FIRST = b'{"compounds": [' + b', '.join(b'{"id": %d, "name": "Compound %d"}' % (i, i) for i in range(400)) + b']}'
+SECOND = b'Compound 1, Compound 2, Compound 3; ' * 50
+
+
+@pytest.fixture
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr(compression, '_pools', {})
+
+
+def encode(data, **options):
+    return b''.join(compression.gzip_chunks((data,), **options))
+
+
+def test_reused_compressor_starts_clean(fresh_pools):
+    cold = encode(SECOND)
+    compressor = compression._pool(6)[0]
+
+    assert gzip.decompress(encode(FIRST)) == FIRST
+    assert compression._pool(6) == [compressor]
+    # No history from FIRST: the output is byte for byte what a new compressor makes
+    assert encode(SECOND) == cold
+
+
+def test_abandoned_stream_resets_the_compressor(fresh_pools):
+    stream = compression.gzip_chunks(iter([FIRST, FIRST]))
+    next(stream), next(stream)
+    stream.close()
+    assert len(compression._pool(6)) == 1
+
+    encoded = encode(SECOND)
+    assert gzip.decompress(encoded) == SECOND
+    compression._pools.clear()
+    assert encoded == encode(SECOND)
+
+
+def test_flush_each_makes_every_chunk_decodable(fresh_pools):
+    chunks = [FIRST[i:i + 1000] for i in range(0, len(FIRST), 1000)]
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    received = b''
+    sent = b''
+    for encoded, chunk in zip(compression.gzip_chunks(chunks, flush_each=True), [b''] + chunks):
+        sent += chunk
+        received += decoder.decompress(encoded)
+        assert received == sent
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    closed = []
+
+    @app.route('/stream')
+    def stream():
+        def generate():
+            try:
+                for i in range(0, len(FIRST), 1000):
+                    yield FIRST[i:i + 1000]
+            finally:
+                closed.append(True)
+        response = Response(generate(), mimetype='application/json')
+        response.set_etag('stream')
+        return response
+
+    compression.init_app(app)
+    client = app.test_client()
+    client.closed = closed
+    return client
+
+
+def test_streamed_response_is_gzipped_and_closed(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert response.headers['ETag'] == 'W/"stream"'
+    assert gzip.decompress(response.get_data()) == FIRST
+    response.close()
+    assert client.closed == [True]
+
+
+def test_streamed_response_without_gzip_is_untouched(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == FIRST
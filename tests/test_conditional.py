@@ -0,0 +1,86 @@
+"""Conditional GET: an ETag must name the data actually served, not the latest data version."""
+
+import pytest
+
+from utils import compound_snapshot, facets
+
+NAME = 'Zz conditional compound'
+PHASE = 'Conditional test'
+
+
+@pytest.fixture
+def stale_indexes(app, db, monkeypatch):
+    """Fresh per-worker indexes that only catch up when ``catch_up`` is called"""
+    monkeypatch.setattr(compound_snapshot, '_snapshots', {})
+    monkeypatch.setattr(facets, '_indexes', {})
+    monkeypatch.setattr(compound_snapshot.SnapshotIndex, '_refresh_in_background', lambda self: None)
+    monkeypatch.setattr(facets.FacetIndex, '_refresh_in_background', lambda self: None)
+
+    def catch_up():
+        compound_snapshot.get_snapshot(app)._refresh()
+        facets.get_index(app)._refresh()
+    return catch_up
+
+
+def insert_compound(db):
+    from models.models import Compound
+    from utils.db_routing import write_transaction
+
+    def work():
+        compound = Compound(name=NAME, cas_number='99999-30-0', description='Inserted by the test',
+                            clinical_phase=PHASE, created_by='test')
+        compound.update_sync_hash()
+        db.session.add(compound)
+    write_transaction(work)
+
+
+def shows_compound(response):
+    return NAME in response.get_data(as_text=True)
+
+
+def counts_compound(response):
+    return response.get_json()['total'] == 1
+
+
+@pytest.mark.parametrize('path,served', [
+    ('/compounds?search=zz+conditional', shows_compound),
+    ('/api/compounds?search=zz+conditional', shows_compound),
+    ('/api/compounds/facets?phase=Conditional+test', counts_compound),
+])
+def test_etag_follows_the_served_snapshot(app, db, stale_indexes, path, served):
+    client = app.test_client()
+    client.get(path)  # starts the session the page's ETag depends on
+    before = client.get(path)
+    assert before.status_code == 200 and not served(before)
+
+    insert_compound(db)
+    stale = client.get(path)
+    # Still the old snapshot: same body, so the same ETag
+    assert not served(stale)
+    assert stale.get_etag()[0] == before.get_etag()[0]
+
+    stale_indexes()
+    fresh = client.get(path, headers={'If-None-Match': stale.headers['ETag']})
+    assert fresh.status_code == 200
+    assert served(fresh)
+    assert client.get(path, headers={'If-None-Match': fresh.headers['ETag']}).status_code == 304
+
+
+def test_disease_compounds_revalidates_until_a_write(app, db):
+    from models.models import Compound, Disease
+    from utils.db_routing import write_transaction
+
+    client = app.test_client()
+    disease = Disease.query.order_by(Disease.id).first()
+    path = f'/api/diseases/{disease.id}/compounds'
+    first = client.get(path)
+    assert first.status_code == 200
+    assert client.get(path, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    def link():
+        compound = Compound.query.filter(~Compound.therapeutic_areas.contains(disease.therapeutic_area)).first()
+        compound.therapeutic_areas.append(disease.therapeutic_area)
+    write_transaction(link)
+    second = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.get_json()['total'] == first.get_json()['total'] + 1
@@ -0,0 +1,132 @@
+"""utils/disease_closure.py: the closure kept up by ORM flushes must equal one computed from scratch."""
+
+import pytest
+
+from utils import disease_closure
+
+
+def closure_rows(db):
+    from models.models import disease_compound as closure
+
+    return set(db.session.execute(db.select(closure.c.disease_id, closure.c.compound_id,
+                                            closure.c.therapeutic_area_id)).all())
+
+
+def expected_rows(db):
+    """What ``rebuild`` would write: the disease -> area -> compound join"""
+    from models.models import Disease, compound_therapeutic_area as links
+
+    return set(db.session.execute(
+        db.select(Disease.id, links.c.compound_id, Disease.therapeutic_area_id)
+        .join(links, links.c.therapeutic_area_id == Disease.therapeutic_area_id)).all())
+
+
+def _area(offset):
+    from models.models import TherapeuticArea
+
+    return TherapeuticArea.query.order_by(TherapeuticArea.id).offset(offset).first()
+
+
+def _disease(offset):
+    from models.models import Disease
+
+    return Disease.query.order_by(Disease.id).offset(offset).first()
+
+
+def move_disease(db):
+    disease = _disease(0)
+    disease.therapeutic_area = next(area for area in (_area(0), _area(1)) if area != disease.therapeutic_area)
+
+
+def add_disease(db):
+    from models.models import Disease
+
+    db.session.add(Disease(name='Added disorder', therapeutic_area=_area(2)))
+
+
+def delete_disease(db):
+    db.session.delete(_disease(1))
+
+
+def area_side_links(db):
+    # Links changed through TherapeuticArea.compounds rather than Compound.therapeutic_areas
+    from models.models import Compound
+
+    area = _area(0)
+    area.compounds.remove(area.compounds[0])
+    area.compounds.append(next(compound for compound in Compound.query.order_by(Compound.id)
+                               if compound not in area.compounds))
+
+
+DISEASE_CHANGES = {'move_disease': move_disease, 'add_disease': add_disease, 'delete_disease': delete_disease,
+                   'area_side_links': area_side_links}
+
+
+def test_starts_complete(db):
+    assert closure_rows(db) == expected_rows(db)
+    assert closure_rows(db)
+
+
+def test_compound_writes_keep_closure(db, change):
+    _, write = change
+    write()
+    assert closure_rows(db) == expected_rows(db)
+
+
+@pytest.mark.parametrize('name', sorted(DISEASE_CHANGES))
+def test_disease_and_area_writes_keep_closure(db, name):
+    from utils.db_routing import write_transaction
+
+    write_transaction(lambda: DISEASE_CHANGES[name](db))
+    assert closure_rows(db) == expected_rows(db)
+
+
+def test_rebuild_matches(db):
+    from utils.db_routing import write_transaction
+
+    rows = closure_rows(db)
+    assert write_transaction(lambda: disease_closure.rebuild(db.session.connection())) == len(rows)
+    assert closure_rows(db) == rows == expected_rows(db)
+
+
+def test_refreshes_once_per_transaction(db, monkeypatch):
+    from models.models import Compound, TherapeuticArea
+    from utils.db_routing import write_transaction
+
+    calls = []
+    original = disease_closure.refresh
+    monkeypatch.setattr(disease_closure, 'refresh', lambda *args: calls.append(args) or original(*args))
+
+    def import_three():
+        area = _area(0)
+        for number in range(3):
+            compound = Compound(name=f'Imported {number}', created_by='import')
+            compound.therapeutic_areas.append(area)
+            db.session.add(compound)
+            TherapeuticArea.query.count()  # autoflushes, as the import command's lookups do
+    write_transaction(import_three)
+    assert len(calls) == 1 and len(calls[0][1]) == 3
+    assert closure_rows(db) == expected_rows(db)
+
+
+def test_rolled_back_changes_are_dropped(db):
+    from models.models import Compound
+
+    compound = Compound(name='Rolled back', created_by='test')
+    compound.therapeutic_areas.append(_area(0))
+    db.session.add(compound)
+    db.session.flush()
+    db.session.rollback()
+    assert disease_closure._PENDING not in db.session.info
+
+
+def test_ensure_takes_no_write_lock_when_present(db):
+    import sqlite3
+
+    blocker = sqlite3.connect(db.engine.url.database, timeout=0)
+    blocker.execute('BEGIN IMMEDIATE')
+    try:
+        disease_closure.ensure(db)  # would wait out the busy timeout and fail on the writer
+    finally:
+        blocker.rollback()
+        blocker.close()
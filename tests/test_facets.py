@@ -0,0 +1,40 @@
+"""utils/facets.py: a patched facet index must count like a fresh build."""
+
+from utils import facets
+
+FILTERS = [
+    {},
+    {'phase': ['Approved']},
+    {'phase': ['Phase 3'], 'area': [1, 2]},
+    {'area': [3]},
+    {'disease': [1, 4]},
+    {'group': [1, 2], 'area': [1]},
+]
+
+
+def contents(snapshot):
+    return {
+        'counts': [snapshot.facet_counts(filters) for filters in FILTERS],
+        'ids': [snapshot.matching_ids(filters).tolist() for filters in FILTERS],
+        'links': snapshot.counts,
+    }
+
+
+def test_apply_changes_matches_build(db, change):
+    rebuild, write = change
+    before = facets.build('before')
+    write()
+
+    patched = facets.apply_changes(before, 'after')
+    if rebuild:
+        assert patched is None
+        return
+    assert patched is not None
+    assert contents(patched) == contents(facets.build('after'))
+
+
+def test_link_checksum_matches_link_term(db):
+    from models.models import compound_therapeutic_area as links
+
+    pairs = db.session.query(links.c.compound_id, links.c.therapeutic_area_id).all()
+    assert facets.link_checksum(db, links) == sum(facets.link_term(c, a) for c, a in pairs)
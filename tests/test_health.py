@@ -0,0 +1,39 @@
+"""/api/health keeps its public body; details stay in the admin report."""
+
+import json
+
+from utils.health import FAIL, OK, HealthMonitor
+
+
+def test_public_body_has_the_original_keys(app):
+    from utils.database import init_db
+    from utils.health import get_monitor
+
+    init_db()  # the settings database
+    get_monitor(app).refresh()
+    response = app.test_client().get('/api/health')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'healthy' and body['database'] == 'connected'
+    assert set(body) == {'status', 'database', 'timestamp'}
+
+
+def test_public_body_when_a_database_fails(app):
+    def broken(app):
+        raise OSError('unable to open /secret/path/database.db')
+
+    monitor = HealthMonitor(app, checks={'settings_db': (broken, True), 'disk': (lambda app: (OK, {}), True)})
+    monitor.refresh()
+    assert not monitor.is_ready()
+    body = json.loads(monitor.body('public'))
+    assert body['status'] == 'unhealthy' and body['database'] == 'disconnected'
+    assert body['error'] == 'failed checks: settings_db'
+    assert 'secret' not in monitor.body('public').decode() and 'secret' in monitor.body('report').decode()
+    assert monitor.report['checks']['settings_db']['status'] == FAIL
+
+
+def test_stale_monitor_is_unhealthy(app):
+    monitor = HealthMonitor(app, interval=0.0, checks={'disk': (lambda app: (OK, {}), True)})
+    monitor.refresh()
+    body = json.loads(monitor.body('public'))
+    assert body['status'] == 'unhealthy' and body['error'] == 'health checks are stale'
@@ -0,0 +1,22 @@
+"""Compute-kernel backends against the pure-Python reference."""
+
+from utils.kernels import Selection, conformance
+
+
+def test_backends_conform_to_reference():
+    report = conformance.check()
+    assert 'numpy' in report['backends']
+    assert report['failures'] == []
+
+
+def test_selection_is_stored_per_host(tmp_path):
+    path = tmp_path / 'kernel_selection.json'
+    measured = Selection().benchmark(sample_size=2000, repeat=1).save(path)
+    # The reference only checks results; it is not a candidate
+    assert all('python' not in timings for timings in measured.timings.values())
+
+    loaded = Selection()
+    assert loaded.load(path)
+    assert loaded.choice == measured.choice
+    assert loaded.ready.is_set()
+    assert not Selection().load(tmp_path / 'missing.json')
@@ -0,0 +1,39 @@
+"""utils/prefix_index.py: a patched index must equal a fresh build."""
+
+from utils import prefix_index
+
+
+def contents(snapshot):
+    return {
+        'keys': list(snapshot.keys),
+        'ids': list(snapshot.ids),
+        'kinds': bytes(snapshot.kinds),
+        'compounds': snapshot.compounds,
+        'max_id': snapshot.max_id,
+    }
+
+
+def test_apply_changes_matches_build(db, change):
+    rebuild, write = change
+    before = prefix_index.build('before')
+    write()
+
+    rows = prefix_index._load_rows(after_id=before.max_id, since=before.watermark)
+    patched = prefix_index.apply_changes(before, rows, 'after')
+    if patched is None:
+        assert rebuild  # only changes the patch cannot follow may force a rebuild
+        return
+    fresh = prefix_index.build('after')
+    assert contents(patched) == contents(fresh)
+    for prefix in ('aaa', 'zz', '99999', 'a', 'oxa'):
+        assert patched.search(prefix, limit=50) == fresh.search(prefix, limit=50)
+
+
+def test_delete_forces_rebuild(db):
+    from models.models import Compound
+    from utils.db_routing import write_transaction
+
+    before = prefix_index.build('before')
+    write_transaction(lambda: db.session.delete(Compound.query.order_by(Compound.id).first()))
+    rows = prefix_index._load_rows(after_id=before.max_id, since=before.watermark)
+    assert prefix_index.apply_changes(before, rows, 'after') is None
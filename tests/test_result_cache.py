@@ -0,0 +1,51 @@
+"""utils/result_cache.py and /api/results: only results the server reproduces are shared."""
+
+import pytest
+
+from utils.result_cache import VERIFIERS, result_key, verify
+
+SEQUENCE = 'GATTACAGGC'
+RESULT = 'GC content: 50.00% (5/10 nucleotides)'  # gcContent() in static/js/result_cache.js
+
+
+def test_gc_content_matches_the_browser_kernel():
+    assert VERIFIERS['gc_content/1'](SEQUENCE) == RESULT
+    # toFixed(2) rounding and lowercase letters not counted, as in the browser
+    assert VERIFIERS['gc_content/1']('GATTACA') == 'GC content: 28.57% (2/7 nucleotides)'
+    assert VERIFIERS['gc_content/1']('gcGC') == 'GC content: 50.00% (2/4 nucleotides)'
+
+
+@pytest.mark.parametrize('version,result', [
+    ('gc_content/1', 'GC content: 50%'),  # another page's output format under the same version
+    ('gc_content/1', RESULT + ' '),
+    ('gc_content/0', RESULT),             # no server copy of this kernel
+])
+def test_verify_rejects(version, result):
+    assert not verify(SEQUENCE, version, result)
+
+
+def put(client, data, version, result, key=None):
+    return client.put(f'/api/results/{key or result_key(data, version)}',
+                      json={'input': data, 'kernel_version': version, 'result': result})
+
+
+def test_put_stores_only_verified_results(app):
+    client = app.test_client()
+    key = result_key(SEQUENCE, 'gc_content/1')
+
+    assert put(client, SEQUENCE, 'gc_content/1', 'GC content: 50%').status_code == 422
+    assert client.get(f'/api/results/{key}').status_code == 404
+
+    assert put(client, SEQUENCE, 'gc_content/1', RESULT).status_code == 201
+    assert put(client, SEQUENCE, 'gc_content/1', RESULT).status_code == 200
+    assert client.get(f'/api/results/{key}').get_json() == {'result': RESULT}
+
+
+def test_put_rejects_mismatched_and_oversized_requests(app):
+    client = app.test_client()
+    other_key = result_key('ACGT', 'gc_content/1')
+    assert put(client, SEQUENCE, 'gc_content/1', RESULT, key=other_key).status_code == 400
+    assert client.put('/api/results/not-a-key', json={}).status_code == 400
+
+    too_long = 'G' * (2 * app.config['RESULT_CACHE_MAX_ENTRY_BYTES'])
+    assert put(client, too_long, 'gc_content/1', RESULT).status_code == 413
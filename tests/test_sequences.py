@@ -0,0 +1,38 @@
+"""utils/sequences.py: track buckets count exactly the bases they report."""
+
+import numpy as np
+import pytest
+
+from utils import sequences
+
+LENGTH = 2_500_007
+
+
+@pytest.fixture(scope='module')
+def stored():
+    rng = np.random.default_rng(11)
+    data = rng.choice(np.frombuffer(b'ACGTN', dtype=np.uint8), LENGTH, p=[0.2, 0.3, 0.3, 0.18, 0.02]).tobytes()
+    meta = sequences.store([data[:LENGTH // 3], data[LENGTH // 3:]], name='track test')
+    return meta['id'], data
+
+
+@pytest.mark.parametrize('start, end, px', [
+    (0, LENGTH, 1000),             # whole sequence, partial last bin
+    (5, 200_003, 1000),            # 64 bp rows cut at both ends
+    (1_000_001, 1_000_901, 7),     # a single 64 bp level with seven buckets
+    (123_457, 2_400_011, 2),       # 1 Mbp rows, recounted down to the bases
+    (70, 90, 1),                   # inside one 16 bp row on each side
+    (40, 52, 4),                   # bases directly
+])
+def test_buckets_count_their_bounds(stored, start, end, px):
+    sequence_id, data = stored
+    result = sequences.track(sequence_id, start, end, px)
+    buckets = result['buckets']
+
+    assert buckets['start'][0] == start and buckets['end'][-1] == end
+    assert buckets['start'][1:] == buckets['end'][:-1]
+    for lo, hi, gc, n_fraction in zip(buckets['start'], buckets['end'], buckets['gc'], buckets['n_fraction']):
+        region = data[lo:hi]
+        acgt = hi - lo - region.count(b'N')
+        assert gc == pytest.approx((region.count(b'G') + region.count(b'C')) / acgt, abs=1e-4)
+        assert n_fraction == pytest.approx(region.count(b'N') / (hi - lo), abs=1e-4)
@@ -0,0 +1,24 @@
+"""app.py: the CLI app leaves the web request extensions unimported."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+WEB_MODULES = ('flask_caching', 'flask_cors', 'flask_limiter', 'flask_migrate', 'flask_wtf', 'routes')
+
+
+def loaded_after(code):
+    """Modules of WEB_MODULES imported once ``code`` has run in a fresh interpreter"""
+    script = f'import sys, app\n{code}\nprint(*[m for m in {WEB_MODULES!r} if m in sys.modules])'
+    # conftest.py points DATABASE_DIR and LOGS_DIR at scratch directories; the child inherits them
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def test_cli_app_skips_web_extensions():
+    assert loaded_after('app.get_cli_app()') == []
+
+
+def test_served_app_initializes_web_extensions():
+    assert loaded_after('app.create_app()') == ['flask_caching', 'flask_cors', 'flask_limiter', 'flask_wtf', 'routes']
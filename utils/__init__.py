@@ -2,6 +2,25 @@
 Utilities package for helper functions and common operations
 """
 
-from .database import get_db_connection, init_db, get_setting, set_setting, log_activity
-from .helpers import log_user_action, format_datetime, sanitize_filename, get_file_size_human, truncate_text, generate_unique_filename
-from .validators import validate_email, validate_filename
+import importlib
+
+# Re-exports are resolved on first access so that importing a lightweight
+# submodule (e.g. utils.startup) does not pull in Flask and SQLAlchemy.
+_EXPORTS = {
+    'get_db_connection': 'database', 'init_db': 'database', 'get_setting': 'database',
+    'set_setting': 'database', 'log_activity': 'database',
+    'log_user_action': 'helpers', 'format_datetime': 'helpers', 'sanitize_filename': 'helpers',
+    'get_file_size_human': 'helpers', 'truncate_text': 'helpers', 'generate_unique_filename': 'helpers',
+    'validate_email': 'validators', 'validate_filename': 'validators',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
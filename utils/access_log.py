@@ -0,0 +1,108 @@
+"""
+Compact access log, one tab-separated line per request:
+
+    timestamp  method  path  query  status  latency_ms  bytes
+
+``timestamp`` is Unix time with millisecond precision, ``path`` is
+percent-encoded, and an empty query or unknown size is written as ``-``.
+Lines are appended with a single ``write`` to an ``O_APPEND`` descriptor, so
+gunicorn workers can share one file without interleaving. ``replay`` (see
+utils/replay.py) reads the same format back.
+"""
+
+import logging
+import os
+import threading
+import time
+from urllib.parse import quote
+
+from flask import g, request
+
+from paths import ACCESS_LOG
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('timestamp', 'method', 'path', 'query', 'status', 'latency_ms', 'bytes')
+_PATH_SAFE = "/:@!$&'()*+,;=-._~"
+
+_lock = threading.Lock()
+_fd = None
+_fd_pid = None
+
+
+def _descriptor(path) -> int:
+    # Each process (e.g. a forked worker) opens its own descriptor
+    global _fd, _fd_pid
+    if _fd is None or _fd_pid != os.getpid():
+        with _lock:
+            if _fd is None or _fd_pid != os.getpid():
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                _fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                _fd_pid = os.getpid()
+    return _fd
+
+
+def format_line(timestamp: float, method: str, path: str, query: str,
+                status: int, latency: float, size) -> str:
+    """Format one access log line (latency in seconds)"""
+    query = query.replace('\t', '%09').replace('\n', '%0A') if query else '-'
+    return (f'{timestamp:.3f}\t{method}\t{quote(path, safe=_PATH_SAFE)}\t{query}\t'
+            f'{status}\t{latency * 1000:.2f}\t{size if size is not None else "-"}\n')
+
+
+def parse_line(line: str):
+    """Parse an access log line into a dict, or return None if it is malformed"""
+    parts = line.rstrip('\n').split('\t')
+    if len(parts) != len(FIELDS):
+        return None
+    try:
+        return {
+            'timestamp': float(parts[0]),
+            'method': parts[1],
+            'path': parts[2],
+            'query': '' if parts[3] == '-' else parts[3],
+            'status': int(parts[4]),
+            'latency_ms': float(parts[5]),
+            'bytes': None if parts[6] == '-' else int(parts[6]),
+        }
+    except ValueError:
+        return None
+
+
+def read_log(path):
+    """Yield the parsed entries of an access log, skipping malformed lines"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            entry = parse_line(line)
+            if entry is not None:
+                yield entry
+
+
+def init_app(app):
+    """Record every request to ACCESS_LOG (disable with ACCESS_LOG_ENABLED=False)"""
+    app.config.setdefault('ACCESS_LOG_ENABLED', os.environ.get('ACCESS_LOG_ENABLED', '1') != '0')
+    app.config.setdefault('ACCESS_LOG_PATH', os.environ.get('ACCESS_LOG_PATH', str(ACCESS_LOG)))
+    if not app.config['ACCESS_LOG_ENABLED']:
+        return
+
+    path = app.config['ACCESS_LOG_PATH']
+
+    @app.before_request
+    def start_access_timer():
+        g.access_start = time.perf_counter()
+
+    @app.after_request
+    def write_access_log(response):
+        start = g.pop('access_start', None)
+        if start is None:
+            return response
+        # Streamed responses have no length until they are sent
+        size = response.calculate_content_length() if response.is_sequence else response.content_length
+        line = format_line(time.time(), request.method, request.path,
+                           request.query_string.decode('latin-1'), response.status_code,
+                           time.perf_counter() - start, size)
+        try:
+            os.write(_descriptor(path), line.encode('utf-8'))
+        except OSError as e:
+            logger.warning(f"Could not write access log: {e}")
+        return response
@@ -0,0 +1,251 @@
+"""
+Admission control for expensive endpoints.
+
+A view decorated with ``@admit(pool, cost)`` passes two checks before it
+runs:
+
+1. a cost-weighted token bucket per client and pool. ``cost`` is a number
+   or a function of the current request estimating the work, in units of
+   roughly a million cells, bases or bead-steps, so one large alignment
+   uses the budget of many small ones. A request costing more than the
+   bucket can ever hold (``burst``) is refused outright with ``413``; a
+   client over budget gets ``429`` with ``Retry-After`` set to when it
+   will have enough tokens again.
+2. a concurrency limit per pool with a bounded wait queue. A request takes
+   ``slots`` of the pool (one, or more for work that fans out onto other
+   processes). A request that finds the pool busy waits up to ``wait``
+   seconds in a queue of at most ``queue`` requests. When the queue is
+   full, or the wait runs out, the response is an immediate ``503`` with a
+   ``Retry-After`` estimated from recent service times, instead of one
+   more thread piling up behind the others.
+
+Limits are per process, so CPU-bound pools are sized by ``cpu_share()``:
+the host's CPUs divided among the gunicorn workers (GUNICORN_WORKERS,
+which gunicorn.conf.py exports). Across all workers, heavy work then
+occupies about the number of CPUs, and undecorated (cheap) endpoints
+still find a free CPU under overload.
+
+Pools are configured with ADMISSION_POOLS (merged over DEFAULT_POOLS) and
+the whole mechanism is switched off with ADMISSION_ENABLED=0. Outcomes,
+the queue depth seen on arrival and time spent queued are recorded in the
+metrics registry.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+from utils.metrics import COUNT_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+CPUS = os.cpu_count() or 1
+
+
+def cpu_share() -> int:
+    """CPUs available to heavy work in this process: the host's, split among the server workers"""
+    return max(1, CPUS // max(1, int(os.environ.get('GUNICORN_WORKERS', 1))))
+
+
+MAX_CLIENTS = 10_000  # buckets kept per pool before full ones are pruned
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# concurrency: requests running at once; queue/wait: how many may wait, and for how long;
+# rate/burst: per-client budget in cost units per second, and the most that can be saved up
+DEFAULT_POOLS = {
+    # CPU-bound work done within the request (alignment, composition, batch lookups)
+    'compute': {'concurrency': cpu_share(), 'queue': 2 * cpu_share(), 'wait': 2.0, 'rate': 50.0, 'burst': 500.0},
+    # Sequences are indexed while the upload streams in
+    'upload': {'concurrency': 1, 'queue': 2, 'wait': 10.0, 'rate': 20.0, 'burst': 1000.0},
+    # Quick requests that start background simulations
+    'simulation': {'concurrency': 2, 'queue': 4, 'wait': 1.0, 'rate': 1.0, 'burst': 500.0},
+    # Profiles sample every thread; two at once would skew each other
+    'profile': {'concurrency': 1, 'queue': 0, 'wait': 0.0, 'rate': None, 'burst': None},
+}
+
+
+class Busy(Exception):
+    """Raised by ``Gate.acquire``; ``reason`` is 'queue_full' or 'wait_timeout'"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Gate:
+    """A concurrency limit with a bounded queue of waiting requests"""
+
+    def __init__(self, concurrency: int, queue: int, wait: float):
+        self.concurrency = max(1, concurrency)
+        self.queue = max(0, queue)
+        self.wait = wait
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 0.1  # moving average of seconds per request, for Retry-After
+        self._condition = threading.Condition()
+
+    def acquire(self, slots: int = 1) -> float:
+        """Seconds waited once admitted; raises Busy if the queue is full or the wait runs out"""
+        slots = min(max(1, slots), self.concurrency)
+        with self._condition:
+            if self.active + slots <= self.concurrency and not self.waiting:
+                self.active += slots
+                return 0.0
+            if self.waiting >= self.queue:
+                raise Busy('queue_full')
+            self.waiting += 1
+            start = time.monotonic()
+            deadline = start + self.wait
+            try:
+                while self.active + slots > self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Busy('wait_timeout')
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += slots
+            return time.monotonic() - start
+
+    def release(self, elapsed: float, slots: int = 1):
+        with self._condition:
+            self.active -= min(max(1, slots), self.concurrency)
+            self.service_time += 0.2 * (elapsed - self.service_time)
+            # Waiters need different numbers of slots, so each rechecks
+            self._condition.notify_all()
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from recent service times"""
+        return max(1, math.ceil(self.service_time * (self.waiting + 1) / self.concurrency))
+
+
+class TokenBuckets:
+    """Cost-weighted token buckets, one per client"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # client -> [tokens, last refill]
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        full = [client for client, (tokens, last) in self._buckets.items()
+                if tokens + (now - last) * self.rate >= self.burst]
+        for client in full:
+            del self._buckets[client]
+
+    def take(self, client: str, cost: float) -> float:
+        """0 if ``cost`` tokens were taken, else the seconds until the client has them (``cost`` <= burst)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= MAX_CLIENTS:
+                    self._prune(now)
+                bucket = self._buckets[client] = [self.burst, now]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < cost:
+                return (cost - bucket[0]) / self.rate
+            bucket[0] -= cost
+            return 0.0
+
+    def refund(self, client: str, cost: float):
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is not None:
+                bucket[0] = min(self.burst, bucket[0] + cost)
+
+
+class Pool:
+    def __init__(self, name: str, concurrency: int, queue: int, wait: float, rate=None, burst=None):
+        self.name = name
+        self.gate = Gate(concurrency, queue, wait)
+        self.buckets = TokenBuckets(rate, burst) if rate else None
+
+
+class AdmissionControl:
+    """The pools of one application"""
+
+    def __init__(self, pools: dict):
+        self.pools = {name: Pool(name, **settings) for name, settings in pools.items()}
+
+    def _reject(self, pool: str, reason: str, status: int, retry_after, message: str):
+        registry.inc('mn_admission_requests_total', (('pool', pool), ('result', reason)))
+        if retry_after is not None:
+            retry_after = max(1, math.ceil(retry_after))
+        logger.warning(f"Rejected {request.method} {request.path} from {request.remote_addr}: "
+                       f"{reason} in pool {pool}, retry after {retry_after}s")
+        response = jsonify({"success": False, "error": message, "retry_after": retry_after})
+        response.status_code = status
+        if retry_after is not None:
+            response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    def call(self, pool_name: str, cost: float, slots: int, view, args, kwargs):
+        """Run ``view`` if ``pool_name`` admits it, else return the rejection response"""
+        pool = self.pools[pool_name]
+        client = request.remote_addr or '127.0.0.1'
+        if pool.buckets is not None:
+            if cost > pool.buckets.burst:
+                return self._reject(pool_name, 'too_large', 413, None,
+                                    f'The request is too large ({cost:.0f} units of work, '
+                                    f'at most {pool.buckets.burst:.0f}); split it up')
+            shortfall = pool.buckets.take(client, cost)
+            if shortfall:
+                return self._reject(pool_name, 'over_budget', 429, shortfall,
+                                    'Too much work requested recently; try again later')
+
+        gate = pool.gate
+        registry.observe('mn_admission_queue_depth', (('pool', pool_name),), gate.waiting, COUNT_BUCKETS)
+        try:
+            waited = gate.acquire(slots)
+        except Busy as e:
+            if pool.buckets is not None:
+                pool.buckets.refund(client, cost)
+            return self._reject(pool_name, e.reason, 503, gate.retry_after(),
+                                'The server is busy; try again later')
+        registry.inc('mn_admission_requests_total', (('pool', pool_name), ('result', 'queued' if waited else 'admitted')))
+        if waited:
+            registry.observe('mn_admission_wait_seconds', (('pool', pool_name),), waited, WAIT_BUCKETS)
+        start = time.monotonic()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            gate.release(time.monotonic() - start, slots)
+
+
+def admit(pool: str, cost=1, slots=1):
+    """
+    Run a view under the named pool's budget and concurrency limit. ``cost`` and
+    ``slots`` are numbers or functions of the request returning one; they should
+    not fail on bad input.
+    """
+    def decorate(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            control = current_app.extensions.get('admission')
+            if control is None:
+                return view(*args, **kwargs)
+            units = cost() if callable(cost) else cost
+            taken = slots() if callable(slots) else slots
+            return control.call(pool, max(float(units), 0.0), int(taken), view, args, kwargs)
+        return wrapper
+    return decorate
+
+
+def init_app(app):
+    """Enable admission control unless ADMISSION_ENABLED is false"""
+    app.config.setdefault('ADMISSION_ENABLED', os.environ.get('ADMISSION_ENABLED', '1') != '0')
+    app.config.setdefault('ADMISSION_POOLS', {})
+    if not app.config['ADMISSION_ENABLED']:
+        return
+    pools = {name: dict(settings) for name, settings in DEFAULT_POOLS.items()}
+    for name, overrides in app.config['ADMISSION_POOLS'].items():
+        pools.setdefault(name, {'concurrency': 1, 'queue': 0, 'wait': 0.0}).update(overrides)
+    app.extensions['admission'] = AdmissionControl(pools)
@@ -0,0 +1,294 @@
+"""
+Pairwise sequence alignment with NumPy, one anti-diagonal at a time.
+
+Global (Needleman-Wunsch) and local (Smith-Waterman) alignment with affine
+gaps (Gotoh): a gap of length k costs ``gap_open + (k - 1) * gap_extend``.
+Cells on an anti-diagonal ``i + j = d`` depend only on diagonals ``d - 1``
+and ``d - 2``, so each diagonal is computed as a handful of vector
+operations. Buffers are indexed by row ``i``, which makes every neighbour a
+contiguous slice of the previous diagonal.
+
+- Score-only runs keep three diagonals of H and two of E and F: O(n)
+  memory, never the full matrix.
+- Traceback runs additionally store one byte of back-pointers per cell.
+- ``band`` restricts the computation to cells with ``|i - j| <= band``.
+  Only the rows a diagonal wrote are reset when its buffer is reused, and
+  back-pointers are kept for the band alone (``_layout``), so a banded
+  alignment costs O((n + m) * band) time and memory.
+
+``align_many`` scores many-vs-many batches, inline for small jobs and on a
+shared process pool for large ones.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NEG = np.int32(-(1 << 28))  # "minus infinity" that cannot overflow int32 when penalties are added
+MODES = ('global', 'local')
+POOL_MIN_CELLS = 2_000_000  # batches smaller than this run inline
+
+# Back-pointer byte: bits 0-1 where H came from, bit 2 E extended, bit 3 F extended
+FROM_DIAG, FROM_E, FROM_F, STOP = 0, 1, 2, 3
+E_EXTEND, F_EXTEND = 4, 8
+
+_pools = {}  # pid -> ProcessPoolExecutor
+_pools_lock = threading.Lock()
+
+
+class Scoring(NamedTuple):
+    match: int = 2
+    mismatch: int = -3
+    gap_open: int = 5
+    gap_extend: int = 2
+
+
+def encode(sequence: str) -> np.ndarray:
+    """Letters of a sequence as uint8 codes (case-insensitive)"""
+    return np.frombuffer(sequence.upper().encode('ascii'), dtype=np.uint8)
+
+
+def _rows(d: int, n: int, m: int, band):
+    """First and last row on anti-diagonal d inside the matrix (and band)"""
+    lo, hi = max(0, d - m), min(n, d)
+    if band is not None:
+        lo = max(lo, -(-(d - band) // 2))
+        hi = min(hi, (d + band) // 2)
+    return lo, hi
+
+
+def _layout(n: int, m: int, band):
+    """(row, shift) placing back-pointer cell (i, j) at ``i * row + j + shift``"""
+    if band is None or 2 * band >= m:
+        return m + 1, 0
+    # Row i keeps only columns i - band .. i + band
+    return 2 * band, band
+
+
+def _edge(k: int, local: bool, scoring: Scoring) -> int:
+    """Score of a first row/column cell k steps from the origin"""
+    if local or k == 0:
+        return 0
+    return -(scoring.gap_open + (k - 1) * scoring.gap_extend)
+
+
+def _sweep(a: np.ndarray, b: np.ndarray, scoring: Scoring, local: bool, band, traceback: bool):
+    n, m = len(a), len(b)
+    b_reversed = b[::-1].copy()
+    match, mismatch = np.int32(scoring.match), np.int32(scoring.mismatch)
+    gap_open, gap_extend = np.int32(scoring.gap_open), np.int32(scoring.gap_extend)
+
+    h2, h1, h = (np.full(n + 1, NEG, dtype=np.int32) for _ in range(3))
+    e1, e = np.full(n + 1, NEG, dtype=np.int32), np.full(n + 1, NEG, dtype=np.int32)
+    f1, f = np.full(n + 1, NEG, dtype=np.int32), np.full(n + 1, NEG, dtype=np.int32)
+    row, shift = _layout(n, m, band)
+    pointers = np.zeros((n + 1) * (row + 1), dtype=np.uint8) if traceback else None
+    best, best_cell = 0, (0, 0)
+    # Rows written on diagonals d - 3, d - 2 and d - 1; the rest of every buffer is NEG
+    written = [slice(0, 0)] * 3
+
+    for d in range(n + m + 1):
+        lo, hi = _rows(d, n, m, band)
+        h[written[0]] = NEG
+        e[written[1]] = NEG
+        f[written[1]] = NEG
+        written = written[1:] + [slice(lo, hi + 1)]
+        if lo > hi:
+            h2, h1, h = h1, h, h2
+            e1, e = e, e1
+            f1, f = f, f1
+            continue
+
+        # First row (i = 0) and first column (j = 0)
+        if lo == 0 and d <= m:
+            h[0] = _edge(d, local, scoring)
+            if d > 0 and not local:
+                e[0] = h[0]
+            if traceback:
+                pointers[d + shift] = STOP if local or d == 0 else FROM_E | (E_EXTEND if d > 1 else 0)
+        if hi == d and d > 0 and d <= n:
+            h[d] = _edge(d, local, scoring)
+            if not local:
+                f[d] = h[d]
+            if traceback:
+                pointers[d * row + shift] = STOP if local else FROM_F | (F_EXTEND if d > 1 else 0)
+
+        # Interior cells: rows ilo..ihi, columns j = d - i
+        ilo, ihi = max(lo, 1), min(hi, d - 1)
+        if ilo <= ihi:
+            rows = slice(ilo, ihi + 1)
+            up = slice(ilo - 1, ihi)
+            same = a[ilo - 1:ihi] == b_reversed[m - d + ilo:m - d + ihi + 1]
+            diagonal = h2[up] + np.where(same, match, mismatch)
+            e_open, e_ext = h1[rows] - gap_open, e1[rows] - gap_extend
+            f_open, f_ext = h1[up] - gap_open, f1[up] - gap_extend
+            e_cells = np.maximum(e_open, e_ext)
+            f_cells = np.maximum(f_open, f_ext)
+            h_cells = np.maximum(diagonal, np.maximum(e_cells, f_cells))
+            if local:
+                np.maximum(h_cells, 0, out=h_cells)
+            h[rows], e[rows], f[rows] = h_cells, e_cells, f_cells
+
+            if traceback:
+                source = np.where(h_cells == diagonal, FROM_DIAG,
+                                  np.where(h_cells == e_cells, FROM_E, FROM_F)).astype(np.uint8)
+                if local:
+                    source[h_cells == 0] = STOP
+                source |= np.where(e_ext >= e_open, E_EXTEND, 0).astype(np.uint8)
+                source |= np.where(f_ext >= f_open, F_EXTEND, 0).astype(np.uint8)
+                # Cell (i, d - i) sits at i * (row - 1) + d + shift; a zero band has one cell per diagonal
+                step = max(row - 1, 1)
+                first = ilo * (row - 1) + d + shift
+                pointers[first:first + (ihi - ilo) * step + 1:step] = source
+            if local:
+                top = int(h_cells.argmax())
+                if h_cells[top] > best:
+                    best, best_cell = int(h_cells[top]), (ilo + top, d - ilo - top)
+
+        h2, h1, h = h1, h, h2
+        e1, e = e, e1
+        f1, f = f, f1
+
+    if local:
+        return best, best_cell, pointers
+    return int(h1[n]), (n, m), pointers
+
+
+def _trace(a: str, b: str, pointers: np.ndarray, end, band=None):
+    """Walk the back-pointers from ``end``; returns aligned strings and the start cell"""
+    row, shift = _layout(len(a), len(b), band)
+    i, j = end
+    state = FROM_DIAG
+    top, bottom = [], []
+    while i > 0 or j > 0:
+        bits = int(pointers[i * row + j + shift])
+        if state == FROM_DIAG:
+            source = bits & 3
+            if source == STOP:
+                break
+            if source == FROM_DIAG:
+                top.append(a[i - 1])
+                bottom.append(b[j - 1])
+                i, j = i - 1, j - 1
+            else:
+                state = source
+        elif state == FROM_E:
+            top.append('-')
+            bottom.append(b[j - 1])
+            j -= 1
+            state = FROM_E if bits & E_EXTEND else FROM_DIAG
+        else:
+            top.append(a[i - 1])
+            bottom.append('-')
+            i -= 1
+            state = FROM_F if bits & F_EXTEND else FROM_DIAG
+    return ''.join(reversed(top)), ''.join(reversed(bottom)), (i, j)
+
+
+def cigar(aligned_a: str, aligned_b: str) -> str:
+    """CIGAR string of an alignment (M match/mismatch, I insertion in b, D deletion from a)"""
+    ops = []
+    for x, y in zip(aligned_a, aligned_b):
+        op = 'I' if x == '-' else 'D' if y == '-' else 'M'
+        if ops and ops[-1][0] == op:
+            ops[-1][1] += 1
+        else:
+            ops.append([op, 1])
+    return ''.join(f'{count}{op}' for op, count in ops)
+
+
+def align(a: str, b: str, mode: str = 'global', band: int = None, score_only: bool = False,
+          scoring: Scoring = Scoring()) -> dict:
+    """Align two sequences; see the module docstring for the modes"""
+    if mode not in MODES:
+        raise ValueError(f'Unknown alignment mode {mode!r}')
+    if band is not None:
+        band = int(band)
+        if band < 0:
+            raise ValueError('band must not be negative')
+        if mode == 'global' and abs(len(a) - len(b)) > band:
+            raise ValueError(f'A global alignment of these lengths needs band >= {abs(len(a) - len(b))}')
+
+    local = mode == 'local'
+    score, end, pointers = _sweep(encode(a), encode(b), scoring, local, band, not score_only)
+    result = {'mode': mode, 'score': score, 'a_end': end[0], 'b_end': end[1]}
+    if score_only:
+        return result
+
+    aligned_a, aligned_b, start = _trace(a.upper(), b.upper(), pointers, end, band)
+    matches = sum(1 for x, y in zip(aligned_a, aligned_b) if x == y)
+    result.update({
+        'a_start': start[0],
+        'b_start': start[1],
+        'aligned_a': aligned_a,
+        'aligned_b': aligned_b,
+        'cigar': cigar(aligned_a, aligned_b),
+        'identity': round(matches / len(aligned_a), 4) if aligned_a else 0.0,
+    })
+    return result
+
+
+def _align_chunk(pairs, sequences_a, sequences_b, options):
+    return [(qi, ti, align(sequences_a[qi], sequences_b[ti], **options)) for qi, ti in pairs]
+
+
+def pool_size() -> int:
+    """Processes in the alignment pool: this server worker's share of the CPUs"""
+    from utils.admission import cpu_share
+    return int(os.environ.get('ALIGN_PROCESSES', cpu_share()))
+
+
+def processes_for(queries, targets) -> int:
+    """How many processes ``align_many`` would keep busy for this batch"""
+    pairs = len(queries) * len(targets)
+    cells = sum(len(q) for q in queries) * sum(len(t) for t in targets)
+    if cells < POOL_MIN_CELLS or pairs < 2:
+        return 1
+    return min(pairs, pool_size()) if pool_size() >= 2 else 1
+
+
+def _pool() -> ProcessPoolExecutor:
+    """This process's alignment pool. Workers come from a clean forkserver, not from a
+    copy of a threaded web worker."""
+    pid = os.getpid()
+    pool = _pools.get(pid)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(pid)
+            if pool is None:
+                _pools.clear()
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                workers = pool_size()
+                pool = _pools[pid] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return pool
+
+
+def align_many(queries, targets, processes: int = None, **options) -> list:
+    """
+    Align every query against every target. Returns ``(query index, target index,
+    result)`` tuples in row-major order. Large batches run on the process pool.
+    """
+    pairs = [(qi, ti) for qi in range(len(queries)) for ti in range(len(targets))]
+    cells = sum(len(queries[qi]) * len(targets[ti]) for qi, ti in pairs)
+    if processes == 1 or cells < POOL_MIN_CELLS or len(pairs) < 2:
+        return _align_chunk(pairs, queries, targets, options)
+
+    pool = _pool()
+    if pool._max_workers < 2:
+        return _align_chunk(pairs, queries, targets, options)
+    chunk_count = min(len(pairs), 4 * pool._max_workers)
+    chunks = [pairs[k::chunk_count] for k in range(chunk_count)]
+    results = []
+    for chunk_result in pool.map(_align_chunk, chunks, [queries] * chunk_count,
+                                 [targets] * chunk_count, [options] * chunk_count):
+        results.extend(chunk_result)
+    results.sort(key=lambda item: (item[0], item[1]))
+    return results
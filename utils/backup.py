@@ -0,0 +1,259 @@
+"""
+Online, throttled backups of the SQLite databases.
+
+Snapshots use SQLite's online backup API, copying ``pages`` pages per step
+and sleeping ``sleep`` seconds between steps, so a writer is never held up
+for more than one step (in WAL mode readers do not block writers at all).
+If the source keeps changing, the API restarts the copy; after
+``max_restarts`` restarts the copy is finished in one step instead of
+chasing the writers indefinitely.
+
+Each snapshot is written to a temporary file, checked with
+``PRAGMA integrity_check``, gzip-compressed and renamed into BACKUP_DIR as
+``<database>-<UTC timestamp>.db.gz``. Older snapshots are pruned by count
+and age. ``BackupScheduler`` runs the same steps in the background when
+BACKUP_INTERVAL_HOURS is set; a lock file makes sure only one process on the
+host takes each backup.
+"""
+
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every process may back up
+    fcntl = None
+
+from paths import BACKUP_DIR, COMPOUNDS_DB_PATH, DATABASE_PATH
+
+logger = logging.getLogger(__name__)
+
+DATABASES = {
+    'compounds': COMPOUNDS_DB_PATH,
+    'settings': DATABASE_PATH,
+}
+SUFFIX = '.db.gz'
+
+
+class BackupError(Exception):
+    """A snapshot could not be taken or failed verification"""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _copy(source_path, target_path, pages: int, sleep: float, max_restarts: int, progress=None):
+    """Page-stepped online copy; returns the number of restarts caused by concurrent writes"""
+    restarts = 0
+    previous_remaining = None
+
+    def on_progress(status, remaining, total):
+        nonlocal restarts, previous_remaining
+        if previous_remaining is not None and remaining > previous_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestarts()
+        previous_remaining = remaining
+        if progress is not None:
+            progress(total - remaining, total)
+        if remaining and sleep > 0:
+            time.sleep(sleep)
+
+    source = sqlite3.connect(f'file:{source_path}?mode=ro', uri=True, timeout=30)
+    try:
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=on_progress)
+            except _TooManyRestarts:
+                logger.warning(f"Backup of {source_path} restarted {restarts} times; finishing in one step")
+                source.backup(target, pages=-1)
+            # A copy of a WAL database is in WAL mode too; a standalone snapshot should not be
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return restarts
+
+
+def verify(path) -> str:
+    """Run PRAGMA integrity_check on an uncompressed database file; returns 'ok' or the first problem"""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return conn.execute('PRAGMA integrity_check').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def backup_database(name: str, source_path=None, backup_dir=BACKUP_DIR, pages: int = 256, sleep: float = 0.01,
+                    compress: bool = True, max_restarts: int = 10, progress=None) -> dict:
+    """Take one verified snapshot of a database and return a summary of it"""
+    source_path = source_path or DATABASES[name]
+    if not os.path.exists(source_path):
+        raise BackupError(f'{source_path} does not exist')
+    os.makedirs(backup_dir, exist_ok=True)
+
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    final_path = os.path.join(backup_dir, f'{name}-{stamp}' + (SUFFIX if compress else '.db'))
+    tmp_path = os.path.join(backup_dir, f'.{name}-{stamp}.{os.getpid()}.tmp')
+    start = time.perf_counter()
+    try:
+        restarts = _copy(source_path, tmp_path, pages, sleep, max_restarts, progress)
+        result = verify(tmp_path)
+        if result != 'ok':
+            raise BackupError(f'Integrity check of the {name} snapshot failed: {result}')
+        size = os.path.getsize(tmp_path)
+        if compress:
+            packed_path = tmp_path + '.gz'
+            with open(tmp_path, 'rb') as src, gzip.open(packed_path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.unlink(tmp_path)
+            tmp_path = packed_path
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        for leftover in (tmp_path, tmp_path + '.gz', tmp_path + '-wal', tmp_path + '-shm'):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+        raise
+
+    return {
+        'database': name,
+        'path': final_path,
+        'bytes': size,
+        'stored_bytes': os.path.getsize(final_path),
+        'restarts': restarts,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def list_backups(name: str, backup_dir=BACKUP_DIR) -> list:
+    """Snapshots of a database, newest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    snapshots = [os.path.join(backup_dir, entry) for entry in os.listdir(backup_dir)
+                 if entry.startswith(f'{name}-') and (entry.endswith(SUFFIX) or entry.endswith('.db'))]
+    return sorted(snapshots, reverse=True)  # timestamps sort lexically
+
+
+def prune(name: str, keep: int, max_age_days: float = None, backup_dir=BACKUP_DIR) -> list:
+    """Delete snapshots beyond the newest ``keep`` or older than ``max_age_days``; returns the removed paths"""
+    removed = []
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+    for position, path in enumerate(list_backups(name, backup_dir)):
+        if position >= keep or (cutoff is not None and position > 0 and os.path.getmtime(path) < cutoff):
+            os.unlink(path)
+            removed.append(path)
+    return removed
+
+
+def restore_to(snapshot_path, target_path):
+    """Decompress a snapshot to ``target_path`` (for inspection or a manual restore)"""
+    opener = gzip.open if snapshot_path.endswith('.gz') else open
+    with opener(snapshot_path, 'rb') as src, open(target_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    return target_path
+
+
+class BackupScheduler:
+    """Backs up every database each ``interval`` seconds; one process per host does the work"""
+
+    def __init__(self, interval: float, keep: int, max_age_days: float = None, backup_dir=BACKUP_DIR, **options):
+        self.interval = interval
+        self.keep = keep
+        self.max_age_days = max_age_days
+        self.backup_dir = backup_dir
+        self.options = options
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='backup-scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def due(self) -> bool:
+        """True if the newest snapshot of any database is older than the interval"""
+        for name, path in DATABASES.items():
+            if not os.path.exists(path):
+                continue
+            snapshots = list_backups(name, self.backup_dir)
+            if not snapshots or time.time() - os.path.getmtime(snapshots[0]) >= self.interval:
+                return True
+        return False
+
+    def _run(self):
+        # Check more often than the interval so a restart does not delay the next backup by a whole period
+        while not self._stop.wait(min(self.interval, 300)):
+            try:
+                if self.due():
+                    self.run_once()
+            except Exception as e:
+                logger.error(f"Scheduled backup failed: {e}")
+
+    def run_once(self) -> list:
+        """Back up every database unless another process holds the backup lock"""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        with open(os.path.join(self.backup_dir, '.backup-lock'), 'a') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return []
+            if not self.due():  # another process finished one while we waited
+                return []
+            return run_backups(keep=self.keep, max_age_days=self.max_age_days,
+                               backup_dir=self.backup_dir, **self.options)
+
+
+def run_backups(names=None, keep: int = 7, max_age_days: float = None, backup_dir=BACKUP_DIR, **options) -> list:
+    """Snapshot and prune each named database (all by default), reporting progress as a job"""
+    from utils import jobs
+
+    summaries = []
+    for name in names or DATABASES:
+        if not os.path.exists(DATABASES[name]):
+            logger.info(f"Skipping backup of {name}: {DATABASES[name]} does not exist")
+            continue
+        with jobs.start(f'Backup {name}') as job:
+            def progress(done, total):
+                job.total = total
+                job.advance(done - job.done)
+            summary = backup_database(name, backup_dir=backup_dir, progress=progress, **options)
+            summary['pruned'] = prune(name, keep, max_age_days, backup_dir)
+            job.message = f"{summary['stored_bytes']} bytes stored"
+        logger.info(f"Backed up {name} to {summary['path']} ({summary['bytes']} bytes, "
+                    f"{summary['stored_bytes']} stored, {summary['seconds']:.2f}s)")
+        summaries.append(summary)
+    return summaries
+
+
+_scheduler = None
+
+
+def init_app(app):
+    """Start the scheduled backup when BACKUP_INTERVAL_HOURS is set (again in each forked worker)"""
+    global _scheduler
+    app.config.setdefault('BACKUP_INTERVAL_HOURS', float(os.environ.get('BACKUP_INTERVAL_HOURS', 0)))
+    app.config.setdefault('BACKUP_KEEP', int(os.environ.get('BACKUP_KEEP', 7)))
+    app.config.setdefault('BACKUP_MAX_AGE_DAYS', float(os.environ.get('BACKUP_MAX_AGE_DAYS', 0)) or None)
+    interval_hours = app.config['BACKUP_INTERVAL_HOURS']
+    if not interval_hours or _scheduler is not None:
+        return
+
+    _scheduler = BackupScheduler(interval_hours * 3600, app.config['BACKUP_KEEP'],
+                                 app.config['BACKUP_MAX_AGE_DAYS']).start()
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_scheduler.start)
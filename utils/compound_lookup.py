@@ -0,0 +1,83 @@
+"""
+Resolve many compound identifiers in a few queries.
+
+Identifiers are grouped by kind (id, name, CAS number, sync hash), each
+kind is looked up with ``IN`` queries of at most ``CHUNK_SIZE`` values
+against its unique column, and the results are returned in input order.
+Duplicates are resolved once. Identifiers that match nothing come back as
+explicit misses rather than being dropped.
+"""
+
+import re
+
+from sqlalchemy.orm import selectinload
+
+KINDS = ('id', 'name', 'cas_number', 'sync_hash')
+CHUNK_SIZE = 500  # well below SQLite's bound-parameter limit
+
+_CAS_NUMBER = re.compile(r'^\d{2,7}-\d{2}-\d$')
+_SYNC_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+
+def classify(identifier) -> tuple:
+    """Guess the kind of an identifier: (kind, normalized value)"""
+    if isinstance(identifier, bool):
+        return 'name', str(identifier)
+    if isinstance(identifier, int):
+        return 'id', identifier
+    value = str(identifier).strip()
+    if value.isdigit():
+        return 'id', int(value)
+    if _CAS_NUMBER.match(value):
+        return 'cas_number', value
+    if _SYNC_HASH.match(value.lower()):
+        return 'sync_hash', value.lower()
+    return 'name', value
+
+
+def normalize(identifier, kind: str):
+    """Coerce an identifier of a known kind; raises ValueError if it cannot be one"""
+    if kind == 'id':
+        if isinstance(identifier, bool):
+            raise ValueError(f'Not a compound id: {identifier!r}')
+        return int(identifier)
+    value = str(identifier).strip()
+    return value.lower() if kind == 'sync_hash' else value
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def resolve(identifiers, kind: str = 'auto', chunk_size: int = CHUNK_SIZE) -> list:
+    """
+    Look up compounds for a list of identifiers. ``kind`` is one of KINDS,
+    or ``auto`` to classify each identifier on its own. Returns one entry per
+    input, in order: ``(identifier, kind, Compound or None)``.
+    """
+    from models.models import Compound
+
+    keys = []
+    wanted = {name: set() for name in KINDS}
+    for identifier in identifiers:
+        if kind == 'auto':
+            key_kind, value = classify(identifier)
+        else:
+            key_kind, value = kind, normalize(identifier, kind)
+        keys.append((identifier, key_kind, value))
+        wanted[key_kind].add(value)
+
+    found = {}  # (kind, value) -> Compound
+    for key_kind, values in wanted.items():
+        if not values:
+            continue
+        column = getattr(Compound, key_kind)
+        for chunk in _chunks(sorted(values, key=str), chunk_size):
+            query = (Compound.query
+                     .options(selectinload(Compound.biochemical_group))
+                     .filter(column.in_(chunk)))
+            for compound in query:
+                found[(key_kind, getattr(compound, key_kind))] = compound
+
+    return [(identifier, key_kind, found.get((key_kind, value))) for identifier, key_kind, value in keys]
@@ -0,0 +1,275 @@
+"""
+Response compression.
+
+Responses whose content type is on COMPRESSION_MIMETYPES are encoded with
+brotli (the ``Brotli`` package in requirements.txt; without it the app is
+gzip-only) or gzip, whichever the client prefers in ``Accept-Encoding``:
+
+- buffered responses are compressed when at least COMPRESSION_MIN_BYTES
+  long; smaller ones are not worth the header overhead
+- streamed responses (generators) are compressed chunk by chunk, each chunk
+  flushed so the client receives it as soon as it is produced
+- ``text/event-stream`` is not on the list: the live dashboard's frames
+  are tiny and some proxies buffer encoded streams
+- responses that are already encoded, ``Cache-Control: no-transform``,
+  partial content and HEAD requests pass through untouched
+
+gzip output is raw deflate from a per-process pool of compressor objects
+wrapped in a gzip header and trailer. A response ends with a full flush,
+which resets the compressor's history, so the next response starts from a
+clean state (nothing leaks between responses) without paying for a new
+zlib stream; that halves the cost of compressing a small JSON response.
+
+Static files under ``static/`` are served from precompressed ``.br`` or
+``.gz`` siblings instead. They are written at deploy time, by
+``python app.py compress-static`` or by the gunicorn master on start, never
+by request threads: a file without an up-to-date sibling is served plain.
+
+Compressed responses get weak ETags, since the bytes differ from the
+identity encoding while the content is the same.
+"""
+
+import gzip
+import logging
+import mimetypes
+import os
+import struct
+import threading
+import zlib
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+from utils.metrics import registry
+
+try:
+    import brotli
+except ImportError:  # listed in requirements.txt; without it, gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIMETYPES = (
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript', 'application/javascript',
+    'application/json', 'application/xml', 'image/svg+xml',
+)
+STATIC_SUFFIXES = ('.css', '.js', '.json', '.svg', '.txt', '.map', '.html')
+STATIC_MIN_BYTES = 256
+POOL_SIZE = 16
+
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'  # deflate, no name or mtime, unknown OS
+_FINAL_BLOCK = b'\x03\x00'  # an empty final block in fixed Huffman codes
+_ENCODED_SUFFIX = {'br': '.br', 'gzip': '.gz'}
+
+_pools = {}  # pid -> {level: [compressor, ...]}
+_pools_lock = threading.Lock()
+
+
+def _pool(level: int) -> list:
+    pid = os.getpid()
+    pools = _pools.get(pid)
+    if pools is None:
+        with _pools_lock:
+            pools = _pools.get(pid)
+            if pools is None:
+                _pools.clear()  # a forked child keeps its own
+                pools = _pools[pid] = {}
+    return pools.setdefault(level, [])
+
+
+def _acquire(level: int):
+    try:
+        return _pool(level).pop()
+    except IndexError:
+        return zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+
+def _release(level: int, compressor):
+    pool = _pool(level)
+    if len(pool) < POOL_SIZE:
+        pool.append(compressor)
+
+
+def gzip_chunks(chunks, level: int = 6, flush_each: bool = False):
+    """gzip-encode an iterable of byte chunks, yielding encoded chunks"""
+    compressor = _acquire(level)
+    crc, size, finished = 0, 0, False
+    try:
+        yield _GZIP_HEADER
+        for chunk in chunks:
+            if not chunk:
+                continue
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            encoded = compressor.compress(chunk)
+            if flush_each:
+                encoded += compressor.flush(zlib.Z_SYNC_FLUSH)
+            if encoded:
+                yield encoded
+        # A full flush ends byte-aligned with the history reset, ready for the next response
+        tail = compressor.flush(zlib.Z_FULL_FLUSH)
+        finished = True
+        yield tail + _FINAL_BLOCK + struct.pack('<II', crc, size & 0xFFFFFFFF)
+    finally:
+        if not finished:
+            compressor.flush(zlib.Z_FULL_FLUSH)  # abandoned mid-stream: discard and reset
+        _release(level, compressor)
+
+
+def brotli_chunks(chunks, quality: int = 4, flush_each: bool = False):
+    """brotli-encode an iterable of byte chunks (requires the brotli package)"""
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        if chunk:
+            encoded = compressor.process(chunk)
+            if flush_each:
+                encoded += compressor.flush()
+            if encoded:
+                yield encoded
+    yield compressor.finish()
+
+
+def negotiate(accept_encodings, available=None):
+    """The preferred encoding among the available ones ('br', 'gzip'), or None for identity"""
+    if available is None:
+        available = ('br', 'gzip') if brotli is not None else ('gzip',)
+    best = accept_encodings.best_match(available)
+    return best if best and accept_encodings[best] > 0 else None
+
+
+def _weaken_etag(response):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def _closing(chunks, close):
+    try:
+        yield from chunks
+    finally:
+        if close is not None:
+            close()
+
+
+def compress_response(response, config):
+    """Encode ``response`` in place if the client, content type and size allow it"""
+    if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESSION_MIMETYPES']):
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return response
+    encoding = negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    def encoder(chunks, flush_each):
+        if encoding == 'br':
+            return brotli_chunks(chunks, config['COMPRESSION_BROTLI_QUALITY'], flush_each)
+        return gzip_chunks(chunks, config['COMPRESSION_GZIP_LEVEL'], flush_each)
+
+    if response.is_streamed:
+        original = response.response
+        response.response = _closing(encoder(response.iter_encoded(), True), getattr(original, 'close', None))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESSION_MIN_BYTES']:
+            return response
+        encoded = b''.join(encoder((data,), False))
+        if len(encoded) >= len(data):
+            return response
+        response.set_data(encoded)
+        registry.inc('mn_http_compressed_bytes_total', (('encoding', encoding), ('stage', 'in')), len(data))
+        registry.inc('mn_http_compressed_bytes_total', (('encoding', encoding), ('stage', 'out')), len(encoded))
+    response.headers['Content-Encoding'] = encoding
+    _weaken_etag(response)
+    return response
+
+
+def precompress_file(path, encodings=None) -> list:
+    """Write ``path``.gz (and ``path``.br with brotli) where missing or older than the file; returns the paths written"""
+    if encodings is None:
+        encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+    written = []
+    source_mtime = os.path.getmtime(path)
+    data = None
+    for encoding in encodings:
+        target = path + _ENCODED_SUFFIX[encoding]
+        if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+            continue
+        if data is None:
+            with open(path, 'rb') as handle:
+                data = handle.read()
+        encoded = brotli.compress(data, quality=11) if encoding == 'br' else gzip.compress(data, 9, mtime=0)
+        tmp_path = f'{target}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as handle:
+            handle.write(encoded)
+        os.replace(tmp_path, target)
+        written.append(target)
+    return written
+
+
+def precompress_static(folder) -> list:
+    """Precompress every static text asset under ``folder``; returns the paths written"""
+    written = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(STATIC_SUFFIXES) and os.path.getsize(path) >= STATIC_MIN_BYTES:
+                written.extend(precompress_file(path))
+    return written
+
+
+def _fresh_encodings(path) -> tuple:
+    """Encodings with a precompressed sibling at least as new as ``path``"""
+    source_mtime = os.path.getmtime(path)
+    fresh = []
+    for encoding, suffix in _ENCODED_SUFFIX.items():
+        try:
+            if os.path.getmtime(path + suffix) >= source_mtime:
+                fresh.append(encoding)
+        except OSError:
+            continue
+    return tuple(fresh)
+
+
+def _static_view(app):
+    serve_plain = app.view_functions['static']
+
+    def static(filename):
+        path = safe_join(app.static_folder, filename)
+        if (path is None or not filename.endswith(STATIC_SUFFIXES) or not os.path.isfile(path)
+                or os.path.getsize(path) < STATIC_MIN_BYTES):
+            return serve_plain(filename=filename)
+        available = _fresh_encodings(path)
+        encoding = negotiate(request.accept_encodings, available) if available else None
+        if encoding is None:
+            response = serve_plain(filename=filename)
+        else:
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = send_from_directory(app.static_folder, filename + _ENCODED_SUFFIX[encoding],
+                                           mimetype=mimetype, max_age=app.get_send_file_max_age(filename))
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+    return static
+
+
+def init_app(app):
+    """Compress responses and serve precompressed static files (disable with COMPRESSION_ENABLED=False)"""
+    app.config.setdefault('COMPRESSION_ENABLED', os.environ.get('COMPRESSION_ENABLED', '1') != '0')
+    app.config.setdefault('COMPRESSION_MIN_BYTES', int(os.environ.get('COMPRESSION_MIN_BYTES', 500)))
+    app.config.setdefault('COMPRESSION_GZIP_LEVEL', int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)))
+    app.config.setdefault('COMPRESSION_BROTLI_QUALITY', int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4)))
+    app.config.setdefault('COMPRESSION_MIMETYPES', DEFAULT_MIMETYPES)
+    if not app.config['COMPRESSION_ENABLED']:
+        return
+
+    if app.static_folder and 'static' in app.view_functions:
+        app.view_functions['static'] = _static_view(app)
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, app.config)
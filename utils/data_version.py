@@ -0,0 +1,153 @@
+"""
+Global data-version token and conditional GET support.
+
+Any write to compounds, settings or workers bumps a token stored in a small
+file next to the databases. Reading it costs one ``stat`` per request, and
+because the file is shared, a bump in one process (a gunicorn worker or a CLI
+command) is seen by all others. Strong ETags are derived from the token plus
+the request parameters, so unchanged data can be answered with a 304 before
+any query or template work runs.
+
+Views served from a per-worker in-memory index (the compound snapshot, the
+facet index) pass ``version=``: those indexes catch up with the data version
+in the background, so their ETag must name the version actually served, or a
+stale page would be tagged as current and revalidated with 304 until the
+next write.
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+
+from flask import request, session, make_response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from paths import DATA_VERSION_PATH
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_cached_signature = None
+_cached_token = '0'
+_events_registered = False
+
+# Pages embed signed CSRF tokens that expire, so their ETags also roll over
+# on this interval (well inside Flask-WTF's default one hour limit).
+SESSION_ETAG_WINDOW = 1800
+
+
+def current() -> str:
+    """Return the current data-version token"""
+    global _cached_signature, _cached_token
+    try:
+        stat = os.stat(DATA_VERSION_PATH)
+    except FileNotFoundError:
+        return '0'
+
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if signature == _cached_signature:
+        return _cached_token
+
+    with _lock:
+        try:
+            token = DATA_VERSION_PATH.read_text().strip() or '0'
+        except FileNotFoundError:
+            return '0'
+        _cached_signature, _cached_token = signature, token
+    return token
+
+
+def bump(reason: str = None) -> str:
+    """Publish a new data-version token, invalidating every derived ETag and cache key"""
+    token = uuid.uuid4().hex
+    DATA_VERSION_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = DATA_VERSION_PATH.with_name(f'.{DATA_VERSION_PATH.name}.{os.getpid()}.{threading.get_ident()}')
+    tmp_path.write_text(token)
+    os.replace(tmp_path, DATA_VERSION_PATH)
+    if reason:
+        logger.debug(f"Data version bumped ({reason}): {token}")
+    return token
+
+
+def _track_changes(session_, flush_context):
+    if session_.new or session_.dirty or session_.deleted:
+        session_.info['data_changed'] = True
+
+
+def _publish_changes(session_):
+    if session_.info.pop('data_changed', False):
+        bump('database commit')
+
+
+def _discard_changes(session_):
+    session_.info.pop('data_changed', None)
+
+
+def register_model_events():
+    """Bump the data version whenever an ORM session commits changes"""
+    global _events_registered
+    if _events_registered:
+        return
+    event.listen(Session, 'after_flush', _track_changes)
+    event.listen(Session, 'after_commit', _publish_changes)
+    event.listen(Session, 'after_rollback', _discard_changes)
+    _events_registered = True
+
+
+def compute_etag(*parts, version: str = None) -> str:
+    """Derive a strong ETag from the data version (or ``version``), the endpoint and the request parameters"""
+    digest = hashlib.sha256((current() if version is None else version).encode('utf-8'))
+    digest.update(str(request.endpoint).encode('utf-8'))
+    for key, value in sorted((request.view_args or {}).items()):
+        digest.update(f'\x00{key}={value}'.encode('utf-8'))
+    for key, value in sorted(request.args.items(multi=True)):
+        digest.update(f'\x01{key}={value}'.encode('utf-8'))
+    for part in parts:
+        digest.update(f'\x02{part}'.encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def conditional(per_session: bool = False, version=None):
+    """
+    Answer GET requests with 304 Not Modified while the data version is unchanged.
+
+    Views that render per-session content (CSRF tokens, flashed messages) should
+    pass ``per_session=True`` so their ETags also vary by session. ``version`` is
+    a callable returning the version of the data the view will serve, for views
+    that do not read the database directly. It is called before the view, so an
+    index swapped in meanwhile can only make the ETag older than the body, never
+    newer.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+
+            parts = ()
+            if per_session:
+                # Pending flash messages must be rendered, never short-circuited
+                if session.get('_flashes'):
+                    return view(*args, **kwargs)
+                parts = (session.get('csrf_token', ''), int(time.time() // SESSION_ETAG_WINDOW))
+
+            etag = compute_etag(*parts, version=version() if version else None)
+            # Weak comparison: compressed responses carry the same ETag marked weak
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache' if per_session else 'no-cache'
+            if per_session:
+                response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
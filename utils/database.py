@@ -1,15 +1,35 @@
 
 import sqlite3
 import logging
+import time
 from pathlib import Path
 from paths import DATABASE_PATH, DATABASE_DIR
+from utils.data_version import bump
+from utils.metrics import record_query
 
 logger = logging.getLogger(__name__)
 
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection that reports query timings to utils.metrics"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(DATABASE_PATH.name, sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(DATABASE_PATH.name, sql, time.perf_counter() - start)
+
 def get_db_connection():
     """Get SQLite database connection with row factory"""
     DATABASE_DIR.mkdir(parents=True, exist_ok=True) # Ensure database directory exists
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(DATABASE_PATH, factory=InstrumentedConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -86,6 +106,7 @@ def set_setting(key: str, value: str, description: str = None):
             VALUES (?, ?, ?, CURRENT_TIMESTAMP)
         ''', (key, value, description))
         conn.commit()
+        bump('settings')
         logger.info(f"Setting updated: {key} = {value}")
     finally:
         conn.close()
@@ -0,0 +1,204 @@
+"""
+Read/write split for the SQLite compounds database.
+
+Every connection runs in WAL mode with tuned pragmas, so readers never block
+behind a writer. Two engines point at the same file:
+
+- the default (writer) engine has a pool of one connection per process and
+  starts every transaction with ``BEGIN IMMEDIATE``, so a transaction never
+  fails half-way when upgrading a read lock;
+- the ``readonly`` bind has a larger pool of ``query_only`` connections.
+
+``RoutingSession`` sends queries from GET/HEAD requests (and code inside
+``reading()``) to the reader; flushes and everything else go to the writer.
+
+Mutations should run through ``write_transaction``. It queues writers on a
+lock file next to the database (``flock``), so processes take turns instead
+of racing SQLite's sleeping busy handler, which lets a bulk import starve
+every other writer. It also retries with exponential backoff when the
+database is still busy, e.g. because of a writer outside this path.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to SQLite's own locking
+    fcntl = None
+
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+READ_BIND = 'readonly'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',   # durable at checkpoints; safe with WAL
+    'PRAGMA foreign_keys=ON',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-32000',    # 32 MB page cache per connection
+    'PRAGMA mmap_size=268435456',  # 256 MB memory-mapped reads
+)
+
+_local = threading.local()
+_writer_lock = threading.Lock()
+_lock_files = {}  # (pid, database path) -> open lock file
+
+
+def engine_config(app):
+    """Engine options for the writer and the read-only bind; call before db.init_app"""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if not uri.startswith('sqlite:///') or ':memory:' in uri:
+        return
+
+    busy_timeout = float(app.config.setdefault('DB_BUSY_TIMEOUT', float(os.environ.get('DB_BUSY_TIMEOUT', 5))))
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': 60,
+        'connect_args': {'timeout': busy_timeout},
+    })
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    binds.setdefault(READ_BIND, {
+        'url': uri,
+        'pool_size': int(os.environ.get('DB_READ_POOL_SIZE', 8)),
+        'max_overflow': 8,
+        'connect_args': {'timeout': busy_timeout},
+    })
+
+
+def _on_connect(dbapi_connection, connection_record, read_only: bool):
+    # Let SQLAlchemy's begin event issue BEGIN instead of the sqlite3 module
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    for pragma in PRAGMAS:
+        cursor.execute(pragma)
+    if read_only:
+        cursor.execute('PRAGMA query_only=ON')
+    cursor.close()
+
+
+def _writer_begin(conn):
+    conn.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def _reader_begin(conn):
+    conn.exec_driver_sql('BEGIN')
+
+
+def init_app(app, db):
+    """Install pragmas and transaction handling on the engines; call after db.init_app"""
+    with app.app_context():
+        engines = db.engines
+        writer = engines.get(None)
+        if writer is None or writer.dialect.name != 'sqlite':
+            return
+        for engine, read_only in ((writer, False), (engines.get(READ_BIND), True)):
+            if engine is None or event.contains(engine, 'begin', _writer_begin if not read_only else _reader_begin):
+                continue
+            event.listen(engine, 'connect', lambda c, r, ro=read_only: _on_connect(c, r, ro))
+            event.listen(engine, 'begin', _reader_begin if read_only else _writer_begin)
+
+
+@contextmanager
+def reading():
+    """Route this thread's queries to the read-only pool (e.g. in CLI reports)"""
+    previous = getattr(_local, 'reading', False)
+    _local.reading = True
+    try:
+        yield
+    finally:
+        _local.reading = previous
+
+
+def _use_reader() -> bool:
+    if getattr(_local, 'reading', False):
+        return True
+    return has_request_context() and request.method in READ_METHODS
+
+
+class RoutingSession(Session):
+    """Session that reads from the read-only bind during safe requests"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _use_reader():
+            reader = self._db.engines.get(READ_BIND)
+            if reader is not None:
+                return reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def is_busy_error(error: Exception) -> bool:
+    message = str(getattr(error, 'orig', error)).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def _lock_file(database: str):
+    key = (os.getpid(), database)
+    handle = _lock_files.get(key)
+    if handle is None:
+        handle = _lock_files[key] = open(f'{database}.writer-lock', 'a')
+    return handle
+
+
+@contextmanager
+def serialized_writer():
+    """Hold the writer turn for this database: one thread per process, one process per host"""
+    from extensions import db
+
+    if getattr(_local, 'writing', False):
+        yield  # already inside a write transaction on this thread
+        return
+
+    database = db.engine.url.database if db.engine.dialect.name == 'sqlite' else None
+    with _writer_lock:
+        handle = _lock_file(database) if fcntl is not None and database and database != ':memory:' else None
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        _local.writing = True
+        try:
+            yield
+        finally:
+            _local.writing = False
+            if handle is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def write_transaction(work, retries: int = 5, backoff: float = 0.05, max_backoff: float = 2.0):
+    """
+    Run ``work()`` on the writer and commit, retrying with exponential backoff
+    and jitter if the database stays locked past the busy timeout. ``work`` must
+    be safe to re-run: it is called again from scratch after a rollback.
+    Nested calls run inside the outer transaction.
+    """
+    from extensions import db
+
+    if getattr(_local, 'writing', False):
+        return work()
+
+    for attempt in range(retries + 1):
+        try:
+            with serialized_writer():
+                result = work()
+                db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if not is_busy_error(e) or attempt == retries:
+                raise
+            delay = min(max_backoff, backoff * (2 ** attempt)) * (0.5 + random.random())
+            logger.warning(f"Database busy, retrying write in {delay:.2f}s (attempt {attempt + 1}/{retries})")
+            time.sleep(delay)
+        except Exception:
+            db.session.rollback()
+            raise
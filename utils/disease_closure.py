@@ -0,0 +1,163 @@
+"""
+Disease -> therapeutic area -> compound closure table.
+
+``disease_compound`` holds one row per (disease, compound) pair connected
+through the disease's therapeutic area, so "compounds relevant to disease
+X" is a primary-key range scan instead of a join across disease,
+compound_therapeutic_area and compound on every request.
+
+The table is kept current by the writing transaction itself. Each ORM
+flush notes the compounds whose areas changed and the diseases whose area
+changed; just before the commit, their rows are recomputed from the source
+tables with one DELETE and one INSERT ... SELECT per kind of change and
+chunk. Collecting first matters for imports, which autoflush once per
+compound. Deletions need no work: the table's foreign keys cascade. Core bulk writes that bypass the
+ORM (utils/synthetic.py) call ``refresh`` themselves, and ``ensure`` adds
+the table and its indexes to an existing database and backfills it.
+
+Size is one row (about 30 bytes with indexes) per compound per disease of
+each of its areas.
+"""
+
+import logging
+from itertools import chain
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session, attributes
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+_PENDING = 'disease_closure_pending'  # session.info key: (compound ids, disease ids) to refresh at commit
+_events_registered = False
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = sorted(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def refresh(connection, compound_ids=(), disease_ids=()):
+    """Recompute the closure rows of some compounds and diseases on ``connection``"""
+    from models.models import Disease, compound_therapeutic_area as links, disease_compound as closure
+
+    diseases = Disease.__table__
+    source = (select(diseases.c.id, links.c.compound_id, diseases.c.therapeutic_area_id)
+              .join(links, links.c.therapeutic_area_id == diseases.c.therapeutic_area_id))
+    columns = ['disease_id', 'compound_id', 'therapeutic_area_id']
+    for closure_column, source_column, ids in ((closure.c.compound_id, links.c.compound_id, compound_ids),
+                                               (closure.c.disease_id, diseases.c.id, disease_ids)):
+        for chunk in _chunks({id_ for id_ in ids if id_ is not None}):
+            connection.execute(closure.delete().where(closure_column.in_(chunk)))
+            connection.execute(closure.insert().from_select(columns, source.where(source_column.in_(chunk))))
+
+
+def rebuild(connection) -> int:
+    """Recompute the whole closure; returns the number of rows"""
+    from models.models import Disease, compound_therapeutic_area as links, disease_compound as closure
+
+    diseases = Disease.__table__
+    connection.execute(closure.delete())
+    connection.execute(closure.insert().from_select(
+        ['disease_id', 'compound_id', 'therapeutic_area_id'],
+        select(diseases.c.id, links.c.compound_id, diseases.c.therapeutic_area_id)
+        .join(links, links.c.therapeutic_area_id == diseases.c.therapeutic_area_id)))
+    return connection.execute(select(func.count()).select_from(closure)).scalar()
+
+
+def _history(obj, name):
+    # Never load anything during a flush; unloaded collections only report pending changes
+    return attributes.get_history(obj, name, passive=attributes.PASSIVE_NO_INITIALIZE)
+
+
+def _changed(obj, *names) -> bool:
+    return any(_history(obj, name).has_changes() for name in names)
+
+
+def _after_flush(session, flush_context):
+    from models.models import Compound, Disease, TherapeuticArea
+
+    compound_ids, disease_ids = set(), set()
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, Compound):
+            if obj in session.new or _changed(obj, 'therapeutic_areas'):
+                compound_ids.add(obj.id)
+        elif isinstance(obj, Disease):
+            if obj in session.new or _changed(obj, 'therapeutic_area_id', 'therapeutic_area'):
+                disease_ids.add(obj.id)
+        elif isinstance(obj, TherapeuticArea) and obj not in session.new:
+            # Collections changed from the area's side
+            history = _history(obj, 'compounds')
+            compound_ids.update(compound.id for compound in chain(history.added, history.deleted))
+            history = _history(obj, 'diseases')
+            disease_ids.update(disease.id for disease in chain(history.added, history.deleted))
+    if compound_ids or disease_ids:
+        pending = session.info.setdefault(_PENDING, (set(), set()))
+        pending[0].update(compound_ids)
+        pending[1].update(disease_ids)
+
+
+def _before_commit(session):
+    from models.models import Compound
+
+    session.flush()  # the commit's own flush only runs after this hook
+    pending = session.info.pop(_PENDING, None)
+    if pending is not None:
+        refresh(session.connection(bind_arguments={'mapper': Compound.__mapper__}), *pending)
+
+
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)  # rolled back
+
+
+def register_model_events():
+    """Maintain the closure in every ORM transaction that commits"""
+    global _events_registered
+    if _events_registered:
+        return
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'before_commit', _before_commit)
+    event.listen(Session, 'after_transaction_end', _after_transaction_end)
+    _events_registered = True
+
+
+def _missing(connection) -> bool:
+    """True if the database has the base tables but not the closure table or one of the new indexes"""
+    from models.models import Study, compound_therapeutic_area
+
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    if not {'compound', 'disease', 'compound_therapeutic_area', 'study'} <= tables:
+        return False  # not initialised yet; init-db creates everything
+    if 'disease_compound' not in tables:
+        return True
+    present = {index['name'] for table in ('study', 'compound_therapeutic_area') for index in inspector.get_indexes(table)}
+    return not {index.name for index in chain(compound_therapeutic_area.indexes, Study.__table__.indexes)} <= present
+
+
+def ensure(db):
+    """Create the closure table and the new indexes in an existing database, backfilling the closure"""
+    from models.models import Study, compound_therapeutic_area, disease_compound
+    from utils.db_routing import READ_BIND, write_transaction
+
+    # Every process start gets here: check on the reader (a plain BEGIN), so only
+    # a database that really needs the table takes the write lock
+    with db.engines.get(READ_BIND, db.engine).connect() as connection:
+        if not _missing(connection):
+            return
+
+    def work():
+        connection = db.session.connection()
+        if not _missing(connection):
+            return None  # another process got here first
+        created = not inspect(connection).has_table('disease_compound')
+        disease_compound.create(connection, checkfirst=True)
+        for index in chain(compound_therapeutic_area.indexes, Study.__table__.indexes):
+            index.create(connection, checkfirst=True)
+        return rebuild(connection) if created else None
+
+    rows = write_transaction(work)
+    if rows is not None:
+        logger.info(f"Created the disease closure table ({rows} rows)")
@@ -0,0 +1,348 @@
+"""
+Bitmap index for compound facet counts.
+
+Every compound gets a row position; every facet value gets a NumPy boolean
+array over those rows. Facets:
+
+- ``group``: biochemical_group_id
+- ``phase``: clinical_phase
+- ``area``: therapeutic area (a compound can be in several)
+- ``disease``: a disease covers the compounds of its therapeutic area, so
+  it shares that area's bitmap instead of storing its own
+
+Counting is disjunctive, as usual for filter UIs: each facet's counts apply
+the active filters of all *other* facets, so choosing one group still shows
+how many compounds every other group has. A count is an ``AND`` into a
+scratch buffer plus ``count_nonzero``, tens of microseconds per value at a
+million rows, with no query.
+
+The index follows writes like utils/prefix_index.py. When the data version
+moves, a background refresh reads the compounds inserted or updated since
+the last snapshot, plus their area links, and applies them copy-on-write:
+only the bitmaps that change are copied before the new snapshot is swapped
+in. Deletions are detected by comparing the row count and the sum of the
+compound ids (ids only grow, so a deletion and an insert in the same window
+still change the sum), link-only changes by the link count and a checksum
+of the links (``link_checksum``, which also moves when links are swapped).
+Either triggers a full rebuild, as does FACET_REBUILD_SECONDS elapsing.
+
+Memory is one byte per compound per facet value, e.g. about 40 MB for a
+million compounds across 40 values.
+"""
+
+import logging
+import os
+import threading
+import time
+from itertools import chain
+
+import numpy as np
+
+from utils import data_version
+
+logger = logging.getLogger(__name__)
+
+FACETS = ('group', 'phase', 'area', 'disease')
+INCREMENTAL_LIMIT = 5000
+REBUILD_SECONDS = float(os.environ.get('FACET_REBUILD_SECONDS', 600))
+MEMO_SIZE = 256
+# link_term: a multiplicative hash of (compound, area) modulo the largest prime below 2**32
+LINK_MULTIPLIERS = (2654435761, 40503)
+LINK_MODULUS = 4294967291
+
+_indexes = {}  # pid -> FacetIndex
+_indexes_lock = threading.Lock()
+
+
+def _capacity_for(rows: int) -> int:
+    # Headroom so inserts usually fit without rebuilding every bitmap
+    return rows + rows // 8 + 1024
+
+
+class FacetSnapshot:
+    """Immutable bitmaps for one data version"""
+
+    def __init__(self, ids, capacity, bitmaps, disease_areas, counts, version, max_id, watermark):
+        self.ids = ids                      # sorted compound ids; position = row
+        self.capacity = capacity            # length of every bitmap (room for inserts)
+        self.bitmaps = bitmaps              # facet -> {value: bool array of capacity rows}
+        self.disease_areas = disease_areas  # disease id -> therapeutic area id (or None)
+        self.counts = counts                # (compounds, id sum, area links, link checksum) at build time
+        self.version = version
+        self.max_id = max_id
+        self.watermark = watermark
+        self.built = time.monotonic()
+        self._memo = {}
+
+    def bitmap(self, facet: str, value):
+        if facet == 'disease':
+            area = self.disease_areas.get(value)
+            return self.bitmaps['area'].get(area) if area is not None else None
+        return self.bitmaps[facet].get(value)
+
+    def values(self, facet: str):
+        return self.disease_areas.keys() if facet == 'disease' else self.bitmaps[facet].keys()
+
+    def _mask(self, filters: dict, skip: str = None):
+        """Rows matching every filtered facet except ``skip`` (values within a facet are OR-ed)"""
+        mask = None
+        for facet, values in filters.items():
+            if facet == skip or not values:
+                continue
+            selected = None
+            for value in values:
+                bitmap = self.bitmap(facet, value)
+                if bitmap is None:
+                    continue
+                selected = bitmap.copy() if selected is None else np.logical_or(selected, bitmap, out=selected)
+            if selected is None:
+                selected = np.zeros(self.capacity, dtype=bool)
+            mask = selected if mask is None else np.logical_and(mask, selected, out=mask)
+        return mask
+
+    def facet_counts(self, filters: dict) -> dict:
+        """{'total': matching compounds, 'facets': {facet: {value: count}}} for the given filters"""
+        filters = {facet: tuple(sorted(set(values), key=str)) for facet, values in filters.items()
+                   if facet in FACETS and values}
+        key = tuple(sorted(filters.items()))
+        result = self._memo.get(key)
+        if result is not None:
+            return result
+
+        scratch = np.empty(self.capacity, dtype=bool)
+        facets = {}
+        for facet in FACETS:
+            mask = self._mask(filters, skip=facet)
+            counts, by_bitmap = {}, {}  # diseases of one area share a bitmap; count it once
+            for value in self.values(facet):
+                bitmap = self.bitmap(facet, value)
+                if bitmap is None:
+                    counts[value] = 0
+                    continue
+                count = by_bitmap.get(id(bitmap))
+                if count is None:
+                    if mask is None:
+                        count = int(np.count_nonzero(bitmap))
+                    else:
+                        count = int(np.count_nonzero(np.logical_and(bitmap, mask, out=scratch)))
+                    by_bitmap[id(bitmap)] = count
+                counts[value] = count
+            facets[facet] = counts
+        mask = self._mask(filters)
+        total = len(self.ids) if mask is None else int(np.count_nonzero(mask))
+        result = {'total': total, 'facets': facets}
+
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[key] = result
+        return result
+
+    def matching_ids(self, filters: dict):
+        """Compound ids matching all filters, ascending"""
+        mask = self._mask({facet: values for facet, values in filters.items() if facet in FACETS})
+        if mask is None:
+            return self.ids
+        return self.ids[np.flatnonzero(mask[:len(self.ids)])]
+
+
+def link_term(compound_ids, area_ids):
+    """Each link's share of ``link_checksum``; works on ints and on NumPy int64 arrays"""
+    return (compound_ids * LINK_MULTIPLIERS[0] + area_ids * LINK_MULTIPLIERS[1]) % LINK_MODULUS
+
+
+def link_checksum(db, links) -> int:
+    """Sum of ``link_term`` over every compound-area link. Unlike the link count it
+    changes when a compound swaps one area for another."""
+    term = link_term(links.c.compound_id, links.c.therapeutic_area_id)
+    return int(db.session.query(db.func.coalesce(db.func.sum(term), 0)).scalar())
+
+
+def _load(after_id=None, since=None):
+    """Compound rows, area links and disease areas, optionally only those changed since a watermark"""
+    from extensions import db
+    from models.models import Compound, Disease, compound_therapeutic_area as links
+
+    query = db.session.query(Compound.id, Compound.biochemical_group_id, Compound.clinical_phase, Compound.updated_at)
+    link_query = db.session.query(links.c.compound_id, links.c.therapeutic_area_id)
+    if after_id is not None:
+        changed = db.or_(Compound.id > after_id, Compound.updated_at >= since)
+        query = query.filter(changed)
+        link_query = link_query.join(Compound, Compound.id == links.c.compound_id).filter(changed)
+    rows = query.order_by(Compound.id).all()
+    area_links = link_query.all()
+    disease_areas = dict(db.session.query(Disease.id, Disease.therapeutic_area_id).all())
+    counts = (*db.session.query(db.func.count(Compound.id), db.func.coalesce(db.func.sum(Compound.id), 0)).one(),
+              db.session.query(db.func.count()).select_from(links).scalar(),
+              link_checksum(db, links))
+    return rows, area_links, disease_areas, counts
+
+
+def build(version: str) -> FacetSnapshot:
+    """Index every compound (run inside an app context)"""
+    rows, area_links, disease_areas, counts = _load()
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    capacity = _capacity_for(len(rows))
+    bitmaps = {'group': {}, 'phase': {}, 'area': {}}
+
+    def set_rows(facet, value, positions):
+        bitmap = bitmaps[facet].get(value)
+        if bitmap is None:
+            bitmap = bitmaps[facet][value] = np.zeros(capacity, dtype=bool)
+        bitmap[positions] = True
+
+    for facet, column in (('group', 1), ('phase', 2)):
+        by_value = {}
+        for position, row in enumerate(rows):
+            if row[column] is not None:
+                by_value.setdefault(row[column], []).append(position)
+        for value, positions in by_value.items():
+            set_rows(facet, value, positions)
+
+    if area_links:
+        # fromiter: np.array() over Row objects is ~10x slower
+        link_array = np.fromiter(chain.from_iterable(area_links), dtype=np.int64).reshape(-1, 2)
+        positions = np.searchsorted(ids, link_array[:, 0])
+        for area in np.unique(link_array[:, 1]):
+            set_rows('area', int(area), positions[link_array[:, 1] == area])
+
+    max_id = int(ids[-1]) if len(ids) else 0
+    watermark = max((row[3] for row in rows if row[3] is not None), default=None)
+    return FacetSnapshot(ids, capacity, bitmaps, disease_areas, counts, version, max_id, watermark)
+
+
+def apply_changes(snapshot: FacetSnapshot, version: str):
+    """A new snapshot with rows changed since ``snapshot`` applied, or None if a rebuild is needed"""
+    rows, area_links, disease_areas, counts = _load(snapshot.max_id, snapshot.watermark)
+    new_rows = [row for row in rows if row[0] > snapshot.max_id]
+    if len(rows) > INCREMENTAL_LIMIT:
+        return None
+    if counts[:2] != (len(snapshot.ids) + len(new_rows), snapshot.counts[1] + sum(row[0] for row in new_rows)):
+        return None  # something was deleted
+    if len(snapshot.ids) + len(new_rows) > snapshot.capacity:
+        return None
+
+    ids = np.concatenate([snapshot.ids, np.fromiter((row[0] for row in new_rows), dtype=np.int64)])
+    bitmaps = {facet: dict(values) for facet, values in snapshot.bitmaps.items()}
+    copied = set()
+
+    def writable(facet, value):
+        bitmap = bitmaps[facet].get(value)
+        if bitmap is None:
+            bitmap = bitmaps[facet][value] = np.zeros(snapshot.capacity, dtype=bool)
+            copied.add((facet, value))
+        elif (facet, value) not in copied:
+            bitmap = bitmaps[facet][value] = bitmap.copy()
+            copied.add((facet, value))
+        return bitmap
+
+    areas_by_compound = {}
+    for compound_id, area in area_links:
+        areas_by_compound.setdefault(compound_id, set()).add(area)
+
+    link_delta = checksum_delta = 0
+    for compound_id, group, phase, _ in rows:
+        position = int(np.searchsorted(ids, compound_id))
+        for facet, new_values in (('group', {group} - {None}), ('phase', {phase} - {None}),
+                                  ('area', areas_by_compound.get(compound_id, set()))):
+            current = {value for value, bitmap in bitmaps[facet].items() if bitmap[position]}
+            if facet == 'area':
+                link_delta += len(new_values) - len(current)
+                checksum_delta += sum(link_term(compound_id, area) for area in new_values - current)
+                checksum_delta -= sum(link_term(compound_id, area) for area in current - new_values)
+            for value in current - new_values:
+                writable(facet, value)[position] = False
+            for value in new_values - current:
+                writable(facet, value)[position] = True
+
+    # Links that changed without touching a compound row show up as a count or checksum mismatch
+    if counts[2:] != (snapshot.counts[2] + link_delta, snapshot.counts[3] + checksum_delta):
+        return None
+
+    stamps = [row[3] for row in rows if row[3] is not None]
+    watermark = max(stamps + [snapshot.watermark]) if stamps and snapshot.watermark else snapshot.watermark
+    max_id = int(ids[-1]) if len(ids) else 0
+    return FacetSnapshot(ids, snapshot.capacity, bitmaps, disease_areas, counts, version, max_id, watermark)
+
+
+class FacetIndex:
+    """The worker's current facet snapshot, refreshed in the background when the data changes"""
+
+    def __init__(self, app):
+        self.app = app
+        self.snapshot = None
+        self._refreshing = threading.Lock()
+
+    def current(self) -> FacetSnapshot:
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self._refreshing:
+                if self.snapshot is None:
+                    self._refresh()
+            return self.snapshot
+        stale = snapshot.version != data_version.current() or time.monotonic() - snapshot.built > REBUILD_SECONDS
+        if stale and not self._refreshing.locked():
+            threading.Thread(target=self._refresh_in_background, name='facet-index', daemon=True).start()
+        return snapshot
+
+    def facet_counts(self, filters: dict) -> dict:
+        return self.current().facet_counts(filters)
+
+    def _refresh_in_background(self):
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            self._refresh()
+        except Exception as e:
+            logger.error(f"Facet index refresh failed: {e}")
+        finally:
+            self._refreshing.release()
+
+    def _refresh(self):
+        from utils.db_routing import reading
+
+        version = data_version.current()
+        start = time.perf_counter()
+        with self.app.app_context(), reading():
+            snapshot = self.snapshot
+            updated = None
+            if (snapshot is not None and snapshot.watermark is not None
+                    and time.monotonic() - snapshot.built <= REBUILD_SECONDS):
+                updated = apply_changes(snapshot, version)
+                if updated is not None:
+                    updated.built = snapshot.built
+            if updated is None:
+                updated = build(version)
+                logger.info(f"Built facet index: {len(updated.ids)} compounds in "
+                            f"{time.perf_counter() - start:.2f}s")
+        self.snapshot = updated
+
+
+def parse_filters(args) -> dict:
+    """Facet filters from request arguments, e.g. ?group=1&group=2&phase=Approved"""
+    filters = {}
+    for facet in FACETS:
+        values = [value for value in args.getlist(facet) if value != '']
+        if facet != 'phase':
+            values = [int(value) for value in values if value.lstrip('-').isdigit()]
+        if values:
+            filters[facet] = values
+    return filters
+
+
+def served_version() -> str:
+    """Data version of the facet index this worker serves now (for ``conditional(version=...)``)"""
+    from flask import current_app
+    return get_index(current_app._get_current_object()).current().version
+
+
+def get_index(app) -> FacetIndex:
+    """This worker's facet index (built on first use)"""
+    pid = os.getpid()
+    index = _indexes.get(pid)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(pid)
+            if index is None:
+                _indexes.clear()  # a forked child builds its own
+                index = _indexes[pid] = FacetIndex(app)
+    return index
@@ -0,0 +1,222 @@
+"""
+Health checks refreshed in the background.
+
+A ``HealthMonitor`` thread per process runs every component check each
+HEALTH_INTERVAL seconds and stores the outcome together with the encoded
+response bodies. Probes only read those cached bytes, so any number of load
+balancers polling ``/api/health/live`` and ``/api/health/ready`` add no
+database work and answer in microseconds.
+
+The full report names pids, paths and pool sizes, so it is only served to
+admins (``/api/health/report``). The public ``/api/health`` keeps its
+original body, ``status``, ``database`` and ``timestamp`` (plus ``error``
+naming the failed checks when unhealthy), filled from the last refresh.
+
+Each check reports ``ok``, ``degraded`` or ``fail``. The process is *ready*
+when no critical check (the databases and disk space) fails and the last
+refresh is recent; it is *live* as long as it can answer at all.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from paths import DATABASE_PATH, LOGS_DIR, UPLOADS_DIR
+
+logger = logging.getLogger(__name__)
+
+HEALTH_INTERVAL = float(os.environ.get('HEALTH_INTERVAL', 5.0))
+MIN_FREE_BYTES = int(float(os.environ.get('HEALTH_MIN_FREE_MB', 100)) * 1024 * 1024)
+MAX_RUNNING_JOBS = int(os.environ.get('HEALTH_MAX_RUNNING_JOBS', 10))
+
+OK = 'ok'
+DEGRADED = 'degraded'
+FAIL = 'fail'
+_SEVERITY = {OK: 0, DEGRADED: 1, FAIL: 2}
+
+_monitors = {}  # pid -> HealthMonitor
+_monitors_lock = threading.Lock()
+
+
+def check_settings_db(app) -> tuple:
+    """database.db (settings and activity) exists and its settings table can be read"""
+    # Read-only, so a missing database fails the check instead of being created empty
+    conn = sqlite3.connect(f'{DATABASE_PATH.as_uri()}?mode=ro', uri=True, timeout=1.0)
+    try:
+        conn.execute('SELECT 1 FROM app_settings LIMIT 1').fetchone()
+    finally:
+        conn.close()
+    return OK, {'path': str(DATABASE_PATH)}
+
+
+def check_compounds_db(app) -> tuple:
+    """compounds.db answers through the read pool; connection pool usage is reported"""
+    from sqlalchemy import text
+    from extensions import db
+    from utils.db_routing import reading
+
+    with app.app_context(), reading():
+        db.session.execute(text('SELECT 1')).scalar()
+        details = {}
+        for name, engine in db.engines.items():
+            pool = engine.pool
+            if hasattr(pool, 'checkedout'):
+                details[name or 'default'] = {'checked_out': pool.checkedout(), 'size': pool.size()}
+    return OK, {'pools': details}
+
+
+def check_disk(app) -> tuple:
+    """Free space where uploads and logs are written"""
+    status, details = OK, {}
+    for label, directory in (('uploads', UPLOADS_DIR), ('logs', LOGS_DIR)):
+        usage = shutil.disk_usage(directory if directory.exists() else directory.parent)
+        details[label] = {'free_bytes': usage.free, 'free_percent': round(100 * usage.free / usage.total, 1)}
+        if usage.free < MIN_FREE_BYTES:
+            status = FAIL
+        elif usage.free < 2 * MIN_FREE_BYTES or usage.free / usage.total < 0.05:
+            status = max(status, DEGRADED, key=_SEVERITY.get)
+    return status, details
+
+
+def check_workers(app) -> tuple:
+    """Registered compute workers by status"""
+    from routes.main import workers_data
+
+    counts = {}
+    for worker in list(workers_data):
+        counts[worker.get('status', 'unknown')] = counts.get(worker.get('status', 'unknown'), 0) + 1
+    return OK, {'registered': sum(counts.values()), 'by_status': counts}
+
+
+def check_jobs(app) -> tuple:
+    """Depth of the job queue (jobs still running, across processes)"""
+    from utils import jobs
+
+    running = sum(1 for job in jobs.list_jobs() if job.get('status') == jobs.RUNNING)
+    return (DEGRADED if running > MAX_RUNNING_JOBS else OK), {'running': running, 'limit': MAX_RUNNING_JOBS}
+
+
+# name -> (check, critical for readiness)
+CHECKS = {
+    'settings_db': (check_settings_db, True),
+    'compounds_db': (check_compounds_db, True),
+    'disk': (check_disk, True),
+    'workers': (check_workers, False),
+    'jobs': (check_jobs, False),
+}
+
+
+class HealthMonitor:
+    """Runs the checks on an interval and keeps the encoded results"""
+
+    def __init__(self, app, interval: float = HEALTH_INTERVAL, checks=None):
+        self.app = app
+        self.interval = interval
+        self.checks = checks or CHECKS
+        self.started = time.time()
+        self.report = None
+        self.refreshed = 0.0  # monotonic time of the last refresh
+        self._bodies = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self.refresh()  # the first probe must not see an empty result
+                self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Health refresh failed: {e}")
+
+    def refresh(self):
+        """Run every check once and publish the results"""
+        results = {}
+        for name, (check, critical) in self.checks.items():
+            start = time.perf_counter()
+            try:
+                status, details = check(self.app)
+            except Exception as e:
+                status, details = FAIL, {'error': str(e)}
+            previous = self.report['checks'][name]['status'] if self.report and name in self.report['checks'] else OK
+            if status != previous:
+                logger.warning(f"Health check {name} changed from {previous} to {status}: {details}")
+            results[name] = {
+                'status': status,
+                'critical': critical,
+                'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+                'details': details,
+            }
+
+        overall = max((result['status'] for result in results.values()), key=_SEVERITY.get, default=OK)
+        ready = not any(result['critical'] and result['status'] == FAIL for result in results.values())
+        report = {
+            'status': overall,
+            'ready': ready,
+            'checked_at': time.time(),
+            'pid': os.getpid(),
+            'checks': results,
+        }
+        summary = {
+            'ready': ready,
+            'status': overall,
+            'checks': {name: result['status'] for name, result in results.items()},
+        }
+        bodies = {'report': json.dumps(report).encode('utf-8'), 'ready': json.dumps(summary).encode('utf-8'),
+                  'public': _public_body(results, ready, report['checked_at'])}
+        self.report, self._bodies, self.refreshed = report, bodies, time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.refreshed
+
+    def is_ready(self) -> bool:
+        # A stalled monitor must not keep advertising an old "ready"
+        return self.report is not None and self.report['ready'] and self.age() < 3 * self.interval
+
+    def body(self, kind: str = 'report') -> bytes:
+        """Pre-encoded JSON: the full ``report``, the ``ready`` summary or the ``public`` health body"""
+        if self.report is not None and not self.is_ready() and self.report['ready']:
+            if kind == 'ready':
+                return json.dumps({'ready': False, 'status': 'stale', 'age': round(self.age(), 1)}).encode('utf-8')
+            if kind == 'public':
+                return _public_body(self.report['checks'], False, self.report['checked_at'], stale=True)
+        return self._bodies.get(kind, b'{}')
+
+
+def _public_body(results: dict, ready: bool, checked_at: float, stale: bool = False) -> bytes:
+    """The public /api/health body: no paths, pids or exception text"""
+    connected = all(results[name]['status'] != FAIL for name in ('settings_db', 'compounds_db') if name in results)
+    body = {
+        'status': 'healthy' if ready else 'unhealthy',
+        'database': 'connected' if connected else 'disconnected',
+        'timestamp': datetime.fromtimestamp(checked_at).isoformat(),
+    }
+    if not ready:
+        failed = [name for name, result in results.items() if result['critical'] and result['status'] == FAIL]
+        body['error'] = 'health checks are stale' if stale else f"failed checks: {', '.join(failed)}"
+    return json.dumps(body).encode('utf-8')
+
+
+def get_monitor(app) -> HealthMonitor:
+    """This process's health monitor, started on first use"""
+    pid = os.getpid()
+    monitor = _monitors.get(pid)
+    if monitor is None:
+        with _monitors_lock:
+            monitor = _monitors.get(pid)
+            if monitor is None:
+                _monitors.clear()  # a forked child must not reuse the parent's
+                monitor = _monitors[pid] = HealthMonitor(app).start()
+    return monitor
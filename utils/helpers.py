@@ -3,7 +3,9 @@ General helper functions
 """
 
 import re
+import hmac
 import logging
+from functools import wraps
 from datetime import datetime
 from pathlib import Path
 from utils.database import log_activity # Correct import path
@@ -83,3 +85,23 @@ def validate_api_key(api_key: str) -> bool:
     # For demonstration, a hardcoded key. Replace with proper lookup.
     VALID_API_KEY = "your_super_secret_api_key_123"
     return api_key == VALID_API_KEY
+
+def admin_required(view):
+    """
+    Restrict a view to callers presenting the ADMIN_TOKEN in the X-Admin-Token header
+    (or as an ``Authorization: Bearer`` token, which scrapers such as Prometheus send).
+    When no ADMIN_TOKEN is configured the view is disabled entirely.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from flask import current_app, request, jsonify
+
+        expected = current_app.config.get('ADMIN_TOKEN')
+        provided = request.headers.get('X-Admin-Token', '')
+        if not provided and request.authorization is not None and request.authorization.type == 'bearer':
+            provided = request.authorization.token or ''
+        if not expected or not hmac.compare_digest(provided.encode('utf-8'), expected.encode('utf-8')):
+            logger.warning(f"Rejected admin request to {request.path} from {request.remote_addr}")
+            return jsonify({"success": False, "error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
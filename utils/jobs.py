@@ -0,0 +1,136 @@
+"""
+Progress of long-running jobs (imports, batch computations), visible to every process.
+
+Each job keeps its state in a small JSON file under JOBS_DIR. The file is
+replaced atomically, at most every ``min_interval`` seconds while the job
+runs, so a CLI import in one process shows up on a dashboard served by
+another at the cost of a few writes per second. The directory's mtime
+changes whenever any job does, which makes polling for changes one ``stat``.
+Jobs are listed until JOB_RETENTION seconds after their last update.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from paths import JOBS_DIR
+
+logger = logging.getLogger(__name__)
+
+JOB_RETENTION = float(os.environ.get('JOB_RETENTION', 3600))
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """A unit of background work reporting progress; use as a context manager"""
+
+    def __init__(self, name: str, total: int = None, min_interval: float = 0.5):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.total = total
+        self.done = 0
+        self.status = RUNNING
+        self.message = None
+        self.started = time.time()
+        self.updated = self.started
+        self.min_interval = min_interval
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self._write(force=True)
+
+    def advance(self, count: int = 1, message: str = None):
+        """Record ``count`` more units of work done"""
+        with self._lock:
+            self.done += count
+            if message is not None:
+                self.message = message
+        self._write()
+
+    def finish(self, status: str = DONE, message: str = None):
+        with self._lock:
+            self.status = status
+            if message is not None:
+                self.message = message
+        self._write(force=True)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'message': self.message,
+            'started': self.started,
+            'updated': self.updated,
+            'pid': self.pid,
+        }
+
+    def _write(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_write < self.min_interval:
+            return
+        with self._lock:
+            self._last_write = now
+            self.updated = time.time()
+            payload = json.dumps(self.to_dict())
+        path = JOBS_DIR / f'{self.id}.json'
+        tmp_path = JOBS_DIR / f'.{self.id}.{threading.get_ident()}.tmp'
+        try:
+            JOBS_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not record progress of job {self.name}: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish(DONE)
+        else:
+            self.finish(FAILED, message=str(exc) or exc_type.__name__)
+        return False
+
+
+def start(name: str, total: int = None) -> Job:
+    """Register a new running job"""
+    return Job(name, total)
+
+
+def signature():
+    """Cheap change marker for the set of jobs (None if there are none)"""
+    try:
+        stat = os.stat(JOBS_DIR)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_nlink
+
+
+def list_jobs() -> list:
+    """Jobs of every process, newest first; expired jobs are pruned"""
+    jobs = []
+    now = time.time()
+    try:
+        paths = list(JOBS_DIR.glob('*.json'))
+    except OSError:
+        return jobs
+    for path in paths:
+        try:
+            job = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        # Also drops jobs whose process died without finishing them
+        if now - job.get('updated', 0) > JOB_RETENTION:
+            path.unlink(missing_ok=True)
+            continue
+        jobs.append(job)
+    jobs.sort(key=lambda job: job.get('started', 0), reverse=True)
+    return jobs
@@ -0,0 +1,259 @@
+"""
+Sequence compute kernels with interchangeable backends.
+
+Kernels:
+
+- ``gc_content(seq)``: (G + C) / (A + C + G + T), 0.0 without any such base
+- ``kmer_counts(seq, k)``: int64 array of 4**k counts, indexed by the k-mer
+  in base 4 (A=0, C=1, G=2, T=3, first base most significant); k-mers with
+  any other symbol are skipped
+- ``window_stats(seq, window, step)``: (windows, 2) float array of GC
+  fraction and GC skew per window, NaN where undefined
+
+Each kernel has a pure-Python reference, a NumPy backend and, once built
+with f2py, a Fortran backend (see fortran_backend.py). A short
+micro-benchmark picks between them: every available backend is run on a
+sample sequence, results that differ from the reference disqualify it, and
+the fastest remaining one is used from then on. The reference itself only
+checks results and is not timed. Until the selection is made, calls use
+NumPy.
+
+The outcome is stored per host (machine, Python, NumPy and usable
+backends) in KERNEL_SELECTION_PATH, so the benchmark runs once per host
+rather than in every process; ``python app.py check-kernels`` measures it
+again. Serving processes (gunicorn workers, the development server) select
+in the background at boot; any other process on first use.
+
+KERNEL_BACKEND=python|numpy|fortran forces a backend where it is available;
+KERNEL_BENCHMARK=0 skips the benchmark. ``utils.kernels.conformance``
+checks all backends against the reference on many inputs.
+"""
+
+import json
+import logging
+import math
+import os
+import platform
+import threading
+import time
+
+import numpy as np
+
+from paths import KERNEL_SELECTION_PATH
+from utils.kernels import fortran_backend, numpy_backend, python_backend
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = {
+    'python': python_backend,
+    'numpy': numpy_backend,
+    'fortran': fortran_backend,
+}
+DEFAULT_BACKEND = 'numpy'
+FORCED_BACKEND = os.environ.get('KERNEL_BACKEND')
+BENCHMARK = os.environ.get('KERNEL_BENCHMARK', '1') != '0'
+SAMPLE_SIZE = 50_000
+MAX_K = 12
+
+_selections = {}  # pid -> Selection
+_selections_lock = threading.Lock()
+
+
+def _same_value(result, expected) -> bool:
+    return math.isclose(result, expected, rel_tol=1e-12, abs_tol=0.0)
+
+
+def _same_array(result, expected) -> bool:
+    result, expected = np.asarray(result), np.asarray(expected)
+    return result.shape == expected.shape and np.allclose(result, expected, rtol=1e-12, atol=0.0, equal_nan=True)
+
+
+def _same_rows(result, expected) -> bool:
+    # An empty list of rows has no second dimension
+    return _same_array(np.reshape(result, (-1, 2)), np.reshape(expected, (-1, 2)))
+
+
+class Kernel:
+    """A kernel's contract: how to benchmark it and how to compare results"""
+
+    def __init__(self, name: str, sample_args, same):
+        self.name = name
+        self.sample_args = sample_args  # sequence -> benchmark arguments
+        self.same = same                # (result, reference result) -> bool
+
+    def implementation(self, backend: str):
+        return getattr(BACKENDS[backend], self.name)
+
+
+KERNELS = {
+    'gc_content': Kernel('gc_content', lambda seq: (seq,), _same_value),
+    'kmer_counts': Kernel('kmer_counts', lambda seq: (seq, 6), _same_array),
+    'window_stats': Kernel('window_stats', lambda seq: (seq, 1000, 250), _same_rows),
+}
+
+
+def available_backends() -> dict:
+    """Backend name -> None if usable, else the reason it is not"""
+    return {name: getattr(module, 'UNAVAILABLE', None) for name, module in BACKENDS.items()}
+
+
+def host_key() -> str:
+    """What a stored selection is valid for: this machine, interpreter, NumPy and the usable backends"""
+    usable = ','.join(name for name, reason in available_backends().items() if reason is None)
+    return f'{platform.node()}/{platform.machine()}/python {platform.python_version()}/numpy {np.__version__}/{usable}'
+
+
+def sample_sequence(length: int, seed: int = 0, other_fraction: float = 0.01) -> bytes:
+    """Random upper-case sequence with a sprinkling of N"""
+    rng = np.random.default_rng(seed)
+    weights = [(1 - other_fraction) / 4] * 4 + [other_fraction]
+    return rng.choice(np.frombuffer(b'ACGTN', dtype=np.uint8), size=length, p=weights).tobytes()
+
+
+class Selection:
+    """The backend chosen for each kernel in this process, with the benchmark behind it"""
+
+    def __init__(self):
+        self.choice = {name: DEFAULT_BACKEND for name in KERNELS}
+        self.timings = {}  # kernel -> {backend: seconds}
+        self.rejected = {}  # kernel -> {backend: reason}
+        self.ready = threading.Event()
+
+    def _choose(self, name: str):
+        # The reference is never timed, but may still be forced
+        timings = self.timings.get(name, {})
+        if FORCED_BACKEND == 'python' or FORCED_BACKEND in timings:
+            self.choice[name] = FORCED_BACKEND
+        elif timings:
+            self.choice[name] = min(timings, key=timings.get)
+
+    def _log(self, source: str):
+        logger.info(f"Kernel backends ({source}): " + ', '.join(
+            f"{name}={backend} ({self.timings[name].get(backend, 0) * 1000:.2f}ms)"
+            for name, backend in self.choice.items()))
+
+    def benchmark(self, sample_size: int = SAMPLE_SIZE, repeat: int = 3):
+        seq = sample_sequence(sample_size)
+        usable = [name for name, reason in available_backends().items() if reason is None and name != 'python']
+        for name, kernel in KERNELS.items():
+            args = kernel.sample_args(seq)
+            reference = kernel.implementation('python')(*args)
+            timings, rejected = {}, {}
+            for backend in usable:
+                function = kernel.implementation(backend)
+                try:
+                    if not kernel.same(function(*args), reference):
+                        rejected[backend] = 'result differs from the reference'
+                        continue
+                    best = float('inf')
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        function(*args)
+                        best = min(best, time.perf_counter() - start)
+                    timings[backend] = best
+                except Exception as e:
+                    rejected[backend] = f'{type(e).__name__}: {e}'
+            self.timings[name], self.rejected[name] = timings, rejected
+            self._choose(name)
+            for backend, reason in rejected.items():
+                logger.warning(f"Kernel {name}: {backend} backend rejected ({reason})")
+        self._log('measured')
+        self.ready.set()
+        return self
+
+    def load(self, path=KERNEL_SELECTION_PATH) -> bool:
+        """Take this host's stored measurements; False if there are none"""
+        try:
+            entry = json.loads(path.read_text()).get(host_key())
+        except (OSError, ValueError):
+            return False
+        if not entry or set(entry.get('timings', {})) != set(KERNELS):
+            return False
+        self.timings, self.rejected = entry['timings'], entry.get('rejected', {})
+        for name in KERNELS:
+            self._choose(name)
+        self._log('stored for this host')
+        self.ready.set()
+        return True
+
+    def save(self, path=KERNEL_SELECTION_PATH):
+        """Store the measurements for this host, next to those of other hosts sharing the data directory"""
+        try:
+            stored = json.loads(path.read_text())
+        except (OSError, ValueError):
+            stored = {}
+        stored[host_key()] = {'timings': self.timings, 'rejected': self.rejected, 'measured_at': time.time()}
+        try:
+            tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+            tmp_path.write_text(json.dumps(stored, indent=2, sort_keys=True))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not store the kernel selection: {e}")
+        return self
+
+    def _select_in_background(self):
+        try:
+            if not self.load():
+                self.benchmark().save()
+        except Exception as e:
+            logger.error(f"Kernel benchmark failed, using {DEFAULT_BACKEND}: {e}")
+            self.ready.set()
+
+    def status(self) -> dict:
+        return {name: {'backend': backend,
+                       'timings': self.timings.get(name, {}),
+                       'rejected': self.rejected.get(name, {})}
+                for name, backend in self.choice.items()}
+
+
+def selection() -> Selection:
+    """This process's backend selection (the benchmark starts on first use)"""
+    pid = os.getpid()
+    current = _selections.get(pid)
+    if current is None:
+        with _selections_lock:
+            current = _selections.get(pid)
+            if current is None:
+                _selections.clear()  # a forked child benchmarks for itself
+                current = _selections[pid] = Selection()
+                if BENCHMARK:
+                    threading.Thread(target=current._select_in_background, name='kernel-benchmark',
+                                     daemon=True).start()
+                else:
+                    if FORCED_BACKEND in BACKENDS and available_backends().get(FORCED_BACKEND) is None:
+                        current.choice = {name: FORCED_BACKEND for name in KERNELS}
+                    current.ready.set()
+    return current
+
+
+def _sequence(seq) -> bytes:
+    if isinstance(seq, str):
+        return seq.upper().encode('ascii', 'replace')
+    return bytes(seq).upper()
+
+
+def run(name: str, *args):
+    """Call a kernel with the selected backend"""
+    return KERNELS[name].implementation(selection().choice[name])(*args)
+
+
+def gc_content(seq) -> float:
+    return run('gc_content', _sequence(seq))
+
+
+def kmer_counts(seq, k: int) -> np.ndarray:
+    if not 1 <= k <= MAX_K:
+        raise ValueError(f'k must be between 1 and {MAX_K}')
+    return np.asarray(run('kmer_counts', _sequence(seq), k), dtype=np.int64)
+
+
+def window_stats(seq, window: int, step: int = None) -> np.ndarray:
+    step = step or window
+    if window < 1 or step < 1:
+        raise ValueError('window and step must be positive')
+    return np.asarray(run('window_stats', _sequence(seq), window, step), dtype=np.float64).reshape(-1, 2)
+
+
+def kmer_label(index: int, k: int) -> str:
+    """The k-mer at a position of ``kmer_counts``"""
+    return ''.join('ACGT'[(index >> (2 * (k - 1 - position))) & 3] for position in range(k))
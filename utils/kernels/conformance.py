@@ -0,0 +1,60 @@
+"""
+Conformance harness: every available backend against the pure-Python reference.
+
+``check()`` runs each kernel on edge cases (empty input, no A/C/G/T at all,
+symbols other than N, k longer than the sequence, steps wider than the
+window) and on random sequences of several lengths and N densities, and
+returns the cases where a backend disagreed with the reference or raised.
+Run it with ``python app.py check-kernels``.
+"""
+
+from utils.kernels import KERNELS, available_backends, sample_sequence
+
+EDGE_SEQUENCES = [
+    b'',
+    b'A',
+    b'GC',
+    b'NNNNNNNNNN',
+    b'ACGTACGTAC',
+    b'GGGGGGCCCA',
+    b'ACGRYTT-ACG*NNACGT',
+    b'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA',
+]
+RANDOM_SEQUENCES = [sample_sequence(length, seed=length, other_fraction=fraction)
+                    for length, fraction in ((97, 0.0), (1000, 0.05), (4099, 0.3), (20000, 0.01))]
+KMER_SIZES = (1, 2, 3, 5, 8)
+WINDOWS = ((1, 1), (3, 1), (10, 3), (7, 11), (100, 100), (1000, 250))
+
+
+def cases():
+    """(kernel name, arguments) pairs covering every kernel"""
+    for seq in EDGE_SEQUENCES + RANDOM_SEQUENCES:
+        yield 'gc_content', (seq,)
+        for k in KMER_SIZES:
+            yield 'kmer_counts', (seq, k)
+        for window, step in WINDOWS:
+            yield 'window_stats', (seq, window, step)
+
+
+def check(backends=None) -> dict:
+    """
+    Compare backends (all available ones by default) with the reference.
+    Returns {'backends': [...], 'cases': count, 'failures': [...]}.
+    """
+    usable = [name for name, reason in available_backends().items() if reason is None and name != 'python']
+    backends = [name for name in backends or usable if name in usable]
+    failures, count = [], 0
+    for name, args in cases():
+        kernel = KERNELS[name]
+        reference = kernel.implementation('python')(*args)
+        count += 1
+        for backend in backends:
+            described = f'{name}(len={len(args[0])}{"".join(f", {arg}" for arg in args[1:])})'
+            try:
+                result = kernel.implementation(backend)(*args)
+            except Exception as e:
+                failures.append({'backend': backend, 'case': described, 'error': f'{type(e).__name__}: {e}'})
+                continue
+            if not kernel.same(result, reference):
+                failures.append({'backend': backend, 'case': described, 'error': 'result differs from the reference'})
+    return {'backends': backends, 'cases': count, 'failures': failures}
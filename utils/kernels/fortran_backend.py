@@ -0,0 +1,67 @@
+"""
+Fortran implementations from kernels.f90, compiled with f2py.
+
+The extension is built on request (``python app.py check-kernels --build``,
+or ``build()``) when gfortran is installed, and lands next to this file as
+``_fortran_kernels.*.so``. Without it the backend reports itself unavailable
+and the registry falls back to the others.
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+MODULE = '_fortran_kernels'
+SOURCE = os.path.join(os.path.dirname(__file__), 'kernels.f90')
+
+try:
+    from utils.kernels import _fortran_kernels as _lib
+    UNAVAILABLE = None
+except ImportError:
+    _lib = None
+    UNAVAILABLE = 'not built (run `python app.py check-kernels --build`)'
+
+
+def build(compiler: str = 'gfortran') -> str:
+    """Compile kernels.f90 into the extension module; returns its path"""
+    if shutil.which(compiler) is None:
+        raise RuntimeError(f'{compiler} is not installed')
+    package_dir = os.path.dirname(__file__)
+    with tempfile.TemporaryDirectory() as build_dir:
+        result = subprocess.run(
+            [sys.executable, '-m', 'numpy.f2py', '-c', SOURCE, '-m', MODULE, '--quiet', '--opt=-O3'],
+            cwd=build_dir, capture_output=True, text=True)
+        built = glob.glob(os.path.join(build_dir, f'{MODULE}*'))
+        if result.returncode != 0 or not built:
+            raise RuntimeError(f'f2py failed:\n{result.stderr[-2000:]}')
+        target = os.path.join(package_dir, os.path.basename(built[0]))
+        shutil.move(built[0], target)
+    return target
+
+
+def _bytes(seq: bytes) -> np.ndarray:
+    return np.frombuffer(seq, dtype=np.int8)
+
+
+def gc_content(seq: bytes) -> float:
+    counts = _lib.base_counts(_bytes(seq))
+    acgt = int(counts[:4].sum())
+    return int(counts[1] + counts[2]) / acgt if acgt else 0.0
+
+
+def kmer_counts(seq: bytes, k: int) -> np.ndarray:
+    if not seq:
+        return np.zeros(4 ** k, dtype=np.int64)
+    return _lib.kmer_counts(_bytes(seq), k, 4 ** k)
+
+
+def window_stats(seq: bytes, window: int, step: int) -> np.ndarray:
+    windows = (len(seq) - window) // step + 1 if len(seq) >= window else 0
+    if windows == 0:
+        return np.empty((0, 2))
+    return _lib.window_stats(_bytes(seq), window, step, windows).T
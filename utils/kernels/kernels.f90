@@ -0,0 +1,115 @@
+! Sequence kernels for the f2py backend (see utils/kernels/fortran_backend.py).
+! Sequences arrive as upper-case ASCII bytes; anything but A, C, G, T is "other".
+
+subroutine base_counts(n, seq, counts)
+  implicit none
+  integer, intent(in) :: n
+  integer(kind=1), intent(in) :: seq(n)
+  integer(kind=8), intent(out) :: counts(5)
+  integer :: i
+
+  counts = 0
+  do i = 1, n
+    select case (seq(i))
+    case (65)
+      counts(1) = counts(1) + 1
+    case (67)
+      counts(2) = counts(2) + 1
+    case (71)
+      counts(3) = counts(3) + 1
+    case (84)
+      counts(4) = counts(4) + 1
+    case default
+      counts(5) = counts(5) + 1
+    end select
+  end do
+end subroutine base_counts
+
+subroutine kmer_counts(n, seq, k, m, counts)
+  implicit none
+  integer, intent(in) :: n, k, m
+  integer(kind=1), intent(in) :: seq(n)
+  integer(kind=8), intent(out) :: counts(0:m - 1)
+  integer :: i, code, valid, mask, base
+
+  counts = 0
+  mask = m - 1
+  code = 0
+  valid = 0
+  do i = 1, n
+    select case (seq(i))
+    case (65)
+      base = 0
+    case (67)
+      base = 1
+    case (71)
+      base = 2
+    case (84)
+      base = 3
+    case default
+      base = -1
+    end select
+    if (base < 0) then
+      valid = 0
+      code = 0
+    else
+      code = iand(ishft(code, 2), mask) + base
+      valid = valid + 1
+      if (valid >= k) counts(code) = counts(code) + 1
+    end if
+  end do
+end subroutine kmer_counts
+
+subroutine window_stats(n, seq, window, step, windows, stats)
+  use, intrinsic :: ieee_arithmetic
+  implicit none
+  integer, intent(in) :: n, window, step, windows
+  integer(kind=1), intent(in) :: seq(n)
+  real(kind=8), intent(out) :: stats(2, windows)
+  integer(kind=8), allocatable :: a(:), c(:), g(:), t(:)
+  integer(kind=8) :: na, nc, ng, nt
+  integer :: i, w, first
+  real(kind=8) :: nan
+
+  nan = ieee_value(nan, ieee_quiet_nan)
+  allocate(a(0:n), c(0:n), g(0:n), t(0:n))
+  a(0) = 0
+  c(0) = 0
+  g(0) = 0
+  t(0) = 0
+  do i = 1, n
+    a(i) = a(i - 1)
+    c(i) = c(i - 1)
+    g(i) = g(i - 1)
+    t(i) = t(i - 1)
+    select case (seq(i))
+    case (65)
+      a(i) = a(i) + 1
+    case (67)
+      c(i) = c(i) + 1
+    case (71)
+      g(i) = g(i) + 1
+    case (84)
+      t(i) = t(i) + 1
+    end select
+  end do
+
+  do w = 1, windows
+    first = (w - 1) * step
+    na = a(first + window) - a(first)
+    nc = c(first + window) - c(first)
+    ng = g(first + window) - g(first)
+    nt = t(first + window) - t(first)
+    if (na + nc + ng + nt > 0) then
+      stats(1, w) = real(ng + nc, 8) / real(na + nc + ng + nt, 8)
+    else
+      stats(1, w) = nan
+    end if
+    if (ng + nc > 0) then
+      stats(2, w) = real(ng - nc, 8) / real(ng + nc, 8)
+    else
+      stats(2, w) = nan
+    end if
+  end do
+  deallocate(a, c, g, t)
+end subroutine window_stats
@@ -0,0 +1,46 @@
+"""NumPy implementations: lookup-table encoding, bincount and prefix sums."""
+
+import numpy as np
+
+_CODES = np.full(256, 4, dtype=np.uint8)  # A, C, G, T -> 0..3, anything else -> 4
+for _code, _base in enumerate(b'ACGT'):
+    _CODES[_base] = _code
+
+
+def _encode(seq: bytes) -> np.ndarray:
+    return _CODES[np.frombuffer(seq, dtype=np.uint8)]
+
+
+def gc_content(seq: bytes) -> float:
+    counts = np.bincount(_encode(seq), minlength=5)
+    acgt = int(counts[:4].sum())
+    return int(counts[1] + counts[2]) / acgt if acgt else 0.0
+
+
+def kmer_counts(seq: bytes, k: int) -> np.ndarray:
+    codes = _encode(seq)
+    n = len(codes) - k + 1
+    if n <= 0:
+        return np.zeros(4 ** k, dtype=np.int64)
+    invalid = np.concatenate(([0], np.cumsum(codes == 4)))
+    valid = invalid[k:] == invalid[:n]  # no "other" base inside the k-mer
+    index = np.zeros(n, dtype=np.int64)
+    for offset in range(k):
+        index = (index << 2) | (codes[offset:offset + n] & 3)
+    return np.bincount(index[valid], minlength=4 ** k).astype(np.int64)
+
+
+def window_stats(seq: bytes, window: int, step: int) -> np.ndarray:
+    codes = _encode(seq)
+    if len(codes) < window:
+        return np.empty((0, 2))
+    firsts = np.arange(0, len(codes) - window + 1, step)
+    sums = []
+    for code in range(4):
+        prefix = np.concatenate(([0], np.cumsum(codes == code)))
+        sums.append(prefix[firsts + window] - prefix[firsts])
+    a, c, g, t = sums
+    acgt, gc = a + c + g + t, g + c
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.column_stack((np.where(acgt > 0, gc / acgt, np.nan),
+                                np.where(gc > 0, (g - c) / gc, np.nan)))
@@ -0,0 +1,36 @@
+"""Pure-Python reference implementations; every other backend must agree with these."""
+
+_BASE_CODES = {ord('A'): 0, ord('C'): 1, ord('G'): 2, ord('T'): 3}
+
+
+def gc_content(seq: bytes) -> float:
+    gc = seq.count(b'G') + seq.count(b'C')
+    acgt = gc + seq.count(b'A') + seq.count(b'T')
+    return gc / acgt if acgt else 0.0
+
+
+def kmer_counts(seq: bytes, k: int) -> list:
+    counts = [0] * (4 ** k)
+    mask = 4 ** k - 1
+    code = valid = 0
+    for byte in seq:
+        base = _BASE_CODES.get(byte)
+        if base is None:
+            code = valid = 0
+            continue
+        code = ((code << 2) & mask) | base
+        valid += 1
+        if valid >= k:
+            counts[code] += 1
+    return counts
+
+
+def window_stats(seq: bytes, window: int, step: int) -> list:
+    rows = []
+    for first in range(0, len(seq) - window + 1, step):
+        part = seq[first:first + window]
+        a, c, g, t = part.count(b'A'), part.count(b'C'), part.count(b'G'), part.count(b'T')
+        acgt = a + c + g + t
+        rows.append(((g + c) / acgt if acgt else float('nan'),
+                     (g - c) / (g + c) if g + c else float('nan')))
+    return rows
@@ -0,0 +1,222 @@
+"""
+Live dashboard updates over Server-Sent Events.
+
+One ``ChangeDetector`` thread per process watches cheap change signals and
+only does real work when one of them moves:
+
+- compounds: the data-version token (one ``stat``); the statistics are then
+  reloaded through the shared cache, so all workers together query the
+  database once per change;
+- workers: this process's worker registry;
+- jobs: the jobs directory (one ``stat``, see utils/jobs.py).
+
+Changed sections are encoded once as an SSE frame and appended to every
+subscriber's bounded queue, so each additional viewer costs a queue append,
+not a query. A viewer that falls a whole queue behind is disconnected; its
+EventSource reconnects and starts again from a fresh snapshot. The thread
+starts with the first subscriber (so it is created after any fork) and exits
+once the last one has gone.
+
+Every open stream holds a server thread, so a process serves at most
+MAX_VIEWERS streams (by default half its gunicorn threads, leaving the rest
+for ordinary requests) and ends each one after STREAM_LIFETIME seconds. The
+browser then reconnects, so viewers turned away with a 503 get a turn.
+"""
+
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from utils import data_version, jobs
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL', 1.0))
+HEARTBEAT_INTERVAL = float(os.environ.get('LIVE_HEARTBEAT_INTERVAL', 15.0))
+SUBSCRIBER_QUEUE_SIZE = 64
+MAX_VIEWERS = int(os.environ.get('LIVE_MAX_VIEWERS', max(1, int(os.environ.get('GUNICORN_THREADS', 8)) // 2)))
+STREAM_LIFETIME = float(os.environ.get('LIVE_STREAM_LIFETIME', 300.0))
+RECENT_COMPOUNDS = 5
+HEARTBEAT = b': keep-alive\n\n'
+
+_detectors = {}  # pid -> ChangeDetector
+_detectors_lock = threading.Lock()
+
+
+def format_event(event: str, data, event_id=None) -> bytes:
+    """Encode one SSE frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, separators=(',', ':'), default=str))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+class Subscription:
+    """One connected viewer: a bounded queue of encoded frames"""
+
+    def __init__(self, size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=size)
+        self.closed = False
+
+    def put(self, frame: bytes) -> bool:
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass  # the reader checks ``closed`` on its next heartbeat
+
+    def frames(self, heartbeat: float = HEARTBEAT_INTERVAL, lifetime: float = STREAM_LIFETIME):
+        """Yield frames as they arrive, with keep-alive comments in between, until closed or ``lifetime`` is up"""
+        deadline = time.monotonic() + lifetime
+        while not self.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                frame = self.queue.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                yield HEARTBEAT
+                continue
+            if frame is None:
+                return
+            yield frame
+
+
+def _compound_section(app) -> dict:
+    from routes.main import load_dashboard_data
+    from utils.db_routing import reading
+
+    with app.app_context(), reading():
+        data = load_dashboard_data()
+    return {
+        'total': data['total_compounds'],
+        'recent': [{
+            'id': compound['id'],
+            'name': compound['name'],
+            'molecular_formula': compound.get('molecular_formula'),
+            'description': (compound.get('description') or '')[:70],
+            'created_at': compound['created_at'].isoformat() if compound.get('created_at') else None,
+        } for compound in data['recent_compounds'][:RECENT_COMPOUNDS]],
+    }
+
+
+def _worker_section() -> list:
+    from routes.main import workers_data
+
+    # Only what the dashboard shows; SSH details never leave the server
+    return [{key: worker.get(key) for key in ('id', 'name', 'ip_address', 'status', 'last_check')}
+            for worker in list(workers_data)]
+
+
+class ChangeDetector:
+    """Polls for dashboard changes and fans each delta out to all subscribers"""
+
+    def __init__(self, app, interval: float = POLL_INTERVAL):
+        self.app = app
+        self.interval = interval
+        self.sections = {}     # section -> last published value
+        self._signatures = {}  # section -> last seen change marker
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ids = itertools.count(1)
+        self.last_id = 0
+
+    def subscribe(self, limit: int = MAX_VIEWERS):
+        """Register a viewer, its queue starting with a full snapshot; None if ``limit`` are connected"""
+        subscription = Subscription()
+        with self._lock:
+            if len(self._subscribers) >= limit:
+                registry.inc('mn_live_viewers_rejected_total')
+                return None
+            if self._thread is None:
+                self._poll()  # first viewer: load the sections before publishing them
+            subscription.put(format_event('snapshot', self.sections, self.last_id))
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='live-dashboard', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+        subscription.close()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    self._signatures.clear()  # start from a fresh snapshot next time
+                    return
+            try:
+                changed = self._poll()
+            except Exception as e:
+                logger.warning(f"Live dashboard poll failed: {e}")
+                continue
+            if changed:
+                self._publish(changed)
+
+    def _poll(self) -> dict:
+        """Refresh sections whose change marker moved; return those whose value changed"""
+        checks = (
+            ('compounds', data_version.current, lambda: _compound_section(self.app)),
+            ('workers', lambda: None, _worker_section),
+            ('jobs', jobs.signature, jobs.list_jobs),
+        )
+        changed = {}
+        for section, marker, load in checks:
+            signature = marker()
+            if signature is not None and self._signatures.get(section) == signature and section in self.sections:
+                continue
+            value = load()
+            self._signatures[section] = signature
+            if self.sections.get(section) != value:
+                self.sections[section] = value
+                changed[section] = value
+        return changed
+
+    def _publish(self, changed: dict):
+        self.last_id = next(self._ids)
+        frame = format_event('delta', changed, self.last_id)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if not subscription.put(frame):
+                logger.info("Dropping a live dashboard viewer that fell behind")
+                registry.inc('mn_live_viewers_dropped_total')
+                self.unsubscribe(subscription)
+        registry.inc('mn_live_frames_total', value=len(subscribers))
+
+
+def get_detector(app) -> ChangeDetector:
+    """This process's change detector"""
+    pid = os.getpid()
+    detector = _detectors.get(pid)
+    if detector is None:
+        with _detectors_lock:
+            detector = _detectors.get(pid)
+            if detector is None:
+                _detectors.clear()  # a forked child must not reuse the parent's
+                detector = _detectors[pid] = ChangeDetector(app)
+    return detector
@@ -0,0 +1,236 @@
+"""
+Non-blocking, structured logging pipeline.
+
+Request threads never touch the disk: records go through a bounded in-memory
+queue to a single background writer thread (``QueueListener``), which writes
+JSON lines to ``app.log`` and ``error.log`` and plain text to the console.
+Both files rotate by size and at midnight, whichever comes first.
+
+High-frequency messages (a 404 flood, a failing dependency logging on every
+request) are rate limited per call site: each site may log ``burst`` records
+per second, after which only one in ``sample_every`` gets through, annotated
+with the number suppressed. When the queue is full, records are dropped
+rather than blocking the caller. Both kinds of loss are counted in
+``mn_log_records_dropped_total``.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+CONSOLE_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+_RESERVED = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_handler = None
+
+
+def _count_dropped(reason: str, count: int = 1):
+    # Imported lazily: metrics imports Flask, and logging is set up first
+    metrics = sys.modules.get('utils.metrics')
+    if metrics is not None:
+        metrics.registry.inc('mn_log_records_dropped_total', (('reason', reason),), count)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra`` fields"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = record.stack_info
+        return json.dumps(data, default=str)
+
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """Rotates at the given time interval or when the file exceeds ``max_bytes``"""
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, when='midnight', backup_count=7, **kwargs):
+        super().__init__(filename, when=when, backupCount=backup_count, encoding='utf-8', delay=True, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record):
+        if self.stream is not None and self._rotated_elsewhere():
+            # Another process already rotated the file; follow it
+            self.stream.close()
+            self.stream = self._open()
+            return False
+        if super().shouldRollover(record):
+            return True
+        # Checked before the write, so a file may exceed max_bytes by one record
+        return self.max_bytes > 0 and self.stream is not None and self.stream.tell() >= self.max_bytes
+
+    def _rotated_elsewhere(self) -> bool:
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except OSError:
+            return True
+
+    def rotation_filename(self, default_name):
+        # Size-based rotations within one interval would reuse the timed
+        # suffix; number them instead of overwriting the earlier backup.
+        name = super().rotation_filename(default_name)
+        counter = 1
+        candidate = name
+        while os.path.exists(candidate):
+            candidate = f'{name}.{counter}'
+            counter += 1
+        return candidate
+
+
+class RateLimitFilter(logging.Filter):
+    """Per call-site rate limiting with sampling of the excess"""
+
+    MAX_SITES = 2048
+
+    def __init__(self, burst: int = 20, sample_every: int = 100):
+        super().__init__()
+        self.burst = burst
+        self.sample_every = max(1, sample_every)
+        self._lock = threading.Lock()
+        self._sites = {}  # (logger, file, line) -> [window start, count, suppressed]
+
+    def filter(self, record):
+        if self.burst <= 0:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= 1.0:
+                suppressed = site[2] if site is not None else 0
+                if site is None and len(self._sites) >= self.MAX_SITES:
+                    self._sites.clear()
+                self._sites[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+
+            site[1] += 1
+            if site[1] <= self.burst:
+                return True
+            site[2] += 1
+            if site[2] % self.sample_every:
+                _count_dropped('sampled')
+                return False
+            record.suppressed = site[2]
+            return True
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request's method and path, captured on the request thread"""
+
+    def filter(self, record):
+        flask = sys.modules.get('flask')
+        if flask is not None and flask.has_request_context():
+            record.method = flask.request.method
+            record.path = flask.request.path
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count_dropped('queue_full')
+
+    def prepare(self, record):
+        # Render the message and traceback on the caller's thread, where the
+        # arguments are still valid, but leave the layout to the writer.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def configure_logging(logs_dir, level=None, max_bytes=None, backup_count=None, when=None,
+                      burst=None, sample_every=None, queue_size=10000):
+    """
+    Route the root logger through the queue to a background writer.
+    Settings default to LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT,
+    LOG_ROTATE_WHEN, LOG_BURST and LOG_SAMPLE_EVERY. Safe to call again.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return _listener
+
+    level = level or os.environ.get('LOG_LEVEL', 'INFO').upper()
+    max_bytes = max_bytes if max_bytes is not None else int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    backup_count = backup_count if backup_count is not None else int(os.environ.get('LOG_BACKUP_COUNT', 7))
+    when = when or os.environ.get('LOG_ROTATE_WHEN', 'midnight')
+    burst = burst if burst is not None else int(os.environ.get('LOG_BURST', 20))
+    sample_every = sample_every if sample_every is not None else int(os.environ.get('LOG_SAMPLE_EVERY', 100))
+
+    os.makedirs(logs_dir, exist_ok=True)
+    json_formatter = JSONFormatter()
+
+    app_log = SizedTimedRotatingFileHandler(os.path.join(logs_dir, 'app.log'), max_bytes, when, backup_count)
+    app_log.setFormatter(json_formatter)
+    error_log = SizedTimedRotatingFileHandler(os.path.join(logs_dir, 'error.log'), max_bytes, when, backup_count)
+    error_log.setLevel(logging.ERROR)
+    error_log.setFormatter(json_formatter)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+
+    _handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    _handler.addFilter(RateLimitFilter(burst, sample_every))
+    _handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(_handler.queue, app_log, error_log, console, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_after_fork)
+    return _listener
+
+
+def _restart_after_fork():
+    """The writer thread does not survive fork(); start a fresh one with a fresh queue"""
+    if _listener is None:
+        return
+    _handler.queue = _listener.queue = queue.Queue(maxsize=_handler.queue.maxsize)
+    _listener._thread = None
+    _listener.start()
+
+
+def shutdown():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        finally:
+            _listener = None
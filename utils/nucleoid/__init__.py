@@ -0,0 +1,8 @@
+"""
+Nucleoid polymer simulation: a bead-spring chromosome confined to a
+capsule-shaped cell with optional crowders (engine.py), and the runs that
+checkpoint it and write trajectories for the browser (runs.py).
+
+Import from the submodules; both pull in numpy, which the rest of the app
+does not need at startup.
+"""
@@ -0,0 +1,422 @@
+"""
+Bead-spring polymer dynamics for a bacterial nucleoid.
+
+The chromosome is a ring (or chain) of beads of diameter 1, optionally
+mixed with spherical crowders (ribosomes, proteins), confined in a capsule
+shaped like a rod-shaped cell: a cylinder along z with hemispherical caps.
+Units are the bead diameter, kT and the bead friction.
+
+Potentials, all soft so large time steps stay stable:
+
+- bonds: harmonic, ``bond_k / 2 * (r - 1)**2``
+- bending: ``bend_k * (1 - cos(theta))`` between consecutive bonds, which
+  sets a persistence length of about ``bend_k`` beads
+- excluded volume: harmonic overlap, ``repulsion_k / 2 * (sigma - r)**2``
+  for pairs closer than their mean diameter ``sigma``
+- confinement: harmonic, ``wall_k / 2 * depth**2`` for the depth a particle
+  reaches past the capsule wall
+
+Particles move by overdamped Langevin (Brownian) dynamics, with a mobility
+inversely proportional to diameter, so crowders diffuse more slowly.
+
+Pairs come from a cell list: particles are binned into cells at least one
+cutoff wide, and only each cell and its 13 "half-shell" neighbours are
+compared, with every step of the search done as whole-array NumPy
+operations. Beads are searched with their own small cutoff and only pairs
+involving crowders with the larger one. A step costs O(n): about 6 µs per
+particle on one core, the same at any system size.
+
+With a ``skin``, the pairs within cutoff plus skin are kept as a Verlet
+list and rebuilt only once some particle has moved half the skin. At the
+default time step the Brownian kicks move some particle that far every
+step, so the default skin is 0 (search every step); it pays off with time
+steps of about 0.001 and below.
+
+Everything random comes from one seeded ``numpy.random.Generator``. Its
+state is part of ``state()``, so a run restored from a checkpoint continues
+exactly as the original would have (see utils/nucleoid/runs.py).
+"""
+
+import json
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+# Cell offsets ahead of (0, 0, 0) in lexicographic order: each neighbouring pair of cells once
+_HALF_SHELL = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) > (0, 0, 0)]
+MAX_DRIFT = 0.25  # largest deterministic move per step, in bead diameters
+
+
+class Params(NamedTuple):
+    beads: int = 2000
+    crowders: int = 0
+    crowder_diameter: float = 2.0
+    volume_fraction: float = 0.2  # of beads and crowders in the capsule
+    aspect: float = 2.0           # capsule length / diameter
+    ring: bool = True
+    bond_k: float = 100.0
+    bend_k: float = 2.0
+    repulsion_k: float = 50.0
+    wall_k: float = 100.0
+    kT: float = 1.0
+    dt: float = 0.005
+    skin: float = 0.0             # Verlet skin; see the module docstring
+    seed: int = 0
+
+    @classmethod
+    def from_dict(cls, values: dict) -> 'Params':
+        """Params from a mapping, ignoring unknown keys and coercing types; raises ValueError"""
+        types = cls.__annotations__
+        known = {name: types[name](values[name]) for name in cls._fields if name in values}
+        params = cls(**known)
+        params.validate()
+        return params
+
+    def validate(self):
+        if self.beads < 3:
+            raise ValueError('beads must be at least 3')
+        if self.crowders < 0 or self.crowder_diameter <= 0:
+            raise ValueError('crowders and crowder_diameter must be positive')
+        if not 0 < self.volume_fraction < 0.6:
+            raise ValueError('volume_fraction must be between 0 and 0.6')
+        if self.aspect < 1:
+            raise ValueError('aspect must be at least 1')
+        if min(self.bond_k, self.repulsion_k, self.wall_k, self.kT, self.dt) <= 0 or min(self.skin, self.bend_k) < 0:
+            raise ValueError('force constants, kT and dt must be positive, skin and bend_k not negative')
+
+
+class Capsule(NamedTuple):
+    """A cylinder of ``radius`` along z, ``half_length`` each way, with hemispherical caps"""
+    radius: float
+    half_length: float
+
+    @classmethod
+    def for_volume(cls, volume: float, aspect: float) -> 'Capsule':
+        # V = pi r^2 * 2r(aspect - 1) + 4/3 pi r^3
+        radius = (volume / (math.pi * (2 * (aspect - 1) + 4 / 3))) ** (1 / 3)
+        return cls(radius, radius * (aspect - 1))
+
+    @classmethod
+    def for_params(cls, params: 'Params') -> 'Capsule':
+        """The cell holding the beads and crowders at ``params.volume_fraction``"""
+        volume = (params.beads + params.crowders * params.crowder_diameter ** 3) * math.pi / 6
+        return cls.for_volume(volume / params.volume_fraction, params.aspect)
+
+    def bounds(self):
+        extent = np.array([self.radius, self.radius, self.half_length + self.radius])
+        return -extent, extent
+
+    def outward(self, positions: np.ndarray):
+        """(distance from the axis segment, unit vector away from it) per position"""
+        axis_point = np.zeros_like(positions)
+        axis_point[:, 2] = np.clip(positions[:, 2], -self.half_length, self.half_length)
+        offset = positions - axis_point
+        distance = np.sqrt(np.einsum('ij,ij->i', offset, offset))
+        return distance, offset / np.maximum(distance, 1e-12)[:, None], axis_point
+
+
+_FULL_SHELL = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)]
+
+
+def neighbour_pairs(positions: np.ndarray, cutoff: float, lower: np.ndarray, upper: np.ndarray,
+                    others: np.ndarray = None):
+    """
+    Index arrays (first, second) of every pair closer than ``cutoff``, via a
+    cell list: pairs within ``positions``, or with ``others`` given, pairs of
+    one of ``positions`` (first) and one of ``others`` (second).
+    """
+    grid = positions if others is None else others
+    shape = np.maximum(((upper - lower) // cutoff).astype(np.int64), 1)
+
+    def cells(points):
+        # Points outside the box go to the edge cells; they are only further from the rest
+        return np.clip(((points - lower) // cutoff).astype(np.int64), 0, shape - 1)
+
+    def linear(cell):
+        return (cell[:, 0] * shape[1] + cell[:, 1]) * shape[2] + cell[:, 2]
+
+    # Work in cell order so each cell's members are contiguous in memory
+    grid_cells = cells(grid)
+    order = np.argsort(linear(grid_cells), kind='stable')
+    sorted_grid = np.ascontiguousarray(grid[order])
+    counts = np.bincount(linear(grid_cells), minlength=int(np.prod(shape)))
+    starts = np.cumsum(counts) - counts
+    if others is None:
+        query_order, sorted_queries, query_cells = order, sorted_grid, grid_cells[order]
+    else:
+        query_cells = cells(positions)
+        query_order = np.argsort(linear(query_cells), kind='stable')
+        sorted_queries, query_cells = np.ascontiguousarray(positions[query_order]), query_cells[query_order]
+    queries = np.arange(len(positions))
+
+    firsts, seconds = [], []
+    for offset in [(0, 0, 0), *_HALF_SHELL] if others is None else _FULL_SHELL:
+        other = query_cells + offset
+        inside = np.all((other >= 0) & (other < shape), axis=1)
+        other_cells = linear(other[inside])
+        per_query = counts[other_cells]
+        total = int(per_query.sum())
+        if total == 0:
+            continue
+        # Every query paired with each member of its offset cell, without a Python loop
+        first = np.repeat(queries[inside], per_query)
+        rank = np.arange(total) - np.repeat(np.cumsum(per_query) - per_query, per_query)
+        second = np.repeat(starts[other_cells], per_query) + rank
+        if others is None and offset == (0, 0, 0):
+            keep = first < second
+            first, second = first[keep], second[keep]
+        delta = sorted_grid[second] - sorted_queries[first]
+        close = np.einsum('ij,ij->i', delta, delta) < cutoff * cutoff
+        firsts.append(query_order[first[close]])
+        seconds.append(order[second[close]])
+    if not firsts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def _scatter_add(forces: np.ndarray, index: np.ndarray, values: np.ndarray):
+    # bincount per axis is several times faster than np.add.at
+    for axis in range(3):
+        forces[:, axis] += np.bincount(index, values[:, axis], minlength=len(forces))
+
+
+class Simulation:
+    """A confined polymer with crowders, advanced by ``run``"""
+
+    def __init__(self, params: Params, positions: np.ndarray = None, step: int = 0, rng_state: dict = None):
+        params.validate()
+        self.params = params
+        count = params.beads + params.crowders
+        self.diameters = np.ones(count)
+        self.diameters[params.beads:] = params.crowder_diameter
+        self.mobility = 1.0 / self.diameters
+        self.capsule = Capsule.for_params(params)
+        self.rng = np.random.default_rng(params.seed)
+        if rng_state is not None:
+            self.rng.bit_generator.state = rng_state
+        self.positions = self._initial_positions() if positions is None else np.array(positions, dtype=np.float64)
+        if self.positions.shape != (count, 3):
+            raise ValueError(f'expected {count} positions, got {self.positions.shape[0]}')
+        self.step = step
+        self.pair_builds = 0
+        self.invalidate_pairs()
+
+    # -- setup -------------------------------------------------------------
+
+    def _inside(self, positions: np.ndarray, diameters: np.ndarray) -> np.ndarray:
+        """Positions moved onto the wall where they poke through it"""
+        distance, direction, axis_point = self.capsule.outward(positions)
+        limit = np.maximum(self.capsule.radius - diameters / 2, 0)
+        outside = distance > limit
+        positions = positions.copy()
+        positions[outside] = axis_point[outside] + direction[outside] * limit[outside, None]
+        return positions
+
+    def _walk(self) -> np.ndarray:
+        """
+        A random walk of unit steps that reflects off the capsule wall, so it
+        fills the capsule evenly. For a ring, the walk is drawn back towards
+        its start as the remaining steps run out, closing the loop.
+        """
+        params, capsule = self.params, self.capsule
+        limit, half_length = max(capsule.radius - 0.5, 0.0), capsule.half_length
+        directions = self.rng.standard_normal((params.beads, 3))
+        directions /= np.linalg.norm(directions, axis=1)[:, None]
+        # Plain floats: per-step NumPy calls would cost more than the arithmetic
+        x = y = z = 0.0
+        walk = []
+        for remaining, (dx, dy, dz) in zip(range(params.beads, 0, -1), directions.tolist()):
+            walk.append((x, y, z))
+            if params.ring:
+                gap = math.sqrt(x * x + y * y + z * z)
+                pull = min(1.0, gap / remaining) if gap > 0 else 0.0
+                if pull > 0:
+                    dx, dy, dz = ((1 - pull) * dx - pull * x / gap, (1 - pull) * dy - pull * y / gap,
+                                  (1 - pull) * dz - pull * z / gap)
+                    norm = math.sqrt(dx * dx + dy * dy + dz * dz) or 1.0
+                    dx, dy, dz = dx / norm, dy / norm, dz / norm
+            nx, ny, nz = x + dx, y + dy, z + dz
+            axis_z = min(max(nz, -half_length), half_length)
+            distance = math.sqrt(nx * nx + ny * ny + (nz - axis_z) ** 2)
+            if distance > limit:
+                # Reflect the step off the wall's normal
+                ux, uy, uz = nx / distance, ny / distance, (nz - axis_z) / distance
+                dot = dx * ux + dy * uy + dz * uz
+                nx, ny, nz = x + dx - 2 * dot * ux, y + dy - 2 * dot * uy, z + dz - 2 * dot * uz
+            x, y, z = nx, ny, nz
+        return np.array(walk)
+
+    def _initial_positions(self) -> np.ndarray:
+        params, capsule = self.params, self.capsule
+        beads = self._inside(self._walk(), self.diameters[:params.beads])
+
+        crowders = np.empty((0, 3))
+        lower, upper = capsule.bounds()
+        while len(crowders) < params.crowders:
+            # Uniform in the capsule: sample its bounding box and keep what falls inside
+            candidates = self.rng.uniform(lower, upper, size=(2 * (params.crowders - len(crowders)) + 16, 3))
+            distance, _, _ = capsule.outward(candidates)
+            crowders = np.concatenate([crowders, candidates[distance <= capsule.radius - params.crowder_diameter / 2]])
+        return np.concatenate([beads, crowders[:params.crowders]])
+
+    # -- forces ------------------------------------------------------------
+
+    def invalidate_pairs(self):
+        """Rebuild the Verlet list before the next step"""
+        self._pairs = None
+
+    def _find_pairs(self, skin: float):
+        """Pairs within their contact distance plus ``skin``, searched per species so beads use a small cutoff"""
+        params = self.params
+        lower, upper = self.capsule.bounds()
+        beads, crowders = self.positions[:params.beads], self.positions[params.beads:]
+        pairs = [neighbour_pairs(beads, 1.0 + skin, lower, upper)]
+        if params.crowders:
+            bead, crowder = neighbour_pairs(beads, (1.0 + params.crowder_diameter) / 2 + skin, lower, upper,
+                                            others=crowders)
+            pairs.append((bead, crowder + params.beads))
+            first, second = neighbour_pairs(crowders, params.crowder_diameter + skin, lower, upper)
+            pairs.append((first + params.beads, second + params.beads))
+        return np.concatenate([first for first, _ in pairs]), np.concatenate([second for _, second in pairs])
+
+    def _update_pairs(self):
+        if self._pairs is not None:
+            moved = self.positions - self._pairs_built_at
+            if np.einsum('ij,ij->i', moved, moved).max(initial=0.0) < (self.params.skin / 2) ** 2:
+                return
+        self._pairs = self._find_pairs(self.params.skin)
+        self._pairs_built_at = self.positions.copy()
+        self.pair_builds += 1
+
+    def _bond_vectors(self):
+        beads = self.positions[:self.params.beads]
+        if self.params.ring:
+            return np.roll(beads, -1, axis=0) - beads
+        return beads[1:] - beads[:-1]
+
+    def forces(self) -> np.ndarray:
+        params = self.params
+        nb = params.beads
+        forces = np.zeros_like(self.positions)
+        bead_forces = forces[:nb]
+
+        # Bonds: bond i runs from bead i to bead i + 1
+        bonds = self._bond_vectors()
+        lengths = np.sqrt(np.einsum('ij,ij->i', bonds, bonds))
+        pull = (params.bond_k * (lengths - 1.0) / np.maximum(lengths, 1e-12))[:, None] * bonds
+        if params.ring:
+            bead_forces += pull - np.roll(pull, 1, axis=0)
+        else:
+            bead_forces[:-1] += pull
+            bead_forces[1:] -= pull
+
+        # Bending at each bead between its incoming (b1) and outgoing (b2) bond
+        if params.bend_k > 0:
+            if params.ring:
+                b1, b2, l1, l2 = np.roll(bonds, 1, axis=0), bonds, np.roll(lengths, 1), lengths
+            else:
+                b1, b2, l1, l2 = bonds[:-1], bonds[1:], lengths[:-1], lengths[1:]
+            l1, l2 = np.maximum(l1, 1e-12)[:, None], np.maximum(l2, 1e-12)[:, None]
+            cos = np.einsum('ij,ij->i', b1, b2)[:, None] / (l1 * l2)
+            g1 = params.bend_k * (b2 / (l1 * l2) - cos * b1 / l1 ** 2)
+            g2 = params.bend_k * (b1 / (l1 * l2) - cos * b2 / l2 ** 2)
+            if params.ring:
+                bead_forces += g1 - g2 - np.roll(g1, -1, axis=0) + np.roll(g2, 1, axis=0)
+            else:
+                bead_forces[:-2] -= g1
+                bead_forces[1:-1] += g1 - g2
+                bead_forces[2:] += g2
+
+        # Excluded volume between every pair of particles, from the Verlet list
+        self._update_pairs()
+        first, second = self._pairs
+        if len(first):
+            delta = self.positions[second] - self.positions[first]
+            distance = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+            sigma = (self.diameters[first] + self.diameters[second]) / 2
+            overlap = sigma - distance
+            hit = overlap > 0
+            if hit.any():
+                push = (params.repulsion_k * overlap[hit] / np.maximum(distance[hit], 1e-12))[:, None] * delta[hit]
+                _scatter_add(forces, second[hit], push)
+                _scatter_add(forces, first[hit], -push)
+
+        # Confinement
+        distance, direction, _ = self.capsule.outward(self.positions)
+        depth = distance - (self.capsule.radius - self.diameters / 2)
+        out = depth > 0
+        forces[out] -= (params.wall_k * depth[out])[:, None] * direction[out]
+        return forces
+
+    def energy(self) -> float:
+        """Total potential energy, in kT (for checks; the dynamics only need forces)"""
+        params = self.params
+        lengths = np.linalg.norm(self._bond_vectors(), axis=1)
+        energy = params.bond_k / 2 * np.sum((lengths - 1.0) ** 2)
+        bonds = self._bond_vectors()
+        b1, b2 = (np.roll(bonds, 1, axis=0), bonds) if params.ring else (bonds[:-1], bonds[1:])
+        cos = np.einsum('ij,ij->i', b1, b2) / (np.linalg.norm(b1, axis=1) * np.linalg.norm(b2, axis=1))
+        energy += params.bend_k * np.sum(1 - cos)
+        first, second = self._find_pairs(0.0)
+        distance = np.linalg.norm(self.positions[second] - self.positions[first], axis=1)
+        overlap = np.maximum((self.diameters[first] + self.diameters[second]) / 2 - distance, 0)
+        energy += params.repulsion_k / 2 * np.sum(overlap ** 2)
+        distance, _, _ = self.capsule.outward(self.positions)
+        depth = np.maximum(distance - (self.capsule.radius - self.diameters / 2), 0)
+        return float(energy + params.wall_k / 2 * np.sum(depth ** 2))
+
+    # -- dynamics ----------------------------------------------------------
+
+    def run(self, steps: int):
+        """Advance ``steps`` Brownian dynamics steps"""
+        params = self.params
+        noise_scale = np.sqrt(2 * params.kT * params.dt * self.mobility)[:, None]
+        for _ in range(steps):
+            drift = self.forces() * (params.dt * self.mobility)[:, None]
+            # Cap the deterministic move so a bad overlap cannot blow the system up
+            size = np.sqrt(np.einsum('ij,ij->i', drift, drift))
+            too_far = size > MAX_DRIFT
+            if too_far.any():
+                drift[too_far] *= (MAX_DRIFT / size[too_far])[:, None]
+            self.positions += drift + noise_scale * self.rng.standard_normal(self.positions.shape)
+            self.step += 1
+
+    # -- output ------------------------------------------------------------
+
+    def observables(self) -> dict:
+        beads = self.positions[:self.params.beads]
+        lengths = np.linalg.norm(self._bond_vectors(), axis=1)
+        return {
+            'step': self.step,
+            'time': self.step * self.params.dt,
+            'radius_of_gyration': float(np.sqrt(((beads - beads.mean(axis=0)) ** 2).sum(axis=1).mean())),
+            'mean_bond_length': float(lengths.mean()),
+        }
+
+    def frame(self, max_beads: int, max_crowders: int) -> np.ndarray:
+        """
+        float32 (max_beads + max_crowders, 3) positions for display: the chain
+        averaged over consecutive blocks of beads, which keeps its shape, and
+        the first crowders.
+        """
+        beads = self.positions[:self.params.beads]
+        block = -(-len(beads) // max_beads)
+        coarse = np.add.reduceat(beads, np.arange(0, len(beads), block), axis=0)
+        coarse /= np.diff(np.r_[np.arange(0, len(beads), block), len(beads)])[:, None]
+        crowders = self.positions[self.params.beads:self.params.beads + max_crowders]
+        return np.concatenate([coarse, crowders]).astype(np.float32)
+
+    def state(self) -> dict:
+        return {
+            'params': self.params._asdict(),
+            'step': self.step,
+            'positions': self.positions.copy(),
+            'rng_state': json.dumps(self.rng.bit_generator.state),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'Simulation':
+        rng_state = state['rng_state']
+        return cls(Params(**state['params']), positions=state['positions'], step=int(state['step']),
+                   rng_state=json.loads(rng_state) if isinstance(rng_state, str) else rng_state)
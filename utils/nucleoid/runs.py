@@ -0,0 +1,331 @@
+"""
+Nucleoid simulation runs: storage, checkpoints and browser trajectories.
+
+A run lives in SIMULATIONS_DIR/<id>/:
+
+- ``run.json``: parameters, output settings, status and the last step
+  checkpointed, replaced atomically
+- ``checkpoint.npz``: positions, step and random generator state, replaced
+  atomically every ``checkpoint_every`` steps and when the run stops
+- ``trajectory.f32``: one frame every ``frame_every`` steps (frame 0 is the
+  starting conformation), each ``frame_beads + frame_crowders`` rows of
+  three float32. The chain is block-averaged down to ``frame_beads``
+  points, so a frame stays a few KB at any system size
+- ``observables.jsonl``: step, time, radius of gyration and mean bond
+  length, one line per frame
+- ``stop``: present while a stop has been requested and not yet honoured
+
+``execute`` continues from the checkpoint when there is one, first cutting
+the trajectory back to the checkpointed step. Because the random state is
+checkpointed too, a resumed run produces exactly the frames an
+uninterrupted one would have.
+
+Runs started from the web app execute in a background thread of that
+worker, at most MAX_RUNNING at a time per process, and report progress as
+jobs (utils/jobs.py). ``stop`` works from any process, including for runs
+executing in another worker or the CLI: it creates the ``stop`` file,
+which ``execute`` checks between chunks. A run whose worker died is left
+"running" with a dead pid; ``resumable`` notices and it can be resumed.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from paths import SIMULATIONS_DIR
+from utils.nucleoid.engine import Capsule, Params, Simulation
+
+logger = logging.getLogger(__name__)
+
+MAX_PARTICLES = 200_000
+MAX_STEPS = 1_000_000
+MAX_FRAMES = 10_000
+MAX_FRAME_BEADS = 2000
+MAX_FRAME_CROWDERS = 1000
+MAX_RUNNING = int(os.environ.get('SIMULATION_MAX_RUNNING', 1))
+OUTPUT_DEFAULTS = {'steps': 10_000, 'frame_every': 100, 'checkpoint_every': 1000,
+                   'frame_beads': 500, 'frame_crowders': 200}
+
+QUEUED, RUNNING, DONE, STOPPED, FAILED = 'queued', 'running', 'done', 'stopped', 'failed'
+
+STOP_FILE = 'stop'
+
+_running = {}  # run id -> threading.Event that stops it
+_running_lock = threading.Lock()
+
+
+def _path(run_id: str):
+    if not run_id.isalnum():
+        raise KeyError(run_id)
+    return SIMULATIONS_DIR / run_id
+
+
+def _write_json(path, data):
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def frame_layout(params: Params, frame_beads: int, frame_crowders: int):
+    """(chain points, crowders) per frame, as ``Simulation.frame`` produces them"""
+    block = -(-params.beads // frame_beads)
+    return -(-params.beads // block), min(params.crowders, frame_crowders)
+
+
+def create(options: dict) -> dict:
+    """Validate options (model parameters plus OUTPUT_DEFAULTS keys) and set up a run; raises ValueError"""
+    params = Params.from_dict(options)
+    if params.beads + params.crowders > MAX_PARTICLES:
+        raise ValueError(f'At most {MAX_PARTICLES} beads and crowders')
+    output = {key: int(options.get(key, default)) for key, default in OUTPUT_DEFAULTS.items()}
+    if not 1 <= output['steps'] <= MAX_STEPS:
+        raise ValueError(f'steps must be between 1 and {MAX_STEPS}')
+    if output['frame_every'] < 1 or output['checkpoint_every'] < 1:
+        raise ValueError('frame_every and checkpoint_every must be positive')
+    if output['steps'] // output['frame_every'] + 1 > MAX_FRAMES:
+        raise ValueError(f'At most {MAX_FRAMES} frames; raise frame_every')
+    if not 1 <= output['frame_beads'] <= MAX_FRAME_BEADS or not 0 <= output['frame_crowders'] <= MAX_FRAME_CROWDERS:
+        raise ValueError(f'frame_beads must be 1..{MAX_FRAME_BEADS}, frame_crowders 0..{MAX_FRAME_CROWDERS}')
+
+    chain_points, crowders = frame_layout(params, output['frame_beads'], output['frame_crowders'])
+    run = {
+        'id': uuid.uuid4().hex[:12],
+        'params': params._asdict(),
+        'capsule': Capsule.for_params(params)._asdict(),
+        **output,
+        'frame_points': {'chain': chain_points, 'crowders': crowders},
+        'status': QUEUED,
+        'step': 0,
+        'created': time.time(),
+        'updated': time.time(),
+        'pid': None,
+        'error': None,
+    }
+    directory = _path(run['id'])
+    directory.mkdir(parents=True)
+    _write_json(directory / 'run.json', run)
+    return run
+
+
+def load_run(run_id: str) -> dict:
+    """A run's record; raises KeyError if there is none"""
+    try:
+        return json.loads((_path(run_id) / 'run.json').read_text())
+    except FileNotFoundError:
+        raise KeyError(run_id)
+
+
+def list_runs() -> list:
+    if not SIMULATIONS_DIR.is_dir():
+        return []
+    runs = []
+    for entry in SIMULATIONS_DIR.iterdir():
+        try:
+            runs.append(load_run(entry.name))
+        except (KeyError, ValueError):
+            continue
+    return sorted(runs, key=lambda run: run['created'], reverse=True)
+
+
+def _alive(pid) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def at_capacity() -> bool:
+    """True if this process already executes MAX_RUNNING runs"""
+    return len(_running) >= MAX_RUNNING
+
+
+def resumable(run: dict) -> bool:
+    """True unless the run is finished or executing somewhere"""
+    if run['status'] == DONE or run['id'] in _running:
+        return False
+    return run['status'] != RUNNING or not _alive(run['pid'])
+
+
+def delete(run_id: str):
+    run = load_run(run_id)
+    if run['id'] in _running:
+        raise ValueError('The run is executing; stop it first')
+    shutil.rmtree(_path(run_id))
+
+
+def _save_checkpoint(directory, simulation: Simulation):
+    state = simulation.state()
+    tmp_path = directory / f'.checkpoint.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as handle:  # a file object, so savez does not append .npz
+        np.savez(handle, positions=state['positions'], step=state['step'], rng_state=state['rng_state'],
+                 params=json.dumps(state['params']))
+    os.replace(tmp_path, directory / 'checkpoint.npz')
+
+
+def _load_checkpoint(directory):
+    path = directory / 'checkpoint.npz'
+    if not path.exists():
+        return None
+    with np.load(path) as data:
+        return Simulation.from_state({
+            'params': json.loads(str(data['params'])),
+            'step': int(data['step']),
+            'positions': data['positions'],
+            'rng_state': str(data['rng_state']),
+        })
+
+
+def _frame_bytes(run: dict) -> int:
+    return (run['frame_points']['chain'] + run['frame_points']['crowders']) * 3 * 4
+
+
+def _truncate_outputs(directory, run: dict, frames: int):
+    """Drop frames written after the checkpoint being resumed from"""
+    trajectory = directory / 'trajectory.f32'
+    if trajectory.exists():
+        with open(trajectory, 'r+b') as handle:
+            handle.truncate(frames * _frame_bytes(run))
+    observables = directory / 'observables.jsonl'
+    if observables.exists():
+        lines = observables.read_text().splitlines(keepends=True)[:frames]
+        observables.write_text(''.join(lines))
+
+
+def execute(run_id: str, stop: threading.Event = None, progress=None) -> dict:
+    """Run (or continue) a simulation to its requested steps; returns the final run record"""
+    directory = _path(run_id)
+    run = load_run(run_id)
+    simulation = _load_checkpoint(directory)
+    if simulation is None:
+        simulation = Simulation(Params(**run['params']))
+        _truncate_outputs(directory, run, 0)
+    else:
+        _truncate_outputs(directory, run, simulation.step // run['frame_every'] + 1)
+        logger.info(f"Resuming simulation {run_id} from step {simulation.step}")
+
+    def record(**changes):
+        run.update(changes, updated=time.time())
+        _write_json(directory / 'run.json', run)
+
+    def write_frame():
+        frame = simulation.frame(run['frame_beads'], run['frame_crowders'])
+        with open(directory / 'trajectory.f32', 'ab') as handle:
+            handle.write(frame.tobytes())
+        with open(directory / 'observables.jsonl', 'a') as handle:
+            handle.write(json.dumps(simulation.observables()) + '\n')
+
+    def checkpoint(status):
+        _save_checkpoint(directory, simulation)
+        # Resumed runs start with a fresh pair list; so must this one, to stay identical
+        simulation.invalidate_pairs()
+        record(step=simulation.step, status=status)
+
+    stop_file = directory / STOP_FILE
+    record(status=RUNNING, pid=os.getpid(), error=None)
+    try:
+        if simulation.step == 0:
+            write_frame()
+        started, started_step = time.perf_counter(), simulation.step
+        while simulation.step < run['steps']:
+            if stop is not None and stop.is_set() or stop_file.exists():
+                checkpoint(STOPPED)
+                stop_file.unlink(missing_ok=True)
+                return run
+            step = simulation.step
+            next_frame = (step // run['frame_every'] + 1) * run['frame_every']
+            next_checkpoint = (step // run['checkpoint_every'] + 1) * run['checkpoint_every']
+            chunk = min(next_frame, next_checkpoint, run['steps']) - step
+            simulation.run(chunk)
+            if simulation.step % run['frame_every'] == 0:
+                write_frame()
+            if simulation.step % run['checkpoint_every'] == 0 and simulation.step < run['steps']:
+                checkpoint(RUNNING)
+            if progress is not None:
+                progress(chunk)
+        checkpoint(DONE)
+        stop_file.unlink(missing_ok=True)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Simulation {run_id} finished: {simulation.step - started_step} steps in {elapsed:.1f}s")
+        return run
+    except Exception as e:
+        record(status=FAILED, error=f'{type(e).__name__}: {e}')
+        raise
+
+
+def start(run_id: str) -> bool:
+    """Execute a run in a background thread of this process; False if MAX_RUNNING are already running"""
+    from utils import jobs
+
+    run = load_run(run_id)
+    with _running_lock:
+        if len(_running) >= MAX_RUNNING or run_id in _running:
+            return False
+        stop = _running[run_id] = threading.Event()
+    # A stop requested before this start has already been answered
+    (_path(run_id) / STOP_FILE).unlink(missing_ok=True)
+    # Until the thread records "running", pollers should not see it as stopped
+    run.update(status=QUEUED, updated=time.time())
+    _write_json(_path(run_id) / 'run.json', run)
+
+    def work():
+        try:
+            with jobs.start(f'Nucleoid simulation {run_id}', total=run['steps']) as job:
+                job.advance(run['step'])
+                execute(run_id, stop, progress=job.advance)
+        except Exception as e:
+            logger.error(f"Simulation {run_id} failed: {e}")
+        finally:
+            with _running_lock:
+                _running.pop(run_id, None)
+
+    threading.Thread(target=work, name=f'simulation-{run_id}', daemon=True).start()
+    return True
+
+
+def stop(run_id: str) -> bool:
+    """Ask a run to checkpoint and stop, in whichever process it executes; False if it is not executing"""
+    run = load_run(run_id)
+    event = _running.get(run_id)
+    if event is None and (run['status'] not in (QUEUED, RUNNING) or not _alive(run['pid'])):
+        return False
+    (_path(run_id) / STOP_FILE).touch()
+    if event is not None:
+        event.set()
+    return True
+
+
+def frames(run_id: str, start: int = 0, limit: int = 50, stride: int = 1) -> dict:
+    """Frames ``start``, ``start + stride``, ... (at most ``limit``) of a run, for the browser"""
+    run = load_run(run_id)
+    directory = _path(run_id)
+    trajectory = directory / 'trajectory.f32'
+    frame_bytes = _frame_bytes(run)
+    available = trajectory.stat().st_size // frame_bytes if trajectory.exists() else 0
+    indexes = list(range(max(0, start), available, max(1, stride)))[:max(0, limit)]
+    observables = []
+    if indexes:
+        lines = (directory / 'observables.jsonl').read_text().splitlines()
+        observables = [json.loads(lines[index]) if index < len(lines) else None for index in indexes]
+        data = np.memmap(trajectory, dtype=np.float32, mode='r', shape=(available, frame_bytes // 12, 3))
+        points = np.round(np.asarray(data[indexes], dtype=np.float64), 2)
+    chain = run['frame_points']['chain']
+    return {
+        'run': run_id,
+        'available': available,
+        'next': indexes[-1] + max(1, stride) if indexes else max(0, start),
+        'frames': [{'index': index, **(observables[i] or {}),
+                    'chain': points[i, :chain].ravel().tolist(),
+                    'crowders': points[i, chain:].ravel().tolist()}
+                   for i, index in enumerate(indexes)],
+    }
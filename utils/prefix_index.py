@@ -0,0 +1,224 @@
+"""
+In-memory prefix index for compound autocomplete.
+
+Each worker keeps one ``IndexSnapshot``: a sorted list of case-folded terms
+with parallel arrays of compound ids and term kinds. A lookup is a
+``bisect`` into the term list followed by a short forward scan, so it costs
+O(log n + limit) regardless of the table size, with no database access.
+
+Terms are the full name, every later word of a multi-word name (so
+"acid" finds "Acetylsalicylic acid"), and the CAS number. The schema has
+no synonyms column; word terms are the closest substitute until it does.
+
+Snapshots are immutable and swapped atomically. When the data version
+moves (any compound write, in any process), a background thread fetches
+the rows inserted or updated since the snapshot, by id and ``updated_at``
+watermarks, and applies them to a copy with bisect inserts and deletes.
+Large change sets and deletions rebuild the index from scratch instead.
+Deletions are found by the row count and the sum of the compound ids: ids
+only grow, so a deletion changes the sum even when an insert in the same
+window keeps the count.
+Lookups keep using the previous snapshot until the new one is ready.
+
+Memory is roughly 200 bytes per term: a million compounds with CAS numbers
+(two million terms) take about 400 MB per worker, and lookups stay in the
+tens of microseconds at that size.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from utils import data_version
+
+logger = logging.getLogger(__name__)
+
+NAME, WORD, CAS = 0, 1, 2
+KIND_LABELS = ('name', 'word', 'cas_number')
+INCREMENTAL_LIMIT = 500  # changed rows above which a rebuild is cheaper
+MAX_SCAN = 1000          # entries examined per lookup at most
+
+_WORD_SPLIT = re.compile(r'[\s,;()\[\]/]+')
+_indexes = {}  # pid -> PrefixIndex
+_indexes_lock = threading.Lock()
+
+
+def terms(name: str, cas_number: str = None):
+    """(term, kind) pairs indexed for one compound"""
+    if name:
+        yield name.casefold(), NAME
+        for word in _WORD_SPLIT.split(name)[1:]:
+            if len(word) >= 2:
+                yield word.casefold(), WORD
+    if cas_number:
+        yield cas_number.casefold(), CAS
+
+
+class IndexSnapshot:
+    """Immutable sorted term arrays plus the compound details needed to answer"""
+
+    def __init__(self, keys, ids, kinds, compounds, version, max_id, watermark, id_sum):
+        self.keys = keys            # sorted, case-folded terms
+        self.ids = ids              # array of compound ids, parallel to keys
+        self.kinds = kinds          # bytearray of NAME/WORD/CAS, parallel to keys
+        self.compounds = compounds  # id -> (name, cas_number)
+        self.version = version
+        self.max_id = max_id
+        self.watermark = watermark
+        self.id_sum = id_sum        # sum of the keys of ``compounds``
+
+    def search(self, prefix: str, limit: int = 10) -> list:
+        prefix = prefix.casefold()
+        keys, ids, kinds = self.keys, self.ids, self.kinds
+        start = bisect_left(keys, prefix)
+        results, seen = [], set()
+        for position in range(start, min(len(keys), start + MAX_SCAN)):
+            if not keys[position].startswith(prefix) or len(results) >= limit:
+                break
+            compound_id = ids[position]
+            if compound_id in seen:
+                continue
+            seen.add(compound_id)
+            name, cas_number = self.compounds[compound_id]
+            results.append({
+                'id': compound_id,
+                'name': name,
+                'cas_number': cas_number,
+                'match': KIND_LABELS[kinds[position]],
+            })
+        return results
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def _load_rows(after_id=None, since=None):
+    from models.models import Compound
+    from extensions import db
+
+    query = db.session.query(Compound.id, Compound.name, Compound.cas_number, Compound.updated_at)
+    if after_id is not None:
+        query = query.filter(db.or_(Compound.id > after_id, Compound.updated_at >= since))
+    return query.all()
+
+
+def build(version: str) -> IndexSnapshot:
+    """Index every compound (run inside an app context)"""
+    entries, compounds = [], {}
+    max_id, watermark = 0, None
+    for compound_id, name, cas_number, updated_at in _load_rows():
+        compounds[compound_id] = (name, cas_number)
+        entries.extend((term, compound_id, kind) for term, kind in terms(name, cas_number))
+        max_id = max(max_id, compound_id)
+        if updated_at is not None and (watermark is None or updated_at > watermark):
+            watermark = updated_at
+    entries.sort()
+    return IndexSnapshot([term for term, _, _ in entries],
+                         array('q', (compound_id for _, compound_id, _ in entries)),
+                         bytearray(kind for _, _, kind in entries),
+                         compounds, version, max_id, watermark, sum(compounds))
+
+
+def apply_changes(snapshot: IndexSnapshot, rows, version: str):
+    """A new snapshot with changed rows applied, or None if a rebuild is needed"""
+    from models.models import Compound
+    from extensions import db
+
+    changed = [row for row in rows if snapshot.compounds.get(row[0]) != (row[1], row[2])]
+    if len(changed) > INCREMENTAL_LIMIT:
+        return None
+    new_ids = [row[0] for row in rows if row[0] not in snapshot.compounds]
+    id_sum = snapshot.id_sum + sum(new_ids)
+    if (db.session.query(db.func.count(Compound.id), db.func.coalesce(db.func.sum(Compound.id), 0)).one()
+            != (len(snapshot.compounds) + len(new_ids), id_sum)):
+        return None  # something was deleted
+
+    keys, ids, kinds = list(snapshot.keys), array('q', snapshot.ids), bytearray(snapshot.kinds)
+    compounds = dict(snapshot.compounds)
+    for compound_id, name, cas_number, _ in changed:
+        old = compounds.get(compound_id)
+        if old is not None:
+            for term, kind in terms(*old):
+                position = bisect_left(keys, term)
+                while position < len(keys) and keys[position] == term:
+                    if ids[position] == compound_id and kinds[position] == kind:
+                        del keys[position], ids[position], kinds[position]
+                        break
+                    position += 1
+        for term, kind in terms(name, cas_number):
+            position = bisect_left(keys, term)
+            while position < len(keys) and keys[position] == term and ids[position] < compound_id:
+                position += 1
+            keys.insert(position, term)
+            ids.insert(position, compound_id)
+            kinds.insert(position, kind)
+        compounds[compound_id] = (name, cas_number)
+
+    max_id = max([snapshot.max_id] + [row[0] for row in rows])
+    stamps = [row[3] for row in rows if row[3] is not None]
+    watermark = max(stamps + [snapshot.watermark]) if stamps else snapshot.watermark
+    return IndexSnapshot(keys, ids, kinds, compounds, version, max_id, watermark, id_sum)
+
+
+class PrefixIndex:
+    """The worker's current snapshot, refreshed in the background when the data changes"""
+
+    def __init__(self, app):
+        self.app = app
+        self.snapshot = None
+        self._refreshing = threading.Lock()
+
+    def search(self, prefix: str, limit: int = 10) -> list:
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self._refreshing:
+                if self.snapshot is None:
+                    self._refresh()
+            snapshot = self.snapshot
+        elif snapshot.version != data_version.current() and not self._refreshing.locked():
+            threading.Thread(target=self._refresh_in_background, name='prefix-index', daemon=True).start()
+        return snapshot.search(prefix, limit)
+
+    def _refresh_in_background(self):
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            self._refresh()
+        except Exception as e:
+            logger.error(f"Prefix index refresh failed: {e}")
+        finally:
+            self._refreshing.release()
+
+    def _refresh(self):
+        from utils.db_routing import reading
+
+        version = data_version.current()
+        start = time.perf_counter()
+        with self.app.app_context(), reading():
+            snapshot = self.snapshot
+            updated = None
+            if snapshot is not None and snapshot.watermark is not None:
+                rows = _load_rows(after_id=snapshot.max_id, since=snapshot.watermark)
+                updated = apply_changes(snapshot, rows, version)
+            if updated is None:
+                updated = build(version)
+                logger.info(f"Built compound prefix index: {len(updated)} terms in "
+                            f"{time.perf_counter() - start:.2f}s")
+        self.snapshot = updated
+
+
+def get_index(app) -> PrefixIndex:
+    """This worker's prefix index (built on first use)"""
+    pid = os.getpid()
+    index = _indexes.get(pid)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(pid)
+            if index is None:
+                _indexes.clear()  # a forked child builds its own
+                index = _indexes[pid] = PrefixIndex(app)
+    return index
@@ -0,0 +1,108 @@
+"""
+Low-overhead sampling profiler producing collapsed stacks for flamegraphs.
+
+A background thread periodically snapshots the stacks of every other thread
+with ``sys._current_frames()`` and counts identical stacks. The output is the
+"collapsed" format understood by flamegraph.pl, speedscope and inferno:
+one ``thread;outer;...;inner count`` line per distinct stack.
+
+The sampler only sees threads of its own process. To profile a busy gunicorn
+worker through the HTTP endpoint, run it with threaded workers (``--threads``)
+so the profiling request does not block the requests being sampled.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from paths import LOGS_DIR
+
+DEFAULT_RATE = 100  # samples per second
+MAX_RATE = 1000
+
+
+class StackSampler:
+    """Samples all thread stacks of the current process at a fixed rate"""
+
+    def __init__(self, rate: int = DEFAULT_RATE, max_depth: int = 128):
+        self.interval = 1.0 / max(1, min(rate, MAX_RATE))
+        self.max_depth = max_depth
+        self.counts = Counter()
+        self.samples = 0
+        self._labels = {}  # code object -> frame label
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+        return label
+
+    def _sample(self, own_ident: int, names: dict):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f'thread-{ident}'))
+            stack.reverse()
+            self.counts[';'.join(stack)] += 1
+        self.samples += 1
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self._sample(own_ident, names)
+            next_tick += self.interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_tick = time.perf_counter()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def collapsed(self) -> str:
+        """Return the samples in collapsed-stack format, heaviest stacks first"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.counts.most_common())
+
+
+def profile_for(seconds: float, rate: int = DEFAULT_RATE) -> StackSampler:
+    """Sample this process for a number of seconds and return the sampler"""
+    sampler = StackSampler(rate=rate).start()
+    time.sleep(seconds)
+    return sampler.stop()
+
+
+def save_profile(collapsed: str, label: str = 'profile') -> str:
+    """Write collapsed stacks under LOGS_DIR and return the file path"""
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = LOGS_DIR / f'{label}-{os.getpid()}-{timestamp}.collapsed'
+    path.write_text(collapsed)
+    return str(path)
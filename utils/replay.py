@@ -0,0 +1,184 @@
+"""
+Replay recorded access logs to reproduce production traffic shapes locally.
+
+Entries are dispatched at their recorded offsets divided by the speed-up
+factor (``speed=0`` sends as fast as the workers allow) onto a fixed pool of
+worker threads. Requests go either straight into the WSGI app through
+per-thread test clients, or over HTTP to a running server. Only GET and HEAD
+requests are replayed because the access log does not record bodies.
+"""
+
+import http.client
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from werkzeug.exceptions import HTTPException
+
+REPLAYABLE_METHODS = ('GET', 'HEAD')
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class InProcessTarget:
+    """Sends requests into a Flask app, one test client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, method: str, url: str) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(url, method=method)
+        response.close()
+        return response.status_code
+
+
+class HTTPTarget:
+    """Sends requests to a running server over keep-alive connections"""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.secure = parts.scheme == 'https'
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def send(self, method: str, url: str) -> int:
+        conn = self._connection()
+        try:
+            conn.request(method, self.prefix + url)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect once; the server may have closed an idle connection
+            conn.close()
+            self._local.conn = None
+            conn = self._connection()
+            conn.request(method, self.prefix + url)
+            response = conn.getresponse()
+            response.read()
+        return response.status
+
+
+class RouteStats:
+    """Latencies and status codes collected for one route"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+
+    def add(self, latency: float, status):
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == 'error' or status >= 500:
+            self.errors += 1
+
+
+def route_resolver(app):
+    """Return a function mapping a path to its URL rule, so /compounds/1 and /compounds/2 group together"""
+    adapter = app.url_map.bind('localhost')
+    known = {}
+
+    def resolve(method: str, path: str) -> str:
+        key = (method, path)
+        route = known.get(key)
+        if route is None:
+            try:
+                rule, _ = adapter.match(path, method=method, return_rule=True)
+                route = rule.rule
+            except HTTPException:
+                route = '<unmatched>'
+            if len(known) < 100000:
+                known[key] = route
+        return route
+
+    return resolve
+
+
+def replay(entries, target, resolve, concurrency: int = 8, speed: float = 1.0, limit: int = None) -> dict:
+    """
+    Replay access log entries against a target and return per-route statistics:
+    {'routes': {route: RouteStats}, 'elapsed': seconds, 'sent': n, 'skipped': n}
+    """
+    routes = {}
+    lock = threading.Lock()
+    # Bound the backlog so a fast dispatcher does not queue the whole log in memory
+    slots = threading.BoundedSemaphore(concurrency * 4)
+    skipped = 0
+    sent = 0
+
+    def run(method, url, route):
+        start = time.perf_counter()
+        try:
+            status = target.send(method, url)
+        except Exception:
+            status = 'error'
+        latency = time.perf_counter() - start
+        with lock:
+            routes.setdefault(route, RouteStats()).add(latency, status)
+        slots.release()
+
+    started = time.perf_counter()
+    first_timestamp = None
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay') as pool:
+        for entry in entries:
+            if limit is not None and sent >= limit:
+                break
+            if entry['method'] not in REPLAYABLE_METHODS:
+                skipped += 1
+                continue
+            if first_timestamp is None:
+                first_timestamp = entry['timestamp']
+            if speed > 0:
+                delay = (entry['timestamp'] - first_timestamp) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            url = entry['path'] + (f"?{entry['query']}" if entry['query'] else '')
+            slots.acquire()
+            pool.submit(run, entry['method'], url, resolve(entry['method'], entry['path']))
+            sent += 1
+
+    return {'routes': routes, 'elapsed': time.perf_counter() - started, 'sent': sent, 'skipped': skipped}
+
+
+def format_report(result: dict) -> str:
+    """Render replay statistics as a table of per-route latency percentiles and throughput"""
+    elapsed = result['elapsed'] or 1e-9
+    lines = [f'{"route":<40} {"count":>7} {"errors":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>9}']
+    total = []
+    errors = 0
+    for route, stats in sorted(result['routes'].items(), key=lambda item: -len(item[1].latencies)):
+        latencies = sorted(stats.latencies)
+        total.extend(latencies)
+        errors += stats.errors
+        lines.append(f'{route[:40]:<40} {len(latencies):>7} {stats.errors:>6} '
+                     f'{percentile(latencies, 0.50) * 1000:>9.2f} {percentile(latencies, 0.95) * 1000:>9.2f} '
+                     f'{percentile(latencies, 0.99) * 1000:>9.2f} {len(latencies) / elapsed:>9.1f}')
+    total.sort()
+    lines.append(f'{"TOTAL":<40} {len(total):>7} {errors:>6} '
+                 f'{percentile(total, 0.50) * 1000:>9.2f} {percentile(total, 0.95) * 1000:>9.2f} '
+                 f'{percentile(total, 0.99) * 1000:>9.2f} {len(total) / elapsed:>9.1f}')
+    lines.append(f'Replayed {result["sent"]} requests in {result["elapsed"]:.2f}s '
+                 f'({result["skipped"]} non-GET entries skipped)')
+    return '\n'.join(lines)
@@ -0,0 +1,215 @@
+"""
+Content-addressed result cache shared by peers and server-side jobs.
+
+Results are keyed by sha256(input + NUL + kernel version), stored on disk in a
+two-level sharded layout (``ab/cd/<key>.json``) and fronted by a small
+in-memory hot tier. Both tiers are bounded by bytes and evicted in LRU order.
+
+Results published by peers are only stored after ``verify`` recomputes them
+with the server's copy of the kernel (VERIFIERS), since entries are served
+as immutable and a wrong one would otherwise stick in every client cache.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+
+from utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def result_key(data, kernel_version: str) -> str:
+    """Return the cache key for an input payload computed by a kernel version"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    digest = hashlib.sha256(data)
+    digest.update(b'\x00')
+    digest.update(kernel_version.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def is_valid_key(key: str) -> bool:
+    """Check that a key looks like a lowercase hex sha256 digest"""
+    return bool(KEY_PATTERN.match(key or ''))
+
+
+def _gc_content_v1(sequence: str) -> str:
+    # Mirrors gcContent in static/js/result_cache.js: uppercase G/C only, lengths in
+    # UTF-16 code units and toFixed(2) rounding, so the strings match exactly
+    length = len(sequence.encode('utf-16-le')) // 2
+    gc_count = sequence.count('G') + sequence.count('C')
+    percent = Decimal(gc_count / length * 100).quantize(Decimal('0.01'), ROUND_HALF_UP)
+    return f'GC content: {percent}% ({gc_count}/{length} nucleotides)'
+
+
+# kernel version -> function computing the result of an input, as the browser does
+VERIFIERS = {
+    'gc_content/1': _gc_content_v1,
+}
+
+
+def verify(data: str, kernel_version: str, result) -> bool:
+    """True if the server's copy of the kernel computes ``result`` from ``data``"""
+    kernel = VERIFIERS.get(kernel_version)
+    if kernel is None or not data:
+        return False
+    return kernel(data) == result
+
+
+class ResultCache:
+    """Two-tier (memory + sharded disk) LRU store for computation results"""
+
+    def __init__(self, root, max_bytes: int = 256 * 1024 * 1024,
+                 hot_bytes: int = 16 * 1024 * 1024, rescan_interval: float = 300.0):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hot_bytes = hot_bytes
+        self.rescan_interval = rescan_interval
+
+        self._lock = threading.Lock()
+        self._hot = OrderedDict()  # key -> payload bytes, least recently used first
+        self._hot_size = 0
+        self._index = None  # key -> size on disk, least recently used first
+        self._disk_size = 0
+        self._scanned_at = 0.0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / f'{key}.json'
+
+    def _scan(self):
+        """Rebuild the disk index from the shard tree, oldest entries first"""
+        entries = []
+        if self.root.exists():
+            for first in os.scandir(self.root):
+                if not first.is_dir():
+                    continue
+                for second in os.scandir(first.path):
+                    if not second.is_dir():
+                        continue
+                    for entry in os.scandir(second.path):
+                        if entry.name.endswith('.json'):
+                            stat = entry.stat()
+                            entries.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._disk_size = sum(size for _, _, size in entries)
+        self._scanned_at = time.monotonic()
+
+    def _ensure_index(self):
+        # Other workers write into the same tree, so the index is refreshed
+        # periodically to keep the disk budget honest across processes.
+        if self._index is None or time.monotonic() - self._scanned_at > self.rescan_interval:
+            self._scan()
+
+    def _remember_hot(self, key: str, payload: bytes):
+        if len(payload) > self.hot_bytes:
+            return
+        previous = self._hot.pop(key, None)
+        if previous is not None:
+            self._hot_size -= len(previous)
+        self._hot[key] = payload
+        self._hot_size += len(payload)
+        while self._hot_size > self.hot_bytes:
+            _, evicted = self._hot.popitem(last=False)
+            self._hot_size -= len(evicted)
+
+    def _evict_disk(self):
+        while self._disk_size > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._disk_size -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+            dropped = self._hot.pop(key, None)
+            if dropped is not None:
+                self._hot_size -= len(dropped)
+
+    def get(self, key: str):
+        """Return the stored payload bytes for a key, or None on a miss"""
+        with self._lock:
+            payload = self._hot.get(key)
+            if payload is not None:
+                self._hot.move_to_end(key)
+                record_cache('result_hot', True)
+                return payload
+
+        path = self._path(key)
+        try:
+            payload = path.read_bytes()
+        except FileNotFoundError:
+            record_cache('result_disk', False)
+            return None
+        record_cache('result_disk', True)
+
+        # Touching the file keeps the on-disk LRU order visible to other workers
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        with self._lock:
+            if self._index is not None:
+                if key not in self._index:
+                    self._disk_size += len(payload)
+                self._index[key] = len(payload)
+                self._index.move_to_end(key)
+            self._remember_hot(key, payload)
+        return payload
+
+    def put(self, key: str, payload: bytes) -> bool:
+        """Store a payload under a key. Returns False if it was already cached."""
+        path = self._path(key)
+        if path.exists():
+            return False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{key}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._ensure_index()
+            if key not in self._index:
+                self._disk_size += len(payload)
+            self._index[key] = len(payload)
+            self._index.move_to_end(key)
+            self._remember_hot(key, payload)
+            self._evict_disk()
+        return True
+
+    def get_or_compute(self, data, kernel_version: str, compute):
+        """Return the cached result for an input, running ``compute()`` on a miss"""
+        key = result_key(data, kernel_version)
+        payload = self.get(key)
+        if payload is not None:
+            try:
+                return json.loads(payload)['result']
+            except (ValueError, KeyError):
+                logger.warning(f"Discarding unreadable cached result {key}")
+
+        result = compute()
+        self.put(key, json.dumps({'result': result}, separators=(',', ':')).encode('utf-8'))
+        return result
+
+    def stats(self) -> dict:
+        """Return a summary of both cache tiers"""
+        with self._lock:
+            self._ensure_index()
+            return {
+                'hot_entries': len(self._hot),
+                'hot_bytes': self._hot_size,
+                'disk_entries': len(self._index),
+                'disk_bytes': self._disk_size,
+                'max_bytes': self.max_bytes,
+            }
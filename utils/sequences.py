@@ -0,0 +1,293 @@
+"""
+Stored DNA sequences and their multi-resolution metric pyramids.
+
+A sequence is stored under SEQUENCES_DIR/<id>/, where the id is the start
+of the SHA-256 of its bases, so uploading the same sequence twice stores it
+once. The directory holds:
+
+- ``sequence.bin``: the bases, upper-cased, one byte each (the 1 bp level)
+- ``level-<bin>.u32``: per-bin base counts (A, C, G, T, other) as rows of
+  five uint32, for bins of 16 bp, 64 bp, ... up to 4**10 = 1,048,576 bp
+- ``meta.json``: name, length and the levels
+
+Everything is built in one streaming pass over FASTA input, in chunks that
+are a multiple of the largest bin so every level's bins close inside a
+chunk; memory does not grow with the genome. The levels add about 1.7
+bytes per base on top of the sequence itself.
+
+``track`` answers a region at a given pixel width from the coarsest level
+whose bins are no wider than a pixel. It memory-maps that level and reads
+only the rows covering the region (at most four per pixel), so the work
+and the response size depend on ``px``, not on the region length. Regions
+narrower than 16 bp per pixel are counted from the bases directly. The rows
+at either end of the region usually overhang it; those are recounted from
+finer levels (at most three rows each) and, below 16 bp, from the bases, so
+every bucket counts exactly the bases between its reported start and end.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+from paths import SEQUENCES_DIR
+
+logger = logging.getLogger(__name__)
+
+FACTOR = 4
+LEVELS = tuple(FACTOR ** power for power in range(2, 11))  # 16 bp .. 1 Mbp
+CHUNK = LEVELS[-1]
+CLASSES = 5  # A, C, G, T, other
+MAX_PIXELS = 10000
+
+# Byte -> base class; anything that is not a letter is dropped while parsing
+_CLASS = np.full(256, 4, dtype=np.uint8)
+for _index, _base in enumerate(b'ACGT'):
+    _CLASS[_base] = _index
+_DROP = bytes(range(256)).translate(None, bytes(range(ord('A'), ord('Z') + 1)) + bytes(range(ord('a'), ord('z') + 1)))
+
+
+class SequenceError(ValueError):
+    """The input is not a single-record FASTA or plain sequence"""
+
+
+def _path(sequence_id: str):
+    if not sequence_id.isalnum():
+        raise KeyError(sequence_id)
+    return SEQUENCES_DIR / sequence_id
+
+
+def _bin_counts(classes: np.ndarray, size: int) -> np.ndarray:
+    """(bins, 5) counts of ``classes`` in bins of ``size``; the last bin may be partial"""
+    bins = -(-len(classes) // size)
+    index = np.arange(len(classes), dtype=np.int64) // size * CLASSES + classes
+    return np.bincount(index, minlength=bins * CLASSES).reshape(bins, CLASSES).astype(np.uint32)
+
+
+class _PyramidWriter:
+    """Appends bases and level rows chunk by chunk"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.sequence = open(directory / 'sequence.bin', 'wb')
+        self.levels = {size: open(directory / f'level-{size}.u32', 'wb') for size in LEVELS}
+        self.digest = hashlib.sha256()
+        self.length = 0
+        self.pending = bytearray()
+
+    def write(self, bases: bytes):
+        self.pending += bases
+        if len(self.pending) >= CHUNK:
+            whole = len(self.pending) // CHUNK * CHUNK
+            self._flush(bytes(self.pending[:whole]))
+            del self.pending[:whole]
+
+    def _flush(self, bases: bytes):
+        self.sequence.write(bases)
+        self.digest.update(bases)
+        self.length += len(bases)
+        counts = _bin_counts(_CLASS[np.frombuffer(bases, dtype=np.uint8)], LEVELS[0])
+        for size in LEVELS:
+            if size != LEVELS[0]:
+                # Bins of this level are sums of FACTOR bins of the level below
+                rows = -(-len(counts) // FACTOR)
+                padded = np.zeros((rows * FACTOR, CLASSES), dtype=np.uint32)
+                padded[:len(counts)] = counts
+                counts = padded.reshape(rows, FACTOR, CLASSES).sum(axis=1, dtype=np.uint32)
+            self.levels[size].write(counts.tobytes())
+
+    def close(self):
+        if self.pending:
+            self._flush(bytes(self.pending))
+            self.pending.clear()
+        for handle in (self.sequence, *self.levels.values()):
+            handle.close()
+
+
+def store(chunks, name: str = None, progress=None) -> dict:
+    """
+    Store a sequence from an iterable of byte chunks (FASTA with one record,
+    or bare bases) and build its pyramid. Returns the sequence's metadata.
+    """
+    SEQUENCES_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_dir = SEQUENCES_DIR / f'.upload-{uuid.uuid4().hex}'
+    tmp_dir.mkdir()
+    try:
+        writer = _PyramidWriter(tmp_dir)
+        try:
+            header, records, line_start, partial = None, 0, True, b''
+            for chunk in chunks:
+                if progress is not None:
+                    progress(len(chunk))
+                data = partial + chunk
+                # Keep an unfinished header line for the next chunk
+                last_newline = data.rfind(b'\n')
+                if b'>' in data[last_newline + 1:]:
+                    data, partial = data[:last_newline + 1], data[last_newline + 1:]
+                else:
+                    partial = b''
+                for line in data.splitlines(keepends=True):
+                    if line_start and line.startswith(b'>'):
+                        records += 1
+                        if records > 1:
+                            raise SequenceError('Only one FASTA record per sequence is supported')
+                        header = line[1:].strip().decode('utf-8', 'replace')
+                    else:
+                        writer.write(line.translate(None, _DROP).upper())
+                    line_start = line.endswith((b'\n', b'\r'))
+            if partial.startswith(b'>') and line_start:
+                records += 1
+                if records > 1:
+                    raise SequenceError('Only one FASTA record per sequence is supported')
+                header = partial[1:].strip().decode('utf-8', 'replace')
+            elif partial:
+                writer.write(partial.translate(None, _DROP).upper())
+        finally:
+            writer.close()
+        if writer.length == 0:
+            raise SequenceError('The sequence is empty')
+
+        sequence_id = writer.digest.hexdigest()[:16]
+        meta = {
+            'id': sequence_id,
+            'name': name or header or sequence_id,
+            'length': writer.length,
+            'levels': [1, *LEVELS],
+            'sha256': writer.digest.hexdigest(),
+        }
+        (tmp_dir / 'meta.json').write_text(json.dumps(meta))
+        target = SEQUENCES_DIR / sequence_id
+        try:
+            os.rename(tmp_dir, target)
+        except OSError:
+            if not (target / 'meta.json').exists():
+                raise
+            logger.info(f"Sequence {sequence_id} is already stored")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return load_meta(sequence_id)
+        logger.info(f"Stored sequence {sequence_id} ({meta['name']}, {meta['length']} bp)")
+        return meta
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def store_file(path, name: str = None, chunk_size: int = 4 * 1024 * 1024, progress=None) -> dict:
+    """Store a FASTA file from disk"""
+    with open(path, 'rb') as handle:
+        return store(iter(lambda: handle.read(chunk_size), b''), name, progress)
+
+
+def load_meta(sequence_id: str) -> dict:
+    """Metadata of a stored sequence; raises KeyError if there is none"""
+    try:
+        return json.loads((_path(sequence_id) / 'meta.json').read_text())
+    except FileNotFoundError:
+        raise KeyError(sequence_id)
+
+
+def list_sequences() -> list:
+    if not SEQUENCES_DIR.is_dir():
+        return []
+    found = []
+    for entry in SEQUENCES_DIR.iterdir():
+        if not entry.name.startswith('.'):
+            try:
+                found.append(load_meta(entry.name))
+            except (KeyError, ValueError):
+                continue
+    return sorted(found, key=lambda meta: meta['name'])
+
+
+def bases(sequence_id: str, start: int = 0, end: int = None) -> bytes:
+    """The bases of [start, end) of a stored sequence"""
+    meta = load_meta(sequence_id)
+    end = meta['length'] if end is None else min(end, meta['length'])
+    with open(_path(sequence_id) / 'sequence.bin', 'rb') as handle:
+        handle.seek(max(0, start))
+        return handle.read(max(0, end - max(0, start)))
+
+
+def _rows(directory, size: int, length: int, first: int, last: int) -> np.ndarray:
+    """Rows first..last-1 of a level, memory-mapped so only those pages are read"""
+    rows = -(-length // size)
+    level = np.memmap(directory / f'level-{size}.u32', dtype=np.uint32, mode='r', shape=(rows, CLASSES))
+    return np.array(level[first:last])
+
+
+def _span_counts(directory, length: int, lo: int, hi: int) -> np.ndarray:
+    """Counts of the bases in [lo, hi), from the widest whole bins inside it plus the bases at either end"""
+    if hi <= lo:
+        return np.zeros(CLASSES, dtype=np.uint32)
+    for size in reversed(LEVELS):
+        first, last = -(-lo // size), hi // size
+        if first < last:
+            inner = _rows(directory, size, length, first, last).sum(axis=0, dtype=np.uint32)
+            return (inner + _span_counts(directory, length, lo, first * size)
+                    + _span_counts(directory, length, last * size, hi))
+    bases = np.memmap(directory / 'sequence.bin', dtype=np.uint8, mode='r', shape=(length,))
+    return np.bincount(_CLASS[np.asarray(bases[lo:hi])], minlength=CLASSES).astype(np.uint32)
+
+
+def track(sequence_id: str, start: int, end: int, px: int) -> dict:
+    """Base composition metrics of [start, end) in at most ``px`` buckets"""
+    meta = load_meta(sequence_id)
+    directory = _path(sequence_id)
+    start, end = max(0, start), min(meta['length'], end)
+    if end <= start:
+        raise ValueError('The region is empty')
+    px = max(1, min(px, MAX_PIXELS, end - start))
+    per_pixel = (end - start) / px
+    size = max((level for level in LEVELS if level <= per_pixel), default=1)
+
+    if size == 1:
+        bases = np.memmap(directory / 'sequence.bin', dtype=np.uint8, mode='r', shape=(meta['length'],))
+        counts = _bin_counts(_CLASS[np.asarray(bases[start:end])], 1)
+        starts = np.arange(start, end, dtype=np.int64)
+    else:
+        first, last = start // size, -(-end // size)
+        counts = _rows(directory, size, meta['length'], first, last)
+        starts = np.arange(first, last, dtype=np.int64) * size
+        # Keep only the part of the end rows inside the region
+        if starts[0] < start or starts[0] + size > end:
+            counts[0] = _span_counts(directory, meta['length'], start, min(starts[0] + size, end))
+        if len(counts) > 1 and min(starts[-1] + size, meta['length']) > end:
+            counts[-1] = _span_counts(directory, meta['length'], starts[-1], end)
+    # Bucket of each row by the position of its start (the first row may begin before the region)
+    buckets = (np.maximum(starts, start) - start) * px // (end - start)
+    edges = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    totals = np.add.reduceat(counts, edges, axis=0).astype(np.float64)
+    bucket_starts = np.maximum(starts[edges], start)
+    bucket_ends = np.r_[bucket_starts[1:], end]
+
+    a, c, g, t, other = totals.T
+    acgt = a + c + g + t
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gc = np.where(acgt > 0, (g + c) / acgt, np.nan)
+        gc_skew = np.where(g + c > 0, (g - c) / (g + c), np.nan)
+        at_skew = np.where(a + t > 0, (a - t) / (a + t), np.nan)
+    n_fraction = other / (acgt + other)
+
+    def column(values):
+        return [None if np.isnan(value) else value for value in np.round(values, 4).tolist()]
+
+    return {
+        'id': sequence_id,
+        'start': start,
+        'end': end,
+        'px': px,
+        'level': size,
+        'bp_per_bucket': round(per_pixel, 3),
+        'buckets': {
+            'start': bucket_starts.tolist(),
+            'end': bucket_ends.tolist(),
+            'gc': column(gc),
+            'gc_skew': column(gc_skew),
+            'at_skew': column(at_skew),
+            'n_fraction': column(n_fraction),
+        },
+    }
@@ -0,0 +1,307 @@
+"""
+Cross-process cache backend for Flask-Caching, stored in SQLite.
+
+Every gunicorn worker on a host opens the same WAL-mode database file, so a
+value computed by one worker is a hit for all of them. Entries carry per-key
+TTLs and are evicted least-recently-used first once the stored bytes exceed
+``CACHE_MAX_BYTES``. ``get_or_set`` adds single-flight recomputation: a cold
+key is computed by one caller while the others (in any process) wait for it.
+"""
+
+import functools
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask_caching.backends.base import BaseCache
+
+from utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed ON cache_entries (accessed);
+    CREATE TABLE IF NOT EXISTS cache_locks (
+        key TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS cache_meta (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO cache_meta (name, value) VALUES ('total_bytes', 0);
+    CREATE TRIGGER IF NOT EXISTS cache_entries_insert AFTER INSERT ON cache_entries BEGIN
+        UPDATE cache_meta SET value = value + NEW.size WHERE name = 'total_bytes';
+    END;
+    CREATE TRIGGER IF NOT EXISTS cache_entries_update AFTER UPDATE OF size ON cache_entries BEGIN
+        UPDATE cache_meta SET value = value - OLD.size + NEW.size WHERE name = 'total_bytes';
+    END;
+    CREATE TRIGGER IF NOT EXISTS cache_entries_delete AFTER DELETE ON cache_entries BEGIN
+        UPDATE cache_meta SET value = value - OLD.size WHERE name = 'total_bytes';
+    END;
+'''
+
+
+class SQLiteCache(BaseCache):
+    """Flask-Caching backend shared by all processes that open the same file"""
+
+    # Last-access times are only rewritten when older than this, so hot keys
+    # do not turn every read into a write transaction.
+    TOUCH_INTERVAL = 1.0
+    EVICT_BATCH = 32
+    LOCK_STRIPES = 64
+
+    def __init__(self, path, default_timeout=300, max_bytes=64 * 1024 * 1024,
+                 key_prefix='', lock_timeout=30.0, poll_interval=0.02):
+        super().__init__(default_timeout=default_timeout)
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.key_prefix = key_prefix
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+        self._local = threading.local()
+        self._stripes = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._schema_ready = False
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            path=config['CACHE_SQLITE_PATH'],
+            max_bytes=config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024),
+            key_prefix=config['CACHE_KEY_PREFIX']
+        )
+        return cls(*args, **kwargs)
+
+    # -- connection handling -------------------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections are per thread and per process; a forked worker must
+        # never reuse the parent's handle.
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.lock_timeout, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if not self._schema_ready:
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _key(self, key: str) -> str:
+        return f'{self.key_prefix}{key}'
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else None
+
+    # -- core lookups ----------------------------------------------------------
+
+    def _lookup(self, key: str):
+        """Return the cached value for a prefixed key, or _MISSING"""
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT value, expires, accessed FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return _MISSING
+
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            conn.execute('DELETE FROM cache_entries WHERE key = ? AND expires <= ?', (key, now))
+            return _MISSING
+        if now - accessed > self.TOUCH_INTERVAL:
+            conn.execute('UPDATE cache_entries SET accessed = ? WHERE key = ?', (now, key))
+
+        try:
+            return pickle.loads(value)
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {e}")
+            conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+            return _MISSING
+
+    def _store(self, key: str, value, timeout, only_if_absent=False) -> bool:
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return False
+
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if only_if_absent:
+                # Expired rows count as absent
+                cursor = conn.execute('''
+                    INSERT INTO cache_entries (key, value, size, expires, accessed)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        value = excluded.value, size = excluded.size,
+                        expires = excluded.expires, accessed = excluded.accessed
+                    WHERE cache_entries.expires IS NOT NULL AND cache_entries.expires <= ?
+                ''', (key, data, len(data), self._expires(timeout), now, now))
+            else:
+                cursor = conn.execute('''
+                    INSERT INTO cache_entries (key, value, size, expires, accessed)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        value = excluded.value, size = excluded.size,
+                        expires = excluded.expires, accessed = excluded.accessed
+                ''', (key, data, len(data), self._expires(timeout), now))
+            stored = cursor.rowcount > 0
+            if stored:
+                self._evict(conn, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return stored
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used ones, until under budget"""
+        total = conn.execute("SELECT value FROM cache_meta WHERE name = 'total_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        conn.execute('DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?', (now,))
+        while True:
+            total = conn.execute("SELECT value FROM cache_meta WHERE name = 'total_bytes'").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            cursor = conn.execute('''
+                DELETE FROM cache_entries WHERE key IN (
+                    SELECT key FROM cache_entries ORDER BY accessed LIMIT ?
+                )
+            ''', (self.EVICT_BATCH,))
+            if cursor.rowcount == 0:
+                return
+
+    # -- cachelib API ----------------------------------------------------------
+
+    def get(self, key):
+        value = self._lookup(self._key(key))
+        record_cache('shared', value is not _MISSING)
+        return None if value is _MISSING else value
+
+    def has(self, key):
+        return self._lookup(self._key(key)) is not _MISSING
+
+    def set(self, key, value, timeout=None):
+        return self._store(self._key(key), value, timeout)
+
+    def add(self, key, value, timeout=None):
+        return self._store(self._key(key), value, timeout, only_if_absent=True)
+
+    def delete(self, key):
+        cursor = self._connection().execute('DELETE FROM cache_entries WHERE key = ?', (self._key(key),))
+        return cursor.rowcount > 0
+
+    def clear(self):
+        conn = self._connection()
+        if self.key_prefix:
+            pattern = self.key_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conn.execute("DELETE FROM cache_entries WHERE key LIKE ? ESCAPE '\\'", (pattern,))
+        else:
+            conn.execute('DELETE FROM cache_entries')
+        return True
+
+    # -- single-flight -----------------------------------------------------------
+
+    def _acquire_flight(self, key: str, owner: str) -> bool:
+        now = time.time()
+        cursor = self._connection().execute('''
+            INSERT INTO cache_locks (key, owner, expires) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+            WHERE cache_locks.expires <= ?
+        ''', (key, owner, now + self.lock_timeout, now))
+        return cursor.rowcount > 0
+
+    def _release_flight(self, key: str, owner: str):
+        self._connection().execute('DELETE FROM cache_locks WHERE key = ? AND owner = ?', (key, owner))
+
+    def get_or_set(self, key, compute, timeout=None):
+        """Return the cached value for key, computing it at most once across processes"""
+        full_key = self._key(key)
+        value = self._lookup(full_key)
+        record_cache('shared', value is not _MISSING)
+        if value is not _MISSING:
+            return value
+
+        # Threads in this process queue on a striped lock; other processes
+        # coordinate through a lease row in cache_locks.
+        with self._stripes[hash(full_key) % self.LOCK_STRIPES]:
+            value = self._lookup(full_key)
+            if value is not _MISSING:
+                return value
+
+            owner = f'{os.getpid()}:{uuid.uuid4().hex}'
+            deadline = time.monotonic() + self.lock_timeout
+            while not self._acquire_flight(full_key, owner):
+                time.sleep(self.poll_interval)
+                value = self._lookup(full_key)
+                if value is not _MISSING:
+                    return value
+                if time.monotonic() > deadline:
+                    logger.warning(f"Timed out waiting for cache key {key}; computing locally")
+                    return compute()
+
+            try:
+                value = compute()
+                self._store(full_key, value, timeout)
+                return value
+            finally:
+                self._release_flight(full_key, owner)
+
+
+def cached(timeout=None, key_prefix='data/'):
+    """
+    Cache a function's return value in the shared cache, keyed by its arguments
+    and the current data version, so any data write invalidates it. Concurrent
+    misses for the same key are collapsed into a single computation.
+    """
+    def decorator(f):
+        name = f'{key_prefix}{f.__module__}.{f.__qualname__}'
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            from extensions import cache
+            from utils.data_version import current
+
+            key = f'{name}@{current()}'
+            if args or kwargs:
+                key = f'{key}:{args!r}:{sorted(kwargs.items())!r}'
+
+            backend = cache.cache
+            compute = functools.partial(f, *args, **kwargs)
+            if hasattr(backend, 'get_or_set'):
+                return backend.get_or_set(key, compute, timeout)
+
+            # Fallback for backends without single-flight support (e.g. in tests)
+            value = backend.get(key)
+            if value is None:
+                value = compute()
+                backend.set(key, value, timeout)
+            return value
+
+        wrapper.uncached = f
+        return wrapper
+    return decorator
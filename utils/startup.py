@@ -0,0 +1,125 @@
+"""
+Startup instrumentation: import-time and phase timings.
+
+``ImportTimer`` wraps ``builtins.__import__`` and records, for every module
+imported for the first time, how long its import took including (cumulative)
+and excluding (self) the imports it triggered. ``phase()`` times named steps
+of app creation. Both are free when profiling is off.
+
+Enable with ``--profile-startup`` on the CLI, or ``PROFILE_STARTUP=1`` for
+gunicorn workers (the report is logged once each worker has booted).
+
+This module is imported before anything heavy, so it must only use the
+standard library.
+"""
+
+import builtins
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_phases = []
+_enabled = os.environ.get('PROFILE_STARTUP') == '1'
+
+
+class ImportTimer:
+    """Records first-time module imports with self and cumulative durations"""
+
+    def __init__(self):
+        self.records = []  # (module, self seconds, cumulative seconds, depth)
+        self._stack = []
+        self._original = None
+        self._thread = None
+        self.started = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Only time the importing thread, and only modules not loaded yet
+        # (``from package import submodule`` counts as loading the submodule)
+        if threading.get_ident() != self._thread or level:
+            return self._original(name, globals, locals, fromlist, level)
+        module = sys.modules.get(name)
+        if module is not None:
+            missing = [item for item in fromlist or () if item != '*' and item not in vars(module)]
+            if not missing:
+                return self._original(name, globals, locals, fromlist, level)
+            label = f'{name}.{missing[0]}'
+        else:
+            label = name
+
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.records.append((label, elapsed - children, elapsed, len(self._stack)))
+
+    def start(self):
+        if self._original is None:
+            self.started = time.perf_counter()
+            self._thread = threading.get_ident()
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+        return self
+
+    def stop(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+        return self
+
+    def report(self, top: int = 25) -> str:
+        """Slowest imports by cumulative time, as a text table"""
+        lines = [f'{"module":<50} {"self ms":>9} {"cumul. ms":>10}']
+        for name, own, total, depth in sorted(self.records, key=lambda r: -r[2])[:top]:
+            lines.append(f'{("  " * min(depth, 4) + name)[:50]:<50} {own * 1000:>9.1f} {total * 1000:>10.1f}')
+        top_level = sum(total for _, _, total, depth in self.records if depth == 0)
+        lines.append(f'{len(self.records)} modules imported, {top_level * 1000:.1f} ms in top-level imports')
+        return '\n'.join(lines)
+
+
+import_timer = ImportTimer()
+
+
+def enable():
+    """Start recording imports and phases from now on"""
+    global _enabled
+    _enabled = True
+    import_timer.start()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def phase(name: str):
+    """Time a named startup step (no-op unless profiling is enabled)"""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, time.perf_counter() - start))
+
+
+def report(top: int = 25) -> str:
+    """Phase timings followed by the slowest imports"""
+    lines = ['Startup phases:']
+    lines.extend(f'  {name:<30} {elapsed * 1000:>9.1f} ms' for name, elapsed in _phases)
+    if import_timer.started is not None:
+        lines.append(f'  {"total since profiling began":<30} {(time.perf_counter() - import_timer.started) * 1000:>9.1f} ms')
+    lines.append('')
+    lines.append(import_timer.report(top))
+    return '\n'.join(lines)
+
+
+if _enabled:
+    import_timer.start()
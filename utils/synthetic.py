@@ -0,0 +1,207 @@
+"""
+Synthetic compound generator for load testing and benchmarks.
+
+Produces deterministic (seeded) compounds in the same shape that
+``import-compounds`` reads: unique names and valid CAS numbers, molecular
+formulas with matching weights, SMILES strings built from the same heavy
+atoms, and biochemical group / therapeutic area names from the seed data.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+BIOCHEMICAL_GROUPS = [
+    'Proteins', 'Nucleotides', 'Lipids', 'Carbohydrates', 'Amino Acids', 'Vitamins',
+    'Minerals', 'Enzymes', 'Hormones', 'Neurotransmitters', 'Alkaloids', 'Organic Acids',
+    'Beta-lactams'
+]
+
+THERAPEUTIC_AREAS = [
+    'Oncology', 'Cardiology', 'Neurology', 'Immunology', 'Infectious Diseases',
+    'Metabolic Disorders', 'Rare Diseases', 'Pain Management', 'Endocrinology'
+]
+
+CLINICAL_PHASES = ['Discovery', 'Preclinical', 'Phase 1', 'Phase 2', 'Phase 3', 'Approved']
+PHASE_WEIGHTS = [30, 25, 15, 12, 8, 10]
+
+MECHANISMS = [
+    'Kinase inhibitor', 'Receptor agonist', 'Receptor antagonist', 'Enzyme inhibitor',
+    'Ion channel blocker', 'Reuptake inhibitor', 'Cell wall synthesis inhibitor',
+    'DNA intercalator', 'Protease inhibitor', 'Metabolic substrate'
+]
+
+NAME_PREFIXES = ['Ab', 'Cor', 'Dex', 'Ela', 'Fen', 'Gal', 'Hal', 'Ira', 'Lor', 'Mex',
+                 'Nor', 'Oxa', 'Pra', 'Qui', 'Ris', 'Sel', 'Tra', 'Val', 'Xen', 'Zol']
+NAME_MIDDLES = ['ba', 'ce', 'di', 'fo', 'la', 'mi', 'no', 'pe', 'ra', 'si', 'to', 'vu']
+NAME_SUFFIXES = ['mab', 'nib', 'pril', 'sartan', 'statin', 'olol', 'azole', 'cillin',
+                 'mycin', 'vir', 'dipine', 'tide', 'parin', 'oxacin', 'amide', 'ine']
+
+ATOMIC_WEIGHTS = {'C': 12.011, 'H': 1.008, 'N': 14.007, 'O': 15.999, 'S': 32.06}
+
+
+def cas_number(serial: int) -> str:
+    """Build a syntactically valid CAS registry number (with check digit) from a serial"""
+    digits = str(serial)
+    checksum = sum(int(d) * (i + 1) for i, d in enumerate(reversed(digits))) % 10
+    return f'{digits[:-2]}-{digits[-2:]}-{checksum}'
+
+
+def _formula(counts: dict) -> str:
+    parts = []
+    for element in ('C', 'H', 'N', 'O', 'S'):
+        count = counts.get(element, 0)
+        if count:
+            parts.append(element if count == 1 else f'{element}{count}')
+    return ''.join(parts)
+
+
+def _smiles(rng: random.Random, counts: dict) -> str:
+    """Lay the heavy atoms out as a chain with branches, one ring and carbonyls"""
+    atoms = ['C'] * counts['C'] + ['N'] * counts.get('N', 0) + ['S'] * counts.get('S', 0)
+    rng.shuffle(atoms)
+    atoms[0] = 'C'
+    oxygens = counts.get('O', 0)
+
+    tokens = []
+    ring_open = None
+    ring_closed = False
+    depth = 0
+    for i, atom in enumerate(atoms):
+        token = atom
+        if ring_open is None and not ring_closed and len(atoms) - i > 6 and rng.random() < 0.15:
+            token += '1'
+            ring_open = i
+        elif ring_open is not None and i - ring_open >= 5:
+            token += '1'
+            ring_open = None
+            ring_closed = True  # only one ring per molecule
+        if i > 0 and oxygens and rng.random() < 0.35:
+            token += '(=O)' if atom == 'C' and rng.random() < 0.5 else '(O)'
+            oxygens -= 1
+        if i > 1 and depth < 2 and rng.random() < 0.1:
+            token = '(' + token
+            depth += 1
+        elif depth and rng.random() < 0.3:
+            token += ')'
+            depth -= 1
+        tokens.append(token)
+    if ring_open is not None:
+        tokens.append('C1')
+    tokens.append(')' * depth)
+    tokens.append('O' * oxygens)
+    return ''.join(tokens)
+
+
+def generate_compound(rng: random.Random, index: int) -> dict:
+    """Generate one realistic compound record; index keeps names and CAS numbers unique"""
+    carbons = rng.randint(2, 60)
+    counts = {
+        'C': carbons,
+        'H': max(2, int(carbons * rng.uniform(1.0, 2.2))),
+        'N': rng.choice([0, 0, 1, 1, 2, 3, 4, 6]),
+        'O': rng.randint(0, min(12, carbons)),
+        'S': rng.choice([0, 0, 0, 0, 1, 2]),
+    }
+    weight = round(sum(ATOMIC_WEIGHTS[element] * count for element, count in counts.items()), 2)
+    stem = rng.choice(NAME_PREFIXES) + rng.choice(NAME_MIDDLES) + rng.choice(NAME_SUFFIXES)
+    mechanism = rng.choice(MECHANISMS)
+    group = rng.choice(BIOCHEMICAL_GROUPS)
+    return {
+        'name': f'{stem}-{index + 1}',
+        'molecular_formula': _formula(counts),
+        'molecular_weight': weight,
+        'cas_number': cas_number(1000000 + index),
+        'smiles': _smiles(rng, counts),
+        'description': f'Synthetic {group.lower()} compound ({mechanism.lower()}) generated for load testing',
+        'clinical_phase': rng.choices(CLINICAL_PHASES, weights=PHASE_WEIGHTS)[0],
+        'mechanism_of_action': mechanism,
+        'biochemical_group': group,
+        'therapeutic_areas': rng.sample(THERAPEUTIC_AREAS, rng.choice([1, 1, 1, 2, 2, 3]))
+    }
+
+
+def generate_compounds(count: int, seed: int = 42, start: int = 0):
+    """Yield ``count`` compound records; the same seed always yields the same records"""
+    rng = random.Random(seed)
+    for index in range(start, start + count):
+        yield generate_compound(rng, index)
+
+
+def insert_compounds(db, records, batch_size: int = 5000) -> int:
+    """
+    Bulk-insert generated records with executemany, bypassing the ORM unit of work.
+    Reference groups and areas are created on demand. Returns the number inserted.
+    """
+    from models.models import Compound, BiochemicalGroup, TherapeuticArea, compound_therapeutic_area
+    from utils.data_version import bump
+    from utils.db_routing import write_transaction
+    from utils.disease_closure import refresh as refresh_closure
+
+    def reference_ids():
+        groups = {group.name: group.id for group in BiochemicalGroup.query.all()}
+        areas = {area.name: area.id for area in TherapeuticArea.query.all()}
+        for name in BIOCHEMICAL_GROUPS:
+            if name not in groups:
+                group = BiochemicalGroup(name=name, category='synthetic')
+                db.session.add(group)
+                db.session.flush()
+                groups[name] = group.id
+        for name in THERAPEUTIC_AREAS:
+            if name not in areas:
+                area = TherapeuticArea(name=name)
+                db.session.add(area)
+                db.session.flush()
+                areas[name] = area.id
+        return groups, areas
+
+    groups, areas = write_transaction(reference_ids)
+
+    next_id = (db.session.query(db.func.max(Compound.id)).scalar() or 0) + 1
+    base_time = datetime.utcnow()
+    inserted = 0
+    batch, links = [], []
+
+    def write_batch():
+        if batch:
+            db.session.execute(Compound.__table__.insert(), batch)
+        if links:
+            db.session.execute(compound_therapeutic_area.insert(), links)
+            # Core inserts also bypass the flush hook that maintains the disease closure
+            refresh_closure(db.session.connection(), {link['compound_id'] for link in links})
+
+    def flush_batch():
+        write_transaction(write_batch)
+        batch.clear()
+        links.clear()
+
+    for record in records:
+        created_at = base_time - timedelta(minutes=inserted)
+        row = {
+            'id': next_id,
+            'name': record['name'],
+            'molecular_formula': record['molecular_formula'],
+            'molecular_weight': record['molecular_weight'],
+            'cas_number': record['cas_number'],
+            'smiles': record['smiles'],
+            'description': record['description'],
+            'clinical_phase': record['clinical_phase'],
+            'mechanism_of_action': record['mechanism_of_action'],
+            'biochemical_group_id': groups[record['biochemical_group']],
+            'created_at': created_at,
+            'updated_at': created_at,
+            'created_by': 'synthetic'
+        }
+        row['sync_hash'] = Compound.compute_sync_hash(row, record['therapeutic_areas'])
+        batch.append(row)
+        links.extend({'compound_id': next_id, 'therapeutic_area_id': areas[name]}
+                     for name in record['therapeutic_areas'])
+        next_id += 1
+        inserted += 1
+        if len(batch) >= batch_size:
+            flush_batch()
+    flush_batch()
+
+    # Core inserts bypass the ORM session events, so publish the change explicitly
+    bump('synthetic compounds inserted')
+    return inserted
+